@@ -0,0 +1,408 @@
+"""Two-pass CHIP-8 assembler.
+
+Source is tokenized a line at a time by Tokenizer.stream. The first
+pass gives each statement an address and collects labels, the second encodes
+each statement into the 16-bit words chip8/parser.py decodes. The result is a
+ROM image starting at the origin, 0x200 by default, ready for VM.load.
+
+One statement per line, operands separated by spaces or commas. Registers
+are r0-r15, numbers are decimal, hexadecimal or binary as parsed by
+parse_all_bases, and anything else names a label or constant. "#" starts a
+comment and "name:" defines a label at the current address.
+
+    cls                 00E0    ret                 00EE    sys nnn         0nnn
+    jp nnn              1nnn    call nnn            2nnn    jp0 nnn         Bnnn
+    se rx kk            3xkk    sne rx kk           4xkk    se rx ry        5xy0
+    sne rx ry           9xy0    ld rx kk            6xkk    add rx kk       7xkk
+    ld rx ry            8xy0    or rx ry            8xy1    and rx ry       8xy2
+    xor rx ry           8xy3    add rx ry           8xy4    sub rx ry       8xy5
+    shr rx [ry]         8xy6    subn rx ry          8xy7    shl rx [ry]     8xyE
+    ldi nnn             Annn    rnd rx kk           Cxkk    drw rx ry n     Dxyn
+    skp rx              Ex9E    sknp rx             ExA1    getdt rx        Fx07
+    key rx              Fx0A    setdt rx            Fx15    setst rx        Fx18
+    addi rx             Fx1E    font rx             Fx29    bcd rx          Fx33
+    store rx            Fx55    load rx             Fx65
+
+Directives start with ".":
+
+    .org addr           continue at addr
+    .byte b [b [b]]     emit up to three bytes
+    .word w [w [w]]     emit up to three big-endian 16-bit words
+    .equ name value     define a constant
+    .include path       assemble another file here, relative to this one
+
+Both passes are linear in the size of the source. Given an AssemblyCache,
+unchanged files are not tokenized again and unchanged programs are not
+assembled again, see assembler/cache.py.
+
+    python -m assembler.assembler game.s -o game.bin
+    python -m assembler.assembler roms/*.s --cache .asm-cache
+"""
+
+import argparse
+import os
+import sys
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from assembler.cache import AssemblyCache, digest
+from assembler.tokenizer import (
+    ImmToken,
+    InstToken,
+    RegToken,
+    Token,
+    TokenizeError,
+    Tokenizer,
+)
+
+# Address programs are loaded at by VM.load
+DEFAULT_ORIGIN = 0x200
+# Size of the CHIP-8 address space
+ADDRESS_SPACE = 0x1000
+
+# Operand field: (shift, largest value)
+_FIELDS: Dict[str, Tuple[int, int]] = {
+    "x": (8, 0xF),
+    "y": (4, 0xF),
+    "n": (0, 0xF),
+    "kk": (0, 0xFF),
+    "nnn": (0, 0xFFF),
+}
+
+# Mnemonic -> operand signature -> (instruction word without operands,
+# field of each operand). Signatures have an "r" per register operand and an
+# "i" per immediate or symbol.
+_FORMS: Dict[str, Dict[str, Tuple[int, Tuple[str, ...]]]] = {
+    "cls": {"": (0x00E0, ())},
+    "ret": {"": (0x00EE, ())},
+    "sys": {"i": (0x0000, ("nnn",))},
+    "jp": {"i": (0x1000, ("nnn",))},
+    "call": {"i": (0x2000, ("nnn",))},
+    "se": {"ri": (0x3000, ("x", "kk")), "rr": (0x5000, ("x", "y"))},
+    "sne": {"ri": (0x4000, ("x", "kk")), "rr": (0x9000, ("x", "y"))},
+    "ld": {"ri": (0x6000, ("x", "kk")), "rr": (0x8000, ("x", "y"))},
+    "add": {"ri": (0x7000, ("x", "kk")), "rr": (0x8004, ("x", "y"))},
+    "or": {"rr": (0x8001, ("x", "y"))},
+    "and": {"rr": (0x8002, ("x", "y"))},
+    "xor": {"rr": (0x8003, ("x", "y"))},
+    "sub": {"rr": (0x8005, ("x", "y"))},
+    "shr": {"r": (0x8006, ("x",)), "rr": (0x8006, ("x", "y"))},
+    "subn": {"rr": (0x8007, ("x", "y"))},
+    "shl": {"r": (0x800E, ("x",)), "rr": (0x800E, ("x", "y"))},
+    "ldi": {"i": (0xA000, ("nnn",))},
+    "jp0": {"i": (0xB000, ("nnn",))},
+    "rnd": {"ri": (0xC000, ("x", "kk"))},
+    "drw": {"rri": (0xD000, ("x", "y", "n"))},
+    "skp": {"r": (0xE09E, ("x",))},
+    "sknp": {"r": (0xE0A1, ("x",))},
+    "getdt": {"r": (0xF007, ("x",))},
+    "key": {"r": (0xF00A, ("x",))},
+    "setdt": {"r": (0xF015, ("x",))},
+    "setst": {"r": (0xF018, ("x",))},
+    "addi": {"r": (0xF01E, ("x",))},
+    "font": {"r": (0xF029, ("x",))},
+    "bcd": {"r": (0xF033, ("x",))},
+    "store": {"r": (0xF055, ("x",))},
+    "load": {"r": (0xF065, ("x",))},
+}
+
+# Directives that emit data, and the bytes per operand
+_DATA = {".byte": 1, ".word": 2}
+
+
+class AssemblyError(Exception):
+    """A source error, with the file and line it was found on"""
+
+    def __init__(self, message: str, path: str, line: int):
+        super().__init__(f"{path}:{line}: {message}")
+        self.path = path
+        self.line = line
+
+
+class Statement(NamedTuple):
+    """An instruction or data directive placed at an address by the first pass"""
+
+    address: int
+    # Bytes emitted
+    size: int
+    token: InstToken
+    # Where the statement came from, for errors
+    path: str
+    line: int
+
+
+class Assembler(object):
+    """Assembles one program from any number of sources.
+
+    Feed source with add_lines() or add_file(), then call assemble()."""
+
+    def __init__(
+        self,
+        origin: int = DEFAULT_ORIGIN,
+        include_dirs: Sequence[str] = (),
+        cache: Optional[AssemblyCache] = None,
+    ):
+        self.origin = origin
+        # Directories searched for .include files not found next to the includer
+        self.include_dirs = list(include_dirs)
+        # Labels and constants
+        self.symbols: Dict[str, int] = {}
+        self.statements: List[Statement] = []
+        # Address of the next statement
+        self.address = origin
+        # End of the highest statement so far
+        self.end = origin
+        # Addresses already taken by a statement, to catch overlaps
+        self._occupied = bytearray(ADDRESS_SPACE)
+        self._tokenizer = Tokenizer()
+        # Token streams of source files are looked up here if set
+        self.cache = cache
+        # (path, digest) of every file read with a cache set, in order
+        self.sources: List[Tuple[str, str]] = []
+        # Paths .include files were looked for at and not found, in order
+        self.searched: List[str] = []
+        # Files being assembled, innermost last, to catch include cycles
+        self._including: List[str] = []
+
+    def add_file(self, path: str) -> None:
+        """Runs the first pass over a source file"""
+        path = os.path.abspath(path)
+        if path in self._including:
+            raise AssemblyError("File includes itself", path, 0)
+        self._including.append(path)
+        try:
+            if self.cache is None:
+                with open(path) as f:
+                    self.add_lines(f, path)
+            else:
+                with open(path, "rb") as f:
+                    data = f.read()
+                self.sources.append((path, digest(data)))
+                try:
+                    tokens = self.cache.tokens(data)
+                except TokenizeError as e:
+                    raise _from_tokenize_error(e, path) from None
+                self._add_tokens(tokens, path)
+        finally:
+            self._including.pop()
+
+    def add_lines(self, lines: Iterable[str], path: str = "<source>") -> None:
+        """Runs the first pass over lines of source"""
+        try:
+            self._add_tokens(self._tokenizer.stream(lines), path)
+        except TokenizeError as e:
+            raise _from_tokenize_error(e, path) from None
+
+    def _add_tokens(self, tokens: Iterable[InstToken], path: str) -> None:
+        """Runs the first pass over a token stream"""
+        for token in tokens:
+            name = token.children[0].value
+            if name.endswith(":") and len(token.children) == 1:
+                self._define(name[:-1], self.address, path, token.line)
+            elif name.startswith("."):
+                self._directive(name.lower(), token, path, token.line)
+            else:
+                self._place(2, token, path, token.line)
+
+    def assemble(self) -> bytes:
+        """Runs the second pass, returning the image from the origin up to
+        the end of the highest statement"""
+        image = bytearray(self.end - self.origin)
+        for st in self.statements:
+            offset = st.address - self.origin
+            name = st.token.children[0].value.lower()
+            if name in _DATA:
+                width = _DATA[name]
+                limit = (1 << 8 * width) - 1
+                data = b"".join(
+                    self._value(token, st.path, st.line, limit).to_bytes(width, "big")
+                    for token in list(st.token.children)[1:]
+                )
+            else:
+                data = self._encode(st).to_bytes(2, "big")
+            image[offset : offset + st.size] = data
+        return bytes(image)
+
+    def _place(self, size: int, token: InstToken, path: str, line: int) -> None:
+        """Adds a statement of size bytes at the current address"""
+        if self.address + size > ADDRESS_SPACE:
+            raise AssemblyError("Program does not fit in memory", path, line)
+        if any(self._occupied[self.address : self.address + size]):
+            raise AssemblyError(
+                f"Statement at {self.address:#x} overlaps one placed earlier",
+                path,
+                line,
+            )
+        self._occupied[self.address : self.address + size] = b"\x01" * size
+        self.statements.append(Statement(self.address, size, token, path, line))
+        self.address += size
+        self.end = max(self.end, self.address)
+
+    def _define(self, name: str, value: int, path: str, line: int) -> None:
+        if not name.isidentifier():
+            raise AssemblyError(f"Bad symbol name {name!r}", path, line)
+        if name in self.symbols:
+            raise AssemblyError(f"Symbol {name!r} is already defined", path, line)
+        self.symbols[name] = value
+
+    def _directive(self, name: str, token: InstToken, path: str, line: int) -> None:
+        operands = list(token.children)[1:]
+        if name in _DATA:
+            if not operands:
+                raise AssemblyError(f"{name} needs at least one value", path, line)
+            self._place(_DATA[name] * len(operands), token, path, line)
+        elif name == ".org":
+            if len(operands) != 1:
+                raise AssemblyError(".org takes one address", path, line)
+            address = self._value(operands[0], path, line, ADDRESS_SPACE)
+            if address < self.origin:
+                raise AssemblyError(
+                    f".org {address:#x} is below the origin", path, line
+                )
+            self.address = address
+        elif name == ".equ":
+            if len(operands) != 2:
+                raise AssemblyError(".equ takes a name and a value", path, line)
+            value = self._value(operands[1], path, line, 0xFFFF)
+            self._define(operands[0].raw, value, path, line)
+        elif name == ".include":
+            if len(operands) != 1:
+                raise AssemblyError(".include takes one path", path, line)
+            self.add_file(self._find_include(operands[0].raw, path, line))
+        else:
+            raise AssemblyError(f"Unknown directive {name}", path, line)
+
+    def _find_include(self, name: str, path: str, line: int) -> str:
+        """Returns the path of an included file, searching next to the
+        includer first, then include_dirs"""
+        here = os.path.dirname(path) if os.path.isfile(path) else os.getcwd()
+        for directory in [here] + self.include_dirs:
+            candidate = os.path.join(directory, name)
+            if os.path.isfile(candidate):
+                return candidate
+            # A file created here later would shadow the one found
+            self.searched.append(os.path.abspath(candidate))
+        raise AssemblyError(f"Cannot find include {name!r}", path, line)
+
+    def _value(self, token: Token, path: str, line: int, limit: int) -> int:
+        """Resolves an immediate or symbol operand, checking 0 <= value <= limit"""
+        if token.raw in self.symbols:
+            # A defined symbol wins over a name that also parses as hexadecimal
+            value = self.symbols[token.raw]
+        elif isinstance(token, ImmToken):
+            value = token.value
+        elif isinstance(token, RegToken):
+            raise AssemblyError(
+                f"Expected a value, got register {token.raw}", path, line
+            )
+        else:
+            raise AssemblyError(f"Undefined symbol {token.raw!r}", path, line)
+        if not 0 <= value <= limit:
+            raise AssemblyError(f"{token.raw} is out of range 0-{limit:#x}", path, line)
+        return value
+
+    def _encode(self, st: Statement) -> int:
+        """Encodes an instruction statement into its 16-bit word"""
+        children = list(st.token.children)
+        name, operands = children[0].value.lower(), children[1:]
+        forms = _FORMS.get(name)
+        if forms is None:
+            raise AssemblyError(f"Unknown instruction {name!r}", st.path, st.line)
+        signature = "".join("r" if isinstance(t, RegToken) else "i" for t in operands)
+        form = forms.get(signature)
+        if form is None:
+            expected = " or ".join(repr(s) for s in forms)
+            raise AssemblyError(
+                f"{name} takes operands {expected} (r register, i value), "
+                f"got {signature!r}",
+                st.path,
+                st.line,
+            )
+        word, fields = form
+        for field, token in zip(fields, operands):
+            shift, limit = _FIELDS[field]
+            if isinstance(token, RegToken):
+                if not 0 <= token.value <= limit:
+                    raise AssemblyError(f"No register {token.raw}", st.path, st.line)
+                value = token.value
+            else:
+                value = self._value(token, st.path, st.line, limit)
+            word |= value << shift
+        return word
+
+
+def _from_tokenize_error(e: TokenizeError, path: str) -> AssemblyError:
+    return AssemblyError(f"{e.message} at column {e.column}", path, e.line)
+
+
+def assemble(
+    source: str, origin: int = DEFAULT_ORIGIN, include_dirs: Sequence[str] = ()
+) -> bytes:
+    """Assembles source text into a ROM image starting at origin"""
+    asm = Assembler(origin, include_dirs)
+    asm.add_lines(source.splitlines())
+    return asm.assemble()
+
+
+def assemble_file(
+    path: str,
+    origin: int = DEFAULT_ORIGIN,
+    include_dirs: Sequence[str] = (),
+    cache: Optional[AssemblyCache] = None,
+) -> bytes:
+    """Assembles a source file into a ROM image starting at origin, reusing
+    the cached image if cache is set and no file it was built from changed"""
+    if cache is not None:
+        image = cache.rom(path, origin, include_dirs)
+        if image is not None:
+            return image
+    asm = Assembler(origin, include_dirs, cache)
+    asm.add_file(path)
+    image = asm.assemble()
+    if cache is not None:
+        cache.store_rom(path, origin, include_dirs, asm.sources, asm.searched, image)
+    return image
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Assemble CHIP-8 source into a ROM")
+    parser.add_argument("sources", nargs="+", help="source files")
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="ROM file to write for a single source, default source.bin",
+    )
+    parser.add_argument(
+        "-I", dest="include_dirs", action="append", default=[], help="include directory"
+    )
+    parser.add_argument(
+        "--cache", metavar="DIR", help="reuse tokens and ROMs cached in DIR"
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=256,
+        help="cache size limit in MiB, default 256",
+    )
+    args = parser.parse_args(argv)
+    if args.output and len(args.sources) > 1:
+        parser.error("-o needs a single source")
+
+    cache = None
+    if args.cache:
+        cache = AssemblyCache(args.cache, args.cache_size << 20)
+    failed = False
+    for source in args.sources:
+        output = args.output or os.path.splitext(source)[0] + ".bin"
+        try:
+            rom = assemble_file(source, include_dirs=args.include_dirs, cache=cache)
+        except (AssemblyError, OSError) as e:
+            print(e, file=sys.stderr)
+            failed = True
+            continue
+        with open(output, "wb") as f:
+            f.write(rom)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
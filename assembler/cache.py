@@ -0,0 +1,259 @@
+"""On-disk cache for the assembler.
+
+Entries are keyed by a SHA-256 of everything they depend on, including
+ASSEMBLER_VERSION. There are two kinds:
+
+- tokens: the token stream of one source file, keyed by its content. An
+  unchanged file is never tokenized twice, whichever program includes it.
+- rom: the image assembled from a root file, keyed by its path, content,
+  origin and include directories. It records the path and content hash of
+  every file the root included, and is only used while all of them are
+  unchanged. Editing an include therefore re-assembles exactly the programs
+  that include it, and only the edited file is tokenized again. It also
+  records every path an include was searched at before it was found, and
+  is not used once a file appears at one of them, shadowing the include.
+
+Each entry is a file in one directory. Reading an entry refreshes its
+modification time, and once the entries add up to more than max_bytes the
+least recently used ones are deleted. Entries are plain JSON, so reading
+one never runs code, and a damaged entry is deleted and rebuilt.
+"""
+
+import hashlib
+import os
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from assembler.tokenizer import (
+    EscToken,
+    ImmToken,
+    InstToken,
+    NameToken,
+    RegToken,
+    Token,
+    Tokenizer,
+)
+
+# Bump whenever tokens or encodings change, so older entries are ignored
+ASSEMBLER_VERSION = 2
+
+# Default limit on the total size of the entries, in bytes
+DEFAULT_MAX_BYTES = 256 << 20
+
+_SUFFIX = ".entry"
+
+# Errors decoding an entry that was damaged or written by something else
+_DAMAGED = (ValueError, TypeError, KeyError, IndexError, AssertionError)
+
+# Leaf token classes by the name stored in token entries
+_LEAVES = {cls.__name__: cls for cls in (NameToken, ImmToken, RegToken, EscToken)}
+
+
+def digest(data: bytes) -> str:
+    """Returns the content hash the cache uses for a source file"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class AssemblyCache(object):
+    """Token streams and ROM images stored in a directory"""
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Lookups that found a usable entry, and ones that did not
+        self.hits = 0
+        self.misses = 0
+        # Size of every entry by file name
+        self._sizes: Dict[str, int] = {
+            entry.name: entry.stat().st_size
+            for entry in os.scandir(directory)
+            if entry.name.endswith(_SUFFIX)
+        }
+
+    def key(self, kind: str, *parts: bytes) -> str:
+        """Returns the key of an entry of some kind depending on parts"""
+        h = hashlib.sha256(f"{kind}:{ASSEMBLER_VERSION}".encode())
+        for part in parts:
+            # Length prefixes keep ("ab", "c") and ("a", "bc") apart
+            h.update(len(part).to_bytes(8, "little"))
+            h.update(part)
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns an entry and marks it as recently used, or None"""
+        path = os.path.join(self.directory, key + _SUFFIX)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """Stores an entry, then evicts entries until the cache fits"""
+        name = key + _SUFFIX
+        tmp = os.path.join(self.directory, f".{name}.{os.getpid()}")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        # Atomic, so concurrent builds never see a partial entry
+        os.replace(tmp, os.path.join(self.directory, name))
+        self._sizes[name] = len(data)
+        self._evict()
+
+    def discard(self, key: str) -> None:
+        """Deletes an entry if it exists"""
+        name = key + _SUFFIX
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+        self._sizes.pop(name, None)
+
+    def size(self) -> int:
+        """Returns the total size of the entries in bytes"""
+        return sum(self._sizes.values())
+
+    def tokens(self, data: bytes) -> List[InstToken]:
+        """Returns the token stream of a source file's content, tokenizing it
+        only if it is not cached"""
+        key = self.key("tokens", data)
+        blob = self.get(key)
+        if blob is not None:
+            try:
+                tokens = [_load_token(t) for t in json.loads(blob)]
+            except _DAMAGED:
+                self.discard(key)
+            else:
+                self.hits += 1
+                return tokens
+        self.misses += 1
+        tokens = list(Tokenizer().stream(data.decode().splitlines()))
+        self.put(key, _dumps([_dump_token(t) for t in tokens]))
+        return tokens
+
+    def rom(
+        self, path: str, origin: int, include_dirs: Sequence[str]
+    ) -> Optional[bytes]:
+        """Returns the cached image of a root source file if neither it nor
+        anything it included has changed, else None"""
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        key = self._rom_key(path, digest(data), origin, include_dirs)
+        blob = self.get(key)
+        if blob is not None:
+            try:
+                entry = json.loads(blob)
+                sources, searched = entry["sources"], entry["searched"]
+                image = bytes.fromhex(entry["image"])
+                current = all(_current_digest(p) == d for p, d in sources)
+                shadowed = any(os.path.isfile(p) for p in searched)
+            except _DAMAGED:
+                self.discard(key)
+            else:
+                if current and not shadowed:
+                    self.hits += 1
+                    return image
+        self.misses += 1
+        return None
+
+    def store_rom(
+        self,
+        path: str,
+        origin: int,
+        include_dirs: Sequence[str],
+        sources: Sequence[Tuple[str, str]],
+        searched: Sequence[str],
+        image: bytes,
+    ) -> None:
+        """Stores the image of a root source file, the (path, digest) of
+        every file read to assemble it, the root first, and the paths
+        includes were searched at without being found"""
+        key = self._rom_key(path, sources[0][1], origin, include_dirs)
+        entry = {
+            "sources": list(sources),
+            "searched": list(searched),
+            "image": image.hex(),
+        }
+        self.put(key, _dumps(entry))
+
+    def _rom_key(
+        self, path: str, content: str, origin: int, include_dirs: Sequence[str]
+    ) -> str:
+        """Key of the image of a root file with the given content digest"""
+        return self.key(
+            "rom",
+            os.path.abspath(path).encode(),
+            content.encode(),
+            origin.to_bytes(2, "little"),
+            "\0".join(os.path.abspath(d) for d in include_dirs).encode(),
+        )
+
+    def _evict(self) -> None:
+        """Deletes least recently used entries until the cache fits in max_bytes"""
+        total = self.size()
+        if total <= self.max_bytes:
+            return
+        entries = []
+        for name in self._sizes:
+            try:
+                entries.append(
+                    (os.stat(os.path.join(self.directory, name)).st_mtime_ns, name)
+                )
+            except OSError:
+                entries.append((0, name))
+        entries.sort()
+        for _, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= self._sizes.pop(name)
+
+
+def _current_digest(path: str) -> Optional[str]:
+    """Returns the digest of a file as it is now, or None if it cannot be read"""
+    try:
+        with open(path, "rb") as f:
+            return digest(f.read())
+    except OSError:
+        return None
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def _dump_token(token: InstToken) -> list:
+    """Returns an InstToken as plain data: raw, line and its children's
+    (class name, raw, value, column)"""
+    children = [
+        [type(c).__name__, c.raw, getattr(c, "value", None), c.column]
+        for c in token.children
+    ]
+    return [token.raw, token.line, children]
+
+
+def _load_token(data: list) -> InstToken:
+    """Rebuilds an InstToken from _dump_token's plain data"""
+    raw, line, children = data
+    leaves: List[Token] = []
+    for name, child_raw, value, column in children:
+        cls = _LEAVES[name]
+        if cls in (ImmToken, RegToken):
+            if type(value) is not int:
+                raise TypeError(f"{name} value is not an int")
+            leaf = cls(child_raw, value)
+        else:
+            leaf = cls(child_raw)
+        leaf.column = column
+        leaves.append(leaf)
+    token = InstToken(raw, leaves)
+    token.line = line
+    return token
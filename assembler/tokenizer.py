@@ -1,12 +1,20 @@
+import os
+import re
 from collections import deque
-from copy import deepcopy
-from typing import Sequence
+from typing import Iterable, Iterator, List, Sequence, Union
 
 _LINE_MAX_TOKENS = 4
 
+# A word of source, words are separated by whitespace or commas
+_WORD = re.compile(r"[^\s,]+")
+
 
 def parse_all_bases(s: str) -> int:
-    """Tries to parse the passed string as base-10, then base-16, then base-2."""
+    """Tries to parse the passed string as base-10, then base-16, then base-2.
+    0b followed by binary digits is binary, otherwise it would parse as
+    hexadecimal."""
+    if s[:2].lower() == "0b" and s[2:] and set(s[2:]) <= {"0", "1"}:
+        return int(s[2:], 2)
     try:
         # decimal
         value = int(s, 10)
@@ -26,9 +34,23 @@ class InstructionSizeException(Exception):
         super().__init__(args)
 
 
+class TokenizeError(Exception):
+    """A source error found by Tokenizer.stream, with its position"""
+
+    def __init__(self, message: str, line: int, column: int):
+        super().__init__(f"{line}:{column}: {message}")
+        self.message = message
+        self.line = line
+        self.column = column
+
+
 class Token(object):
     """Token base class"""
 
+    # Position in the source, counted from 1, set by Tokenizer.stream
+    line: int = 0
+    column: int = 0
+
     def __init__(self, raw: str):
         assert isinstance(raw, str) is True
         self.raw: str = raw
@@ -108,6 +130,15 @@ class EscToken(LeafToken):
         super().__init__(raw)
 
 
+def immediate_or_name(s: str) -> Token:
+    """Returns an ImmToken if s parses as a number, otherwise a NameToken
+    naming a symbol such as a label"""
+    try:
+        return ImmToken(s, parse_all_bases(s))
+    except ValueError:
+        return NameToken(s)
+
+
 class Tokenizer(object):
     class SpecialCharactersEnum:
         ESCAPE = "#"
@@ -121,7 +152,12 @@ class Tokenizer(object):
         """Tokenizes a single line of source that has been stripped of delimiters
         and placed in a sequence, and pushes it onto the end of the Tokenizer's
         output buffer."""
+        self.buf.append(self.tokenize_line(raw, string_sequence))
+        return len(self.buf)
 
+    def tokenize_line(self, raw: str, string_sequence: Sequence[str]) -> InstToken:
+        """Tokenizes a single line of source that has been stripped of delimiters
+        and placed in a sequence, and returns it."""
         children = []
         for idx, s in enumerate(string_sequence):
             match idx:
@@ -135,38 +171,63 @@ class Tokenizer(object):
                         case _:
                             # Instruction name
                             children.append(NameToken(s))
-                case 1:
-                    # Match token 1, char 0:
+                case 1 | 2:
+                    # Match token 1 or 2, char 0:
                     match s[0]:
-                        case self.SpecialCharactersEnum.REGISTER:
+                        case self.SpecialCharactersEnum.REGISTER if s[1:].isdecimal():
                             # Extract target register number (base-10 only)
                             tgt_reg = int(s[1:])
                             children.append(RegToken(s, tgt_reg))
                         case _:
-                            # Immediate value
-                            children.append(ImmToken(s, parse_all_bases(s)))
-                case 2:
-                    # Match token 2, char 0:
-                    match s[0]:
-                        case self.SpecialCharactersEnum.REGISTER:
-                            # Extract target register number (base-10 only)
-                            tgt_reg = int(s[1:])
-                            children.append(RegToken(s, tgt_reg))
-                        case _:
-                            # Immediate value
-                            children.append(ImmToken(s, parse_all_bases(s)))
+                            # Immediate value or symbol
+                            children.append(immediate_or_name(s))
                 case 3:
-                    # 3rd operand always immediate value
-                    children.append(ImmToken(s, parse_all_bases(s)))
+                    # 3rd operand never a register
+                    children.append(immediate_or_name(s))
                 case _:
                     raise InstructionSizeException()
 
-        self.buf.append(InstToken(raw, children))
-        return len(self.buf)
+        return InstToken(raw, children)
 
     def dump(self) -> deque[Token]:
-        """Returns a copy of the Tokenizer's buffer. The Tokenizer's buffer is
-        cleared after this operation."""
-        ret = deepcopy(self.buf)
-        self.buf = self.buf.clear()
+        """Returns the Tokenizer's buffer and starts a new, empty one. The
+        tokens are handed over rather than copied."""
+        ret, self.buf = self.buf, deque()
         return ret
+
+    def stream(
+        self, source: Union[str, os.PathLike, Iterable[str]]
+    ) -> Iterator[InstToken]:
+        """Yields an InstToken per statement of source, a file path or an
+        iterable of lines, as it is read. Lines are split on whitespace and
+        commas, "#" starts a comment, and each "name:" label definition is
+        yielded as an InstToken of its own.
+
+        Nothing is buffered, so memory use does not depend on the size of
+        the source. InstTokens carry the line they came from and their
+        children the column they start at."""
+        if isinstance(source, (str, os.PathLike)):
+            with open(source) as f:
+                yield from self.stream(f)
+            return
+        escape = self.SpecialCharactersEnum.ESCAPE
+        for lineno, raw in enumerate(source, 1):
+            words = list(_WORD.finditer(raw.split(escape, 1)[0]))
+            start = 0
+            while start < len(words) and words[start].group().endswith(":"):
+                yield self._positioned(raw, words[start : start + 1], lineno)
+                start += 1
+            if start < len(words):
+                yield self._positioned(raw, words[start:], lineno)
+
+    def _positioned(self, raw: str, words: List[re.Match], lineno: int) -> InstToken:
+        """Tokenizes matched words and records their positions"""
+        try:
+            token = self.tokenize_line(raw, [m.group() for m in words])
+        except InstructionSizeException:
+            column = words[_LINE_MAX_TOKENS].start() + 1
+            raise TokenizeError("Too many operands", lineno, column) from None
+        token.line = lineno
+        for child, m in zip(token.children, words):
+            child.column = m.start() + 1
+        return token
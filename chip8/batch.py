@@ -0,0 +1,371 @@
+"""Lock-step execution of many VMs with NumPy.
+
+BatchCPU holds the state of K machines in NumPy arrays and advances them
+together. Each step, lanes are grouped by the opcode at their IP and every
+group is executed with one vectorized handler, mirroring the handlers in
+chip8/cpu.py.
+
+Cxkk draws from a per-lane counter-based generator (SplitMix64) seeded per
+lane, so lanes with different seeds diverge while staying reproducible.
+"""
+
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+
+from chip8 import parser
+
+# Opcode key of every 16-bit word, as found by parser.decode_table()
+_OPCODES = np.array([decoded[0] for decoded in parser.decode_table()], dtype=np.int64)
+
+# Opcodes after which IP is never advanced on its own
+_NO_ADVANCE = np.array([0xEE, 0x1000, 0x2000])
+
+_MEM_SIZE = 0x1000
+_STACK_SIZE = 16
+_SCR_W = 64
+_SCR_H = 32
+
+
+class BatchCPU(object):
+    """K CHIP-8 machines stepped in lock-step"""
+
+    def __init__(self, k: int, seeds: Optional[Sequence[int]] = None):
+        self.k = k
+        # 16*1-byte registers per lane
+        self.reg = np.zeros((k, 16), dtype=np.int64)
+        # 4096*1-byte memory per lane
+        self.mem = np.zeros((k, _MEM_SIZE), dtype=np.uint8)
+        # 32 packed 64-bit display rows per lane, leftmost pixel in the MSB
+        self.display = np.zeros((k, _SCR_H), dtype=np.uint64)
+        # 16 return addresses per lane and the number in use
+        self.stack = np.zeros((k, _STACK_SIZE), dtype=np.int64)
+        self.depth = np.zeros(k, dtype=np.int64)
+        # Instruction pointer, stack pointer, address pointer
+        self.ip = np.full(k, 0x200, dtype=np.int64)
+        self.sp = np.zeros(k, dtype=np.int64)
+        self.i = np.zeros(k, dtype=np.int64)
+        # Delay and sound timers
+        self.dt = np.zeros(k, dtype=np.int64)
+        self.st = np.zeros(k, dtype=np.int64)
+        # Drawing flag
+        self.df = np.zeros(k, dtype=bool)
+        # Random number generator state per lane
+        if seeds is None:
+            seeds = range(0, k)
+        self.rng = np.array(seeds, dtype=np.uint64)
+        # Lanes stopped by an error, and why
+        self.halted = np.zeros(k, dtype=bool)
+        self.errors: Dict[int, str] = {}
+
+    def load(self, program: bytes, offset: int = 0x200) -> None:
+        """Loads the same program into every lane at offset"""
+        if offset + len(program) > _MEM_SIZE:
+            raise IndexError(
+                f"{len(program)} bytes at {hex(offset)} do not fit in memory"
+            )
+        self.mem[:, offset : offset + len(program)] = np.frombuffer(
+            program, dtype=np.uint8
+        )
+
+    def step(self, n_cycles: int = 1) -> None:
+        """Step every running lane n cycles"""
+        for _ in range(0, n_cycles):
+            lanes = np.flatnonzero(~self.halted)
+            if lanes.size == 0:
+                return
+            ip = self.ip[lanes]
+            # Lanes whose IP runs off the end of memory cannot fetch
+            bad = ip + 1 >= _MEM_SIZE
+            if bad.any():
+                self._halt(lanes[bad], "IndexError('instruction fetch out of range')")
+                lanes, ip = lanes[~bad], ip[~bad]
+            words = (self.mem[lanes, ip].astype(np.int64) << 8) | self.mem[
+                lanes, ip + 1
+            ]
+            ops = _OPCODES[words]
+            # reset draw flag
+            self.df[lanes] = False
+
+            # execute each opcode group
+            for op in np.unique(ops):
+                sel = ops == op
+                handler = self._vector_lookup_table.get(int(op))
+                if handler is None:
+                    # Program data or malformed instruction
+                    self._halt(lanes[sel], f"KeyError({int(op)})")
+                else:
+                    handler(self, lanes[sel], words[sel])
+
+            # Lanes that faulted this cycle keep their IP
+            ok = ~self.halted[lanes]
+            lanes, ip, ops = lanes[ok], ip[ok], ops[ok]
+            # Increment IP if IP did not change and last instruction was not an
+            # unconditional jump.
+            advance = (self.ip[lanes] == ip) & ~np.isin(ops, _NO_ADVANCE)
+            self.ip[lanes[advance]] += 2
+
+    def tick_timers(self) -> None:
+        """Decrements the delay and sound timers of running lanes, called at 60 Hz"""
+        lanes = ~self.halted
+        self.st[lanes] = np.maximum(self.st[lanes] - 1, 0)
+        self.dt[lanes] = np.maximum(self.dt[lanes] - 1, 0)
+
+    def lane_display(self, lane: int) -> bytes:
+        """Returns the display of one lane in the layout of Display.to_bytes()"""
+        return self.display[lane].astype(">u8").tobytes()
+
+    def _halt(self, lanes: np.ndarray, reason: str) -> None:
+        """Stops lanes after an error the scalar CPU would have raised"""
+        self.halted[lanes] = True
+        for lane in lanes:
+            self.errors[int(lane)] = reason
+
+    def _random_bytes(self, lanes: np.ndarray) -> np.ndarray:
+        """Draws one random byte per lane with SplitMix64"""
+        with np.errstate(over="ignore"):
+            state = self.rng[lanes] + np.uint64(0x9E3779B97F4A7C15)
+            self.rng[lanes] = state
+            z = (state ^ (state >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+            z = z ^ (z >> np.uint64(31))
+        return (z >> np.uint64(56)).astype(np.int64)
+
+    def _0nnn(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Jump to a machine code routine at NNN.
+        No effects."""
+
+    def _00E0(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Clear the display."""
+        self.display[lanes] = 0
+
+    def _00EE(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Return from a subroutine (function)."""
+        empty = self.depth[lanes] == 0
+        self._halt(lanes[empty], "IndexError('The stack is empty.')")
+        lanes = lanes[~empty]
+        self.depth[lanes] -= 1
+        self.ip[lanes] = self.stack[lanes, self.depth[lanes]]
+
+    def _1nnn(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Performs an immediate jump."""
+        self.ip[lanes] = words & 0x0FFF
+
+    def _2nnn(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Call subroutine (function)."""
+        full = self.depth[lanes] == _STACK_SIZE
+        self._halt(lanes[full], "IndexError('The stack is full.')")
+        lanes, words = lanes[~full], words[~full]
+        self.stack[lanes, self.depth[lanes]] = self.ip[lanes] + 0x2
+        self.depth[lanes] += 1
+        self.sp[lanes] += 1
+        self.ip[lanes] = words & 0x0FFF
+
+    def _3xkk(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Skip next instruction if Vx == kk"""
+        skip = self.reg[lanes, (words >> 8) & 0xF] == words & 0xFF
+        self.ip[lanes[skip]] += 4
+
+    def _4xkk(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Skip next instruction if Vx != kk"""
+        skip = self.reg[lanes, (words >> 8) & 0xF] != words & 0xFF
+        self.ip[lanes[skip]] += 4
+
+    def _5xy0(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Skip next instruction if Vx == Vy"""
+        skip = (
+            self.reg[lanes, (words >> 8) & 0xF] == self.reg[lanes, (words >> 4) & 0xF]
+        )
+        self.ip[lanes[skip]] += 4
+
+    def _6xkk(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Set Vx = kk"""
+        self.reg[lanes, (words >> 8) & 0xF] = words & 0xFF
+
+    def _7xkk(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Set Vx = Vx + kk"""
+        x = (words >> 8) & 0xF
+        self.reg[lanes, x] = (self.reg[lanes, x] + (words & 0xFF)) & 0xFF
+
+    def _8xy0(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Set Vx = Vy"""
+        self.reg[lanes, (words >> 8) & 0xF] = self.reg[lanes, (words >> 4) & 0xF]
+
+    def _8xy1(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Set Vx = Vx OR Vy"""
+        x, y = (words >> 8) & 0xF, (words >> 4) & 0xF
+        self.reg[lanes, x] = self.reg[lanes, x] | self.reg[lanes, y]
+
+    def _8xy2(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Set Vx = Vx AND Vy"""
+        x, y = (words >> 8) & 0xF, (words >> 4) & 0xF
+        self.reg[lanes, x] = self.reg[lanes, x] & self.reg[lanes, y]
+
+    def _8xy3(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Set Vx = Vx XOR Vy"""
+        x, y = (words >> 8) & 0xF, (words >> 4) & 0xF
+        self.reg[lanes, x] = self.reg[lanes, x] ^ self.reg[lanes, y]
+
+    def _8xy4(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Set Vx = Vx + Vy, set VF = carry"""
+        x, y = (words >> 8) & 0xF, (words >> 4) & 0xF
+        result = self.reg[lanes, x] + self.reg[lanes, y]
+        self.reg[lanes, x] = result & 0xFF
+        self.reg[lanes, 0xF] = result % 255 > 0
+
+    def _8xy5(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Set Vx = Vx - Vy
+        If Vx > Vy, set VF = 1 else VF = 0"""
+        x, y = (words >> 8) & 0xF, (words >> 4) & 0xF
+        vx, vy = self.reg[lanes, x], self.reg[lanes, y]
+        self.reg[lanes, x] = (vx - vy) & 0xFF
+        self.reg[lanes, 0xF] = vx > vy
+
+    def _8xy6(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Vx = Vx >> 1, then VF = Vx LSB"""
+        x = (words >> 8) & 0xF
+        self.reg[lanes, x] = self.reg[lanes, x] >> 1
+        self.reg[lanes, 0xF] = self.reg[lanes, x] & 0b0000_0001
+
+    def _8xy7(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Set Vx = Vy - Vx
+        If Vy > Vx, set VF = 1 else VF = 0"""
+        x, y = (words >> 8) & 0xF, (words >> 4) & 0xF
+        vx, vy = self.reg[lanes, x], self.reg[lanes, y]
+        self.reg[lanes, x] = (vy - vx) & 0xFF
+        self.reg[lanes, 0xF] = vy > vx
+
+    def _8xyE(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Vx = Vx << 1, then VF = Vx MSB"""
+        x = (words >> 8) & 0xF
+        self.reg[lanes, x] = (self.reg[lanes, x] << 1) & 0xFF
+        self.reg[lanes, 0xF] = self.reg[lanes, x] & 0b1000_0000 != 0
+
+    def _9xy0(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Not implemented by the scalar CPU either, no effects."""
+
+    def _Annn(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Set I = nnn"""
+        self.i[lanes] = words & 0x0FFF
+
+    def _Bnnn(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Jump to location nnn + V0"""
+        self.ip[lanes] = self.reg[lanes, 0x0] + (words & 0x0FFF)
+
+    def _Cxkk(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Set Vx = random byte AND kk"""
+        self.reg[lanes, (words >> 8) & 0xF] = self._random_bytes(lanes) & words & 0xFF
+
+    def _Dxyn(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Draw n-byte sprite starting at I at (Vx, Vy), setting VF on collision"""
+        self.df[lanes] = True
+        # Unset VF
+        self.reg[lanes, 0xF] = 0
+        x = (self.reg[lanes, (words >> 8) & 0xF] & _SCR_W - 1).astype(np.uint64)
+        y = self.reg[lanes, (words >> 4) & 0xF] & _SCR_H - 1
+        n = words & 0xF
+        i = self.i[lanes]
+        collision = np.zeros(lanes.size, dtype=np.uint64)
+        for row in range(0, int(n.max(initial=0))):
+            # Rows past the sprite, the bottom edge or the end of memory are skipped
+            live = (row < n) & (y + row < _SCR_H) & (i + row < _MEM_SIZE)
+            if not live.any():
+                continue
+            ll, yy = lanes[live], y[live] + row
+            byte = self.mem[ll, i[live] + row].astype(np.uint64)
+            # Sprite MSB lined up with pixel x, clipped at the right edge
+            bits = (byte << np.uint64(56)) >> x[live]
+            rows = self.display[ll, yy]
+            collision[live] |= rows & bits
+            self.display[ll, yy] = rows ^ bits
+        self.reg[lanes, 0xF] = collision != 0
+
+    def _not_implemented(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Opcodes the scalar CPU does not implement yet"""
+        self._halt(lanes, "NotImplementedError()")
+
+    def _Fx07(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Set Vx = DT"""
+        self.reg[lanes, (words >> 8) & 0xF] = self.dt[lanes]
+
+    def _Fx15(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Set DT = Vx"""
+        self.dt[lanes] = self.reg[lanes, (words >> 8) & 0xF]
+
+    def _Fx18(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Set ST = Vx"""
+        self.st[lanes] = self.reg[lanes, (words >> 8) & 0xF]
+
+    def _Fx1E(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Set I = I + Vx"""
+        self.i[lanes] += self.reg[lanes, (words >> 8) & 0xF]
+
+    def _Fx33(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Store BCD representation of Vx in memory locations I, I+1, I+2"""
+        i = self.i[lanes]
+        bad = i + 2 >= _MEM_SIZE
+        self._halt(lanes[bad], "IndexError()")
+        lanes, words, i = lanes[~bad], words[~bad], i[~bad]
+        vx = self.reg[lanes, (words >> 8) & 0xF]
+        self.mem[lanes, i] = vx // 100
+        self.mem[lanes, i + 1] = vx // 10 % 10
+        self.mem[lanes, i + 2] = vx % 10
+
+    def _Fx55(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Stores registers V0-Vx inclusive in memory starting at I"""
+        x, i = (words >> 8) & 0xF, self.i[lanes]
+        bad = i + x >= _MEM_SIZE
+        self._halt(lanes[bad], "IndexError()")
+        lanes, x, i = lanes[~bad], x[~bad], i[~bad]
+        for k in range(0, int(x.max(initial=-1)) + 1):
+            live = k <= x
+            self.mem[lanes[live], i[live] + k] = self.reg[lanes[live], k]
+
+    def _Fx65(self, lanes: np.ndarray, words: np.ndarray) -> None:
+        """Read registers V0-Vx inclusive from memory starting at I"""
+        x, i = (words >> 8) & 0xF, self.i[lanes]
+        bad = i + x >= _MEM_SIZE
+        self._halt(lanes[bad], "IndexError()")
+        lanes, x, i = lanes[~bad], x[~bad], i[~bad]
+        for k in range(0, int(x.max(initial=-1)) + 1):
+            live = k <= x
+            self.reg[lanes[live], k] = self.mem[lanes[live], i[live] + k]
+
+    # Opcode to vectorized handler lookup table, keyed like CPU._method_lookup_table
+    _vector_lookup_table: Dict[int, Callable] = {
+        0x0000: _0nnn,
+        0x00E0: _00E0,
+        0x00EE: _00EE,
+        0x1000: _1nnn,
+        0x2000: _2nnn,
+        0x3000: _3xkk,
+        0x4000: _4xkk,
+        0x5000: _5xy0,
+        0x6000: _6xkk,
+        0x7000: _7xkk,
+        0x8000: _8xy0,
+        0x8001: _8xy1,
+        0x8002: _8xy2,
+        0x8003: _8xy3,
+        0x8004: _8xy4,
+        0x8005: _8xy5,
+        0x8006: _8xy6,
+        0x8007: _8xy7,
+        0x800E: _8xyE,
+        0x9000: _9xy0,
+        0xA000: _Annn,
+        0xB000: _Bnnn,
+        0xC000: _Cxkk,
+        0xD000: _Dxyn,
+        0xE09E: _not_implemented,
+        0xE0A1: _not_implemented,
+        0xF007: _Fx07,
+        0xF00A: _not_implemented,
+        0xF015: _Fx15,
+        0xF018: _Fx18,
+        0xF01E: _Fx1E,
+        0xF029: _not_implemented,
+        0xF033: _Fx33,
+        0xF055: _Fx55,
+        0xF065: _Fx65,
+    }
@@ -0,0 +1,273 @@
+"""Benchmark suite.
+
+Runs ROMs and synthetic micro-ROMs for a fixed number of cycles on each
+engine and reports instructions per second, frames per second, peak traced
+allocations and peak RSS. Results can be saved as JSON and compared against
+an earlier run to catch regressions:
+
+    python -m chip8.bench ROM/ --json before.json
+    python -m chip8.bench ROM/ --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tracemalloc
+from time import perf_counter_ns as timer
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from chip8.headless import CYCLES_PER_FRAME, expand_paths
+from chip8.scheduler import TIMER_HZ
+from chip8.vm import ENGINES, VM
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+# Synthetic programs loaded at 0x200, each looping over one opcode family
+MICRO_ROMS: Dict[str, bytes] = {
+    # V0 = 1, V1 = 3, then add, subtract, or, and, xor and shift forever
+    "micro:alu": bytes.fromhex("6001 6103 7005 8014 8115 8102 8013 8016 810e 1204"),
+    # Clear, then draw a 5 row sprite across the screen forever
+    "micro:draw": bytes.fromhex("00e0 a210 6000 6100 d015 7008 7101 1208 f090 9090 f0"),
+    # Call a subroutine that increments V0 and returns, forever
+    "micro:call": bytes.fromhex("2206 1200 0000 7001 00ee"),
+    # Store, load and BCD-convert registers at 0x300 forever
+    "micro:memory": bytes.fromhex("a300 7001 f355 f365 f033 1200"),
+}
+
+
+class BenchResult(NamedTuple):
+    """Measurements for one program on one engine"""
+
+    # ROM path or micro-ROM name
+    name: str
+    engine: str
+    # Instructions executed in the timed run
+    cycles: int
+    # Frames executed in the timed run
+    frames: int
+    # Wall-clock time of the fastest timed run, in nanoseconds
+    elapsed_ns: int
+    # Instructions and frames per second of the fastest run
+    ips: float
+    fps: float
+    # Peak memory allocated during a run, as traced by tracemalloc, in bytes
+    alloc_peak: Optional[int]
+    # Peak resident set size of the process after the run, in KiB
+    rss_peak_kb: Optional[int]
+    # repr() of the exception that stopped the program early, if any
+    error: Optional[str]
+
+
+def peak_rss_kb() -> Optional[int]:
+    """Returns the peak resident set size of this process in KiB, if known"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def _run(
+    program: bytes, engine: str, frames: int, cycles_per_frame: int
+) -> Tuple[VM, int]:
+    """Runs a program from a fresh VM, returns the VM and the elapsed time"""
+    vm = VM(engine, ips=cycles_per_frame * TIMER_HZ)
+    vm.cpu.mem.load(program, 0x200)
+    vm.cpu.rng.seed(0)
+    start = timer()
+    vm.run_frames(frames)
+    return vm, timer() - start
+
+
+def bench_program(
+    name: str,
+    program: bytes,
+    engine: str = "block",
+    cycles: int = 100_000,
+    cycles_per_frame: int = CYCLES_PER_FRAME,
+    repeat: int = 3,
+    trace_allocations: bool = True,
+) -> BenchResult:
+    """Runs a program `repeat` times for the given number of cycles, rounded
+    down to whole frames, and keeps the fastest run.
+
+    With trace_allocations, one more run is made under tracemalloc to measure
+    peak allocations. It is not timed, tracing slows execution down."""
+    frames = max(cycles // cycles_per_frame, 1)
+    best = None
+    error = None
+    alloc_peak = None
+    try:
+        for _ in range(0, repeat):
+            _, elapsed = _run(program, engine, frames, cycles_per_frame)
+            best = elapsed if best is None else min(best, elapsed)
+        if trace_allocations:
+            tracemalloc.start()
+            try:
+                _run(program, engine, frames, cycles_per_frame)
+                alloc_peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    except Exception as e:
+        # Unimplemented opcodes and the like fail this program only
+        error = repr(e)
+
+    if best is None:
+        return BenchResult(name, engine, 0, 0, 0, 0.0, 0.0, None, peak_rss_kb(), error)
+    seconds = max(best, 1) / 1e9
+    done = frames * cycles_per_frame
+    return BenchResult(
+        name,
+        engine,
+        done,
+        frames,
+        best,
+        done / seconds,
+        frames / seconds,
+        alloc_peak,
+        peak_rss_kb(),
+        error,
+    )
+
+
+def run_suite(
+    paths: Iterable[str] = (),
+    engines: Sequence[str] = ENGINES,
+    micro: bool = True,
+    **kwargs,
+) -> List[BenchResult]:
+    """Benchmarks every ROM and, optionally, every micro-ROM on every engine.
+    Keyword arguments are passed through to bench_program."""
+    programs = []
+    if micro:
+        programs.extend(MICRO_ROMS.items())
+    for path in expand_paths(paths):
+        with open(path, "rb") as f:
+            programs.append((path, f.read()))
+    return [
+        bench_program(name, program, engine, **kwargs)
+        for name, program in programs
+        for engine in engines
+    ]
+
+
+def metadata() -> Dict[str, Optional[str]]:
+    """Describes the machine and revision the benchmarks ran on"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def save(path: str, results: Sequence[BenchResult]) -> None:
+    """Writes results and metadata to a JSON file"""
+    with open(path, "w") as f:
+        json.dump(
+            {"meta": metadata(), "results": [r._asdict() for r in results]}, f, indent=2
+        )
+
+
+def load(path: str) -> List[BenchResult]:
+    """Reads results written by save()"""
+    with open(path) as f:
+        return [BenchResult(**r) for r in json.load(f)["results"]]
+
+
+def compare(
+    old: Sequence[BenchResult], new: Sequence[BenchResult], threshold: float = 0.1
+) -> List[Tuple[str, str, float]]:
+    """Returns (name, engine, new IPS / old IPS) of every program whose IPS
+    dropped by more than threshold, a fraction of the old IPS"""
+    before = {(r.name, r.engine): r for r in old if r.error is None and r.ips}
+    ret = []
+    for r in new:
+        prev = before.get((r.name, r.engine))
+        if prev is None:
+            continue
+        ratio = r.ips / prev.ips
+        if ratio < 1 - threshold:
+            ret.append((r.name, r.engine, ratio))
+    return ret
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark CHIP-8 engines")
+    parser.add_argument("roms", nargs="*", help="ROM files or directories of ROMs")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES))
+    parser.add_argument(
+        "--cycles", type=int, default=100_000, help="instructions per run"
+    )
+    parser.add_argument(
+        "--cycles-per-frame",
+        type=int,
+        default=CYCLES_PER_FRAME,
+        help="instructions per frame",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="timed runs, the fastest is kept"
+    )
+    parser.add_argument("--no-micro", action="store_true", help="skip the micro-ROMs")
+    parser.add_argument(
+        "--no-alloc", action="store_true", help="skip allocation tracing"
+    )
+    parser.add_argument("--json", metavar="PATH", help="save results to a JSON file")
+    parser.add_argument(
+        "--compare", metavar="PATH", help="compare against saved results"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="IPS drop reported as a regression"
+    )
+    args = parser.parse_args(argv)
+
+    results = run_suite(
+        args.roms,
+        engines=args.engines,
+        micro=not args.no_micro,
+        cycles=args.cycles,
+        cycles_per_frame=args.cycles_per_frame,
+        repeat=args.repeat,
+        trace_allocations=not args.no_alloc,
+    )
+    for r in results:
+        alloc = "-" if r.alloc_peak is None else f"{r.alloc_peak / 1024:.0f} KiB"
+        print(
+            f"{r.name:<24} {r.engine:<12} {r.ips:>12,.0f} IPS {r.fps:>10,.0f} FPS "
+            + f"alloc {alloc:>9} rss {r.rss_peak_kb} KiB"
+            + (f", error {r.error}" if r.error else "")
+        )
+    if args.json:
+        save(args.json, results)
+
+    failed = any(r.error for r in results)
+    if args.compare:
+        regressions = compare(load(args.compare), results, args.threshold)
+        for name, engine, ratio in regressions:
+            print(
+                f"regression: {name} on {engine} runs at {ratio:.0%} of the saved IPS"
+            )
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
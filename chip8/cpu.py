@@ -4,9 +4,38 @@ import chip8.parser as parser
 import chip8.registers as registers
 import chip8.stack as stack
 from chip8.parser import ParsedInstruction
-from random import randint
+from random import Random
 from time import perf_counter_ns as timer
-from typing import Dict, Callable
+from typing import Callable, Dict, Tuple
+
+# Opcodes with no control flow or side effects outside of the register file,
+# I and the timers
+STRAIGHT_LINE = frozenset(
+    {
+        0x0000,
+        0x6000,
+        0x7000,
+        0x8000,
+        0x8001,
+        0x8002,
+        0x8003,
+        0x8004,
+        0x8005,
+        0x8006,
+        0x8007,
+        0x800E,
+        0xA000,
+        0xC000,
+        0xF007,
+        0xF015,
+        0xF018,
+        0xF01E,
+        0xF065,
+    }
+)
+
+# Opcodes after which step() never advances IP on its own
+NO_ADVANCE = frozenset({0xEE, 0x1000, 0x2000})
 
 
 class CPU(object):
@@ -14,7 +43,7 @@ class CPU(object):
 
     def __init__(self):
         # 4096*1-byte (0, 2^8) addressable memory
-        self.mem = memory.Memory(0xFFF)
+        self.mem = memory.Memory(0x1000)
         # 16*1-byte (0, 2^8) registers
         self.reg = registers.Registers()
         # 64x32 1-bit (0, 1) display memory
@@ -33,6 +62,8 @@ class CPU(object):
         self.st = 0
         # Drawing flag
         self.df: bool = False
+        # Random number generator used by Cxkk
+        self.rng = Random()
 
     def reset(self) -> None:
         """Reset mutable components of the CPU to startup values"""
@@ -61,26 +92,28 @@ class CPU(object):
 
     def step(self, n_cycles: int = 1) -> None:
         """Step the CPU n cycles.
-        All values in memory are 2-byte aligned, so
+        Instructions are 2 bytes wide, so
         IP is incremented by 2 each cycle."""
         for _ in range(0, n_cycles):
-            # alias ParsedInstruction object at IP
-            inst: ParsedInstruction = self.mem[self.ip]
+            # fetch decoded instruction at IP
+            inst: ParsedInstruction = self.mem.fetch(self.ip)
             # update old_ip
             old_ip = self.ip
             # reset draw flag
             self.df = False
             # execute opcode
             self._method_lookup_table[inst.opcode](self, inst)
-            # Decrement timers
-            if self.st > 0:
-                self.st -= 1
-            if self.dt > 0:
-                self.dt -= 1
             # Increment IP if IP did not change and last instruction was not an unconditional jump.
             if old_ip == self.ip and inst.opcode not in {0xEE, 0x1000, 0x2000}:
                 self.ip += 2
 
+    def tick_timers(self) -> None:
+        """Decrements the delay and sound timers, called at 60 Hz"""
+        if self.st > 0:
+            self.st -= 1
+        if self.dt > 0:
+            self.dt -= 1
+
     def _push(self, v: int) -> None:
         """Pushes a value onto the stack and increments SP."""
         self.stack.push(v)
@@ -108,11 +141,7 @@ class CPU(object):
     def _1nnn(self, inst: ParsedInstruction) -> None:
         """Performs an immediate jump.
         Overwrites IP with a 12-bit immediate address"""
-        if inst.nnn % 2 != 0:
-            # "nudge" IP if not 2-byte unaligned
-            self.set_ip(inst.nnn + 0x1)
-        else:
-            self.set_ip(inst.nnn)
+        self.set_ip(inst.nnn)
 
     def _2nnn(self, inst: ParsedInstruction) -> None:
         """Call subroutine (function).
@@ -227,7 +256,7 @@ class CPU(object):
 
     def _Cxkk(self, inst: ParsedInstruction) -> None:
         """Set Vx = random byte AND kk"""
-        self.reg.set(inst.x, randint(0, 255) & inst.kk)
+        self.reg.set(inst.x, self.rng.randint(0, 255) & inst.kk)
 
     def _Dxyn(self, inst: ParsedInstruction) -> None:
         """Draw n-byte sprite starting at I at (Vx, Vy), setting VF on collision"""
@@ -246,30 +275,13 @@ class CPU(object):
         x = self.reg.get(inst.x) & self.display.SCR_W - 1
         y = self.reg.get(inst.y) & self.display.SCR_H - 1
 
-        # Read n (up to 15) bytes starting at I unaligned
-        bitmap: list[int] = self.mem.read_byte_range(self.i, self.i + inst.n)
-
-        y_offset = 0
-        for byte in bitmap:
-            for x_offset in range(8):
-                # Extract bitmask:
-                # Shift right up to 7 times and mask off MSB
-                if (byte >> 7 - x_offset) & 0b0000_0001 == 0b1:
-                    xx, yy = x + x_offset, y + y_offset
-                    if self.display.get_pixel(xx, yy) == 1:
-                        # This pixel was on
-                        # Set VF
-                        self.reg.set(0xF, 1)
-                        # 1 xor 1 = 0
-                        # Turn it off
-                        self.display.set_pixel(xx, yy, 0)
-                    else:
-                        # This pixel was off
-                        # 0 xor 1 = 1
-                        # Turn it on
-                        self.display.set_pixel(xx, yy, 1)
-
-            y_offset += 1
+        # Read n (up to 15) bytes starting at I
+        bitmap: bytes = self.mem.read_byte_range(self.i, self.i + inst.n)
+
+        # XOR each sprite row into the display, clipping at the edges
+        if self.display.draw_sprite(x, y, bitmap):
+            # A pixel that was on was turned off
+            self.reg.set(0xF, 1)
 
     def _Ex9E(self, inst: ParsedInstruction) -> None:
         raise NotImplementedError
@@ -306,7 +318,10 @@ class CPU(object):
     def _Fx33(self, inst: ParsedInstruction) -> None:
         """LD B, Vx
         Store BCD representation of Vx in memory locations I, I+1, I+2"""
-        raise NotImplementedError
+        vx = self.reg.get(inst.x)
+        self.mem[self.i] = vx // 100
+        self.mem[self.i + 1] = vx // 10 % 10
+        self.mem[self.i + 2] = vx % 10
 
     def _Fx55(self, inst: ParsedInstruction) -> None:
         """LD [I], Vx
@@ -319,7 +334,73 @@ class CPU(object):
         Read registers V0-Vx inclusive from memory starting at I"""
         # Plus one because range is exclusive
         for k in range(0, inst.x + 1):
-            self.reg.set(k, self.mem.read_any_potentially_unaligned(self.i + k))
+            self.reg.set(k, self.mem[self.i + k])
+
+    # Fused handlers for pairs of adjacent instructions. Each executes
+    # instruction a at IP and instruction b at IP + 2 exactly as two calls to
+    # step would, and leaves IP at the next instruction to execute.
+
+    def _6xkk_6xkk(self, a: ParsedInstruction, b: ParsedInstruction) -> None:
+        """6xkk, 6xkk: set two registers to bytes"""
+        self.reg.set(a.x, a.kk)
+        self.reg.set(b.x, b.kk)
+        self.ip += 4
+
+    def _7xkk_3xkk(self, a: ParsedInstruction, b: ParsedInstruction) -> None:
+        """7xkk, 3xkk: add kk to a register, then skip if a register equals kk"""
+        reg = self.reg
+        reg.set(a.x, reg.get(a.x) + a.kk)
+        self.ip += 6 if reg.get(b.x) == b.kk else 4
+
+    def _Fx07_3xkk(self, a: ParsedInstruction, b: ParsedInstruction) -> None:
+        """Fx07, 3xkk: read DT into a register, then skip if a register equals kk"""
+        reg = self.reg
+        reg.set(a.x, self.dt)
+        self.ip += 6 if reg.get(b.x) == b.kk else 4
+
+    def _Annn_Dxyn(self, a: ParsedInstruction, b: ParsedInstruction) -> None:
+        """Annn, Dxyn: point I at a sprite and draw it"""
+        self.i = a.nnn
+        self._Dxyn(b)
+        self.ip += 4
+
+    def _Annn_Fx1E(self, a: ParsedInstruction, b: ParsedInstruction) -> None:
+        """Annn, Fx1E: set I = nnn + Vx"""
+        self.i = a.nnn + self.reg.get(b.x)
+        self.ip += 4
+
+    def _Fx1E_Fx1E(self, a: ParsedInstruction, b: ParsedInstruction) -> None:
+        """Fx1E, Fx1E: add two registers to I"""
+        reg = self.reg
+        self.i = self.i + reg.get(a.x) + reg.get(b.x)
+        self.ip += 4
+
+    def _Fx1E_Fx65(self, a: ParsedInstruction, b: ParsedInstruction) -> None:
+        """Fx1E, Fx65: add a register to I, then read registers from memory at I"""
+        self.i = self.i + self.reg.get(a.x)
+        self._Fx65(b)
+        self.ip += 4
+
+    def _Fx1E_Dxyn(self, a: ParsedInstruction, b: ParsedInstruction) -> None:
+        """Fx1E, Dxyn: add a register to I, then draw the sprite at I"""
+        self.i = self.i + self.reg.get(a.x)
+        self._Dxyn(b)
+        self.ip += 4
+
+    def _7xkk_Fx1E(self, a: ParsedInstruction, b: ParsedInstruction) -> None:
+        """7xkk, Fx1E: add kk to a register, then add a register to I"""
+        reg = self.reg
+        reg.set(a.x, reg.get(a.x) + a.kk)
+        self.i = self.i + reg.get(b.x)
+        self.ip += 4
+
+    def _Dxyn_7xkk(self, a: ParsedInstruction, b: ParsedInstruction) -> None:
+        """Dxyn, 7xkk: draw a sprite, then add kk to a register"""
+        self._Dxyn(a)
+        # Drawing sets the flag, the following instruction resets it
+        self.df = False
+        self.reg.set(b.x, self.reg.get(b.x) + b.kk)
+        self.ip += 4
 
     # Opcode to class instance method lookup table
     _method_lookup_table: Dict[int, Callable] = {
@@ -359,3 +440,17 @@ class CPU(object):
         0xF055: _Fx55,
         0xF065: _Fx65,
     }
+
+    # Opcode pair to fused handler lookup table, see chip8/fusion.py
+    _fused_lookup_table: Dict[Tuple[int, int], Callable] = {
+        (0x6000, 0x6000): _6xkk_6xkk,
+        (0x7000, 0x3000): _7xkk_3xkk,
+        (0xF007, 0x3000): _Fx07_3xkk,
+        (0xA000, 0xD000): _Annn_Dxyn,
+        (0xA000, 0xF01E): _Annn_Fx1E,
+        (0xF01E, 0xF01E): _Fx1E_Fx1E,
+        (0xF01E, 0xF065): _Fx1E_Fx65,
+        (0xF01E, 0xD000): _Fx1E_Dxyn,
+        (0x7000, 0xF01E): _7xkk_Fx1E,
+        (0xD000, 0x7000): _Dxyn_7xkk,
+    }
@@ -1,30 +1,79 @@
-class Display(list):
+from typing import List
+
+
+class Display(object):
+    """64x32 monochrome display memory, packed as one int per row.
+
+    Pixel x of a row is stored in bit (SCR_W - 1 - x), so the leftmost pixel
+    is the most significant bit and a sprite byte can be XORed into a row
+    with a single shift."""
+
     def __init__(self) -> None:
-        # Call superclass init
-        super(Display, self).__init__()
         # Screen width in pixels
         self.SCR_W = 64
         # Screen height in pixels
         self.SCR_H = 32
         # Screen number of pixels
         self.SCR_PIX = self.SCR_W * self.SCR_H
-        # Append SCR_PIX 0s
-        for i in range(0, self.SCR_PIX):
-            self.append(0)
+        # SCR_H rows of SCR_W bits, all off
+        self.rows: List[int] = [0] * self.SCR_H
+        # Bit y is set when row y may have changed since the last take_dirty()
+        self.dirty: int = (1 << self.SCR_H) - 1
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Display) and self.rows == other.rows
 
     def reset(self) -> None:
         """Sets all pixel values to 0 (off)"""
-        for i in range(0, self.SCR_PIX):
-            self[i] = 0
+        self.rows[:] = [0] * self.SCR_H
+        self.dirty = (1 << self.SCR_H) - 1
 
-    def _xy_to_idx(self, x: int, y: int) -> int:
-        """Converts XY coordinates to a display memory address"""
-        return y * self.SCR_W + x
+    def take_dirty(self) -> int:
+        """Returns the mask of rows changed since the last call and clears it"""
+        ret, self.dirty = self.dirty, 0
+        return ret
+
+    def copy(self) -> "Display":
+        """Returns an independent copy of the display"""
+        ret = Display()
+        ret.rows[:] = self.rows
+        return ret
+
+    def to_bytes(self) -> bytes:
+        """Returns the display as SCR_H rows of SCR_W // 8 big-endian bytes"""
+        width = self.SCR_W // 8
+        return b"".join(row.to_bytes(width, "big") for row in self.rows)
 
     def set_pixel(self, x: int, y: int, v: int) -> None:
         """Sets the pixel at xy to value v"""
-        self[self._xy_to_idx(x, y)] = v
+        bit = 1 << (self.SCR_W - 1 - x)
+        if v:
+            self.rows[y] |= bit
+        else:
+            self.rows[y] &= ~bit
+        self.dirty |= 1 << y
 
     def get_pixel(self, x: int, y: int) -> int:
         """Returns the value stored in the pixel at xy"""
-        return self[self._xy_to_idx(x, y)]
+        return (self.rows[y] >> (self.SCR_W - 1 - x)) & 1
+
+    def draw_sprite(self, x: int, y: int, sprite: bytes) -> bool:
+        """XORs an 8 pixel wide sprite onto the display with its top left
+        corner at xy. Pixels falling off the right or bottom edge are clipped.
+
+        Returns True if any pixel that was on was turned off."""
+        rows = self.rows
+        collision = 0
+        dirty = 0
+        # Shift that lines the sprite's MSB up with pixel x
+        shift = self.SCR_W - 8 - x
+        for yy in range(y, min(y + len(sprite), self.SCR_H)):
+            byte = sprite[yy - y]
+            bits = byte << shift if shift >= 0 else byte >> -shift
+            if bits:
+                row = rows[yy]
+                collision |= row & bits
+                rows[yy] = row ^ bits
+                dirty |= 1 << yy
+        self.dirty |= dirty
+        return collision != 0
@@ -0,0 +1,215 @@
+"""Multiprocess VM fleet.
+
+Spreads many VMs over a process pool sized to the available cores. Every VM
+owns a fixed-size slot in one multiprocessing.shared_memory block, into which
+its worker publishes registers, timers and the framebuffer, so a coordinator
+can watch all of them without pickling.
+
+    with Fleet(["ROM/trip8.bin"] * 64) as fleet:
+        fleet.start(cycles=1_000_000)
+        while not fleet.done():
+            print(fleet.read(0).ip)
+        fleet.wait()
+"""
+
+import os
+import struct
+from multiprocessing import Pool
+from multiprocessing.pool import AsyncResult
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, NamedTuple, Optional, Sequence
+
+from chip8.headless import CYCLES_PER_FRAME
+from chip8.scheduler import TIMER_HZ
+from chip8.vm import VM
+
+# Slot status values
+STATUS_PENDING = 0
+STATUS_RUNNING = 1
+STATUS_DONE = 2
+STATUS_ERROR = 3
+
+# Slot layout:
+# sequence number (odd while the slot is being written), status,
+# ip, i, sp, dt, st, cycles executed, V0-VF, packed framebuffer
+_SLOT = struct.Struct("<IB5HQ16s256s")
+SLOT_SIZE = _SLOT.size
+
+
+class SlotState(NamedTuple):
+    """State published by one VM"""
+
+    status: int
+    ip: int
+    i: int
+    sp: int
+    dt: int
+    st: int
+    cycles: int
+    registers: bytes
+    display: bytes
+
+
+def available_cores() -> int:
+    """Returns the number of cores this process may run on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        # Not available on every platform
+        return os.cpu_count() or 1
+
+
+def _publish(
+    buf, offset: int, seq: int, status: int, vm: Optional[VM], cycles: int
+) -> int:
+    """Writes a VM's state into its slot, or a zeroed state if there is no VM,
+    returns the new sequence number"""
+    # Odd sequence numbers mark the slot as being written
+    struct.pack_into("<I", buf, offset, seq + 1)
+    if vm is None:
+        _SLOT.pack_into(buf, offset, seq + 1, status, 0, 0, 0, 0, 0, cycles, b"", b"")
+    else:
+        cpu = vm.cpu
+        _SLOT.pack_into(
+            buf,
+            offset,
+            seq + 1,
+            status,
+            cpu.ip & 0xFFFF,
+            cpu.i & 0xFFFF,
+            cpu.sp & 0xFFFF,
+            cpu.dt,
+            cpu.st,
+            cycles,
+            bytes(cpu.reg),
+            cpu.display.to_bytes(),
+        )
+    struct.pack_into("<I", buf, offset, seq + 2)
+    return seq + 2
+
+
+def _run_slot(
+    shm_name: str,
+    slot: int,
+    rom: str,
+    cycles: int,
+    cycles_per_frame: int,
+    publish_frames: int,
+    engine: str,
+    seed: Optional[int],
+) -> Optional[str]:
+    """Pool worker: runs one VM, publishing its state every publish_frames frames.
+    Returns repr() of the exception that stopped the VM, if any."""
+    shm = SharedMemory(name=shm_name)
+    offset = slot * SLOT_SIZE
+    seq = 0
+    vm: Optional[VM] = None
+    loaded = False
+    done = frame = 0
+    error = None
+    try:
+        try:
+            # Bad engines and unreadable ROMs fail this VM only
+            vm = VM(engine, ips=cycles_per_frame * TIMER_HZ)
+            vm.load(rom)
+            loaded = True
+            if seed is not None:
+                vm.cpu.rng.seed(seed)
+            while done < cycles:
+                if cycles - done >= cycles_per_frame:
+                    done += vm.run_frames(1)
+                else:
+                    vm.step(cycles - done)
+                    done = cycles
+                frame += 1
+                if frame % publish_frames == 0:
+                    seq = _publish(shm.buf, offset, seq, STATUS_RUNNING, vm, done)
+        except Exception as e:
+            error = repr(e)
+        status = STATUS_DONE if error is None else STATUS_ERROR
+        # Zeroed unless the VM was built and its ROM loaded
+        _publish(shm.buf, offset, seq, status, vm if loaded else None, done)
+        return error
+    finally:
+        shm.close()
+
+
+class Fleet(object):
+    """Runs one VM per ROM across a pool of worker processes"""
+
+    def __init__(
+        self,
+        roms: Sequence[str],
+        processes: Optional[int] = None,
+        engine: str = "block",
+        cycles_per_frame: int = CYCLES_PER_FRAME,
+        publish_frames: int = 60,
+        seed: Optional[int] = 0,
+    ):
+        self.roms = list(roms)
+        self.engine = engine
+        self.cycles_per_frame = cycles_per_frame
+        self.publish_frames = publish_frames
+        self.seed = seed
+        # One zeroed slot per VM
+        self.shm = SharedMemory(create=True, size=max(1, len(self.roms)) * SLOT_SIZE)
+        self.shm.buf[:] = bytes(self.shm.size)
+        self.pool = Pool(processes or available_cores())
+        self._result: Optional[AsyncResult] = None
+
+    def __enter__(self) -> "Fleet":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.roms)
+
+    def start(self, cycles: int) -> None:
+        """Starts every VM running for the given number of cycles"""
+        args = [
+            (
+                self.shm.name,
+                slot,
+                rom,
+                cycles,
+                self.cycles_per_frame,
+                self.publish_frames,
+                self.engine,
+                self.seed,
+            )
+            for slot, rom in enumerate(self.roms)
+        ]
+        self._result = self.pool.starmap_async(_run_slot, args, chunksize=1)
+
+    def done(self) -> bool:
+        """Returns True once every VM has finished"""
+        return self._result is not None and self._result.ready()
+
+    def wait(self) -> List[Optional[str]]:
+        """Waits for every VM to finish, returns the error of each, if any"""
+        return self._result.get()
+
+    def run(self, cycles: int) -> List[SlotState]:
+        """Runs every VM to completion and returns their final states"""
+        self.start(cycles)
+        self.wait()
+        return [self.read(slot) for slot in range(0, len(self.roms))]
+
+    def read(self, slot: int) -> SlotState:
+        """Reads the latest consistent state published to a slot"""
+        offset = slot * SLOT_SIZE
+        while True:
+            fields = _SLOT.unpack_from(self.shm.buf, offset)
+            (seq,) = struct.unpack_from("<I", self.shm.buf, offset)
+            # Retry torn reads of a slot that is being written
+            if fields[0] % 2 == 0 and seq == fields[0]:
+                return SlotState(*fields[1:])
+
+    def close(self) -> None:
+        """Stops the workers and releases the shared memory block"""
+        self.pool.terminate()
+        self.pool.join()
+        self.shm.close()
+        self.shm.unlink()
@@ -0,0 +1,125 @@
+"""Superinstruction fusion.
+
+Profiling ROMs by adjacent opcode pairs (python -m chip8.profiler --pairs)
+shows a handful of pairs making up a large share of all instructions, e.g.
+Annn followed by Dxyn to draw a sprite, or Fx07, 3xkk, 1nnn waiting for the
+delay timer. CPU._fused_lookup_table has a handler per such pair that runs
+both instructions in one dispatch.
+
+FusedEngine is an interpreter that dispatches those pairs through the fused
+handlers, and every other instruction straight from a table of handlers and
+decoded instructions by address. What runs at an address, a pair or a single
+instruction, is decided the first time it executes and forgotten when either
+instruction is written, so loading a program or self-modifying code
+re-selects the code it touches, and only code that runs is ever looked at.
+"""
+
+from typing import Callable, List, Optional, Tuple, Union
+
+from chip8.cpu import CPU, NO_ADVANCE
+from chip8.parser import ParsedInstruction
+
+# Opcodes that start a fusable pair
+_FIRST = {a for a, _ in CPU._fused_lookup_table}
+
+# Marks an address whose instruction has not been selected yet
+_UNSELECTED = False
+
+# What runs at an address: a fused handler and the two instructions it runs,
+# or a plain handler, its instruction and None. Last, whether the first
+# instruction advances IP when it leaves it unchanged, as in CPU.step.
+Entry = Tuple[
+    Callable[..., None],
+    ParsedInstruction,
+    Optional[ParsedInstruction],
+    bool,
+]
+
+
+class FusedEngine(object):
+    """Execution engine that runs common instruction pairs with one dispatch.
+
+    Results are identical to CPU.step. A pair is only fused when both of its
+    instructions fit in the cycle budget, so budgets ending mid-pair run the
+    first instruction alone. Every other instruction is dispatched from the
+    same per-address table, skipping the fetch and opcode lookup CPU.step
+    pays on each cycle."""
+
+    def __init__(self, cpu: CPU):
+        self.cpu = cpu
+        # Entry for the instruction at each address, or _UNSELECTED
+        self._code: List[Union[Entry, bool]] = [_UNSELECTED] * cpu.mem.size
+        # Bytes [lo, hi) covered by selected entries, empty to begin with.
+        # Writes to data outside it, the common case, skip invalidating.
+        self._span = [cpu.mem.size, 0]
+        cpu.mem.add_write_hook(self._invalidate)
+
+    def step(self, n_cycles: int = 1) -> None:
+        """Step the CPU n cycles, two at a time where a pair is fused"""
+        cpu = self.cpu
+        if cpu._method_lookup_table is not CPU._method_lookup_table:
+            # An instrumented dispatch table is attached (profiler, tracer),
+            # every instruction has to go through it. Compared by identity,
+            # reading cpu.__dict__ would slow every attribute access on cpu.
+            cpu.step(n_cycles)
+            return
+        code = self._code
+        # A for loop over a range is markedly faster than counting down in a
+        # while loop, fused pairs consume the extra cycle with next()
+        last = n_cycles - 1
+        cycles = iter(range(0, n_cycles))
+        for k in cycles:
+            ip = cpu.ip
+            entry = code[ip]
+            if entry is _UNSELECTED:
+                entry = self._select(ip)
+            cpu.df = False
+            handler, a, b, advances = entry
+            if b is None:
+                handler(cpu, a)
+            elif k < last:
+                handler(cpu, a, b)
+                next(cycles)
+                continue
+            else:
+                CPU._method_lookup_table[a.opcode](cpu, a)
+            if advances and cpu.ip == ip:
+                cpu.ip = ip + 2
+
+    def inherit(self, other: "FusedEngine") -> None:
+        """Adopts the selected entries of an engine running identical code"""
+        self._code = list(other._code)
+        self._span = list(other._span)
+
+    def _select(self, addr: int) -> Entry:
+        """Selects and records the entry for the instruction at addr, fusing
+        it with the next one if the pair has a fused handler. Raises the
+        interpreter's IndexError or KeyError for an address it cannot run."""
+        cpu = self.cpu
+        mem = cpu.mem
+        a = mem.fetch(addr)
+        # Fail in the order CPU.step does, clearing the draw flag in between
+        cpu.df = False
+        handler = CPU._method_lookup_table[a.opcode]
+        b = None
+        if a.opcode in _FIRST and addr < mem.size - 3:
+            b = mem.fetch(addr + 2)
+            fused = CPU._fused_lookup_table.get((a.opcode, b.opcode))
+            if fused is None:
+                b = None
+            else:
+                handler = fused
+        entry = self._code[addr] = (handler, a, b, a.opcode not in NO_ADVANCE)
+        span = self._span
+        span[0] = min(span[0], addr)
+        span[1] = max(span[1], addr + (2 if b is None else 4))
+        return entry
+
+    def _invalidate(self, start: int, end: int) -> None:
+        """Forgets the entries overlapping the written range [start, end)"""
+        span = self._span
+        if end <= span[0] or start >= span[1]:
+            return
+        # A pair spans four bytes, so the three addresses before start cover it too
+        lo = max(start - 3, 0)
+        self._code[lo:end] = [_UNSELECTED] * (end - lo)
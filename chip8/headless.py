@@ -0,0 +1,226 @@
+"""Headless batch runner.
+
+Runs CHIP-8 programs without a display or event loop and reports digests of
+the final machine state. Usable from Python through run_rom/run_batch, or
+from the command line:
+
+    python -m chip8.headless ROM/ --cycles 100000 --json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+from time import perf_counter_ns as timer
+from typing import Iterable, List, NamedTuple, Optional
+
+from chip8.romcache import RomCache
+from chip8.scheduler import TIMER_HZ
+from chip8.vm import ENGINES, VM
+
+# Instructions executed per 60 Hz frame at roughly 700 instructions per second
+CYCLES_PER_FRAME = 12
+
+
+class RunResult(NamedTuple):
+    """Outcome of running one ROM"""
+
+    # Path of the ROM
+    rom: str
+    # Instructions executed
+    cycles: int
+    # Whole frames executed
+    frames: int
+    # SHA-1 of the CPU state and memory
+    state_digest: str
+    # SHA-1 of the packed framebuffer
+    display_digest: str
+    # Wall-clock time spent executing, in nanoseconds
+    elapsed_ns: int
+    # repr() of the exception that stopped the ROM early, if any
+    error: Optional[str]
+
+
+def state_digest(vm: VM) -> str:
+    """Returns a SHA-1 hex digest of the CPU registers, stack and memory"""
+    cpu = vm.cpu
+    h = hashlib.sha1()
+    h.update(struct.pack("<5q", cpu.ip, cpu.i, cpu.sp, cpu.dt, cpu.st))
+    h.update(bytes(cpu.reg))
+    h.update(struct.pack(f"<{len(cpu.stack)}H", *cpu.stack))
+    h.update(cpu.mem.tobytes())
+    return h.hexdigest()
+
+
+def display_digest(vm: VM) -> str:
+    """Returns a SHA-1 hex digest of the framebuffer"""
+    return hashlib.sha1(vm.cpu.display.to_bytes()).hexdigest()
+
+
+def run_rom(
+    path: str,
+    cycles: Optional[int] = None,
+    frames: Optional[int] = None,
+    cycles_per_frame: int = CYCLES_PER_FRAME,
+    engine: str = "block",
+    seed: Optional[int] = 0,
+    idle_skip: bool = False,
+    rom_cache: Optional[RomCache] = None,
+) -> RunResult:
+    """Runs a single ROM until either the cycle or the frame budget is spent.
+
+    The random number generator is seeded with seed, so that runs are
+    reproducible, unless seed is None. With idle_skip, loops waiting on the
+    delay timer are fast-forwarded, with identical results. With a rom_cache,
+    the ROM is loaded pre-decoded from it.
+
+    If the ROM raises an exception, the result counts the instructions that
+    completed before it. Those of the failing frame are found by replaying
+    it one instruction at a time, so they are only counted if seed is set."""
+    if cycles is None and frames is None:
+        raise ValueError("A cycle or frame budget is required")
+    if cycles is None:
+        cycles = frames * cycles_per_frame
+
+    vm = VM(engine, ips=cycles_per_frame * TIMER_HZ, idle_skip=idle_skip)
+    vm.load(path, cache=rom_cache)
+    if seed is not None:
+        vm.cpu.rng.seed(seed)
+
+    cycles_done = frames_done = 0
+    error = None
+    start = timer()
+    try:
+        while cycles_done < cycles and (frames is None or frames_done < frames):
+            if cycles - cycles_done >= cycles_per_frame:
+                cycles_done += vm.run_frames(1)
+                frames_done += 1
+            else:
+                # Partial frame at the end of the cycle budget, timers do not tick
+                vm.step(cycles - cycles_done)
+                cycles_done = cycles
+    except Exception as e:
+        # Unimplemented opcodes, stack overflows and the like end this ROM only
+        error = repr(e)
+    elapsed_ns = timer() - start
+    if error is not None and seed is not None:
+        cycles_done = _cycles_before_error(path, frames_done, cycles_per_frame, seed)
+
+    return RunResult(
+        path,
+        cycles_done,
+        frames_done,
+        state_digest(vm),
+        display_digest(vm),
+        elapsed_ns,
+        error,
+    )
+
+
+def _cycles_before_error(
+    path: str, frames: int, cycles_per_frame: int, seed: int
+) -> int:
+    """Replays a run that raised during frames + 1 with the interpreter,
+    stepping the last frame one instruction at a time, and returns the
+    number of instructions that completed"""
+    vm = VM("interpreter", ips=cycles_per_frame * TIMER_HZ)
+    vm.load(path)
+    vm.cpu.rng.seed(seed)
+    vm.run_frames(frames)
+    try:
+        for _ in range(0, cycles_per_frame):
+            vm.step(1)
+    except Exception:
+        pass
+    return vm.cycles
+
+
+def run_batch(paths: Iterable[str], **kwargs) -> List[RunResult]:
+    """Runs each ROM in turn, passing keyword arguments through to run_rom"""
+    return [run_rom(path, **kwargs) for path in paths]
+
+
+def expand_paths(paths: Iterable[str]) -> List[str]:
+    """Expands directories into the sorted list of files they contain"""
+    ret = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if os.path.isfile(os.path.join(path, name)):
+                    ret.append(os.path.join(path, name))
+        else:
+            ret.append(path)
+    return ret
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run CHIP-8 ROMs without a display")
+    parser.add_argument("roms", nargs="+", help="ROM files or directories of ROMs")
+    parser.add_argument("--cycles", type=int, help="instruction budget per ROM")
+    parser.add_argument("--frames", type=int, help="frame budget per ROM")
+    parser.add_argument(
+        "--cycles-per-frame",
+        type=int,
+        default=CYCLES_PER_FRAME,
+        help="instructions per frame",
+    )
+    parser.add_argument("--engine", choices=ENGINES, default="block")
+    parser.add_argument(
+        "--seed", type=int, default=0, help="random number generator seed"
+    )
+    parser.add_argument(
+        "--idle-skip",
+        action="store_true",
+        help="fast-forward loops waiting on the delay timer",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="print one JSON object per ROM"
+    )
+    parser.add_argument(
+        "--rom-cache",
+        metavar="DIR",
+        help="pre-decode the ROMs in parallel into a cache",
+    )
+    args = parser.parse_args(argv)
+
+    if args.cycles is None and args.frames is None:
+        parser.error("one of --cycles or --frames is required")
+
+    paths = expand_paths(args.roms)
+    rom_cache = None
+    if args.rom_cache is not None:
+        rom_cache = RomCache(args.rom_cache)
+        rom_cache.warm(paths)
+
+    failed = 0
+    for path in paths:
+        result = run_rom(
+            path,
+            cycles=args.cycles,
+            frames=args.frames,
+            cycles_per_frame=args.cycles_per_frame,
+            engine=args.engine,
+            seed=args.seed,
+            idle_skip=args.idle_skip,
+            rom_cache=rom_cache,
+        )
+        if result.error is not None:
+            failed += 1
+        if args.json:
+            print(json.dumps(result._asdict()))
+        else:
+            print(
+                f"{result.rom}: {result.cycles} cycles, {result.frames} frames, "
+                + f"{result.elapsed_ns / 1e6:.1f} ms, "
+                + f"state {result.state_digest[:12]}, "
+                + f"display {result.display_digest[:12]}"
+                + (f", error {result.error}" if result.error else "")
+            )
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
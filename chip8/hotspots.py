@@ -0,0 +1,297 @@
+"""Hot-spot sampling and loop detection.
+
+HotspotSampler wraps a VM's engine and samples IP every `interval`
+instructions, building a histogram over the address space. Samples are
+grouped into basic blocks and into loops closed by a backward jump. Loops
+whose body only polls the delay timer, or that jump to themselves, are
+flagged as busy-waits, the candidates for idle skipping.
+
+The histogram can be drawn as an ASCII heatmap, or written as a PNG without
+any extra dependencies:
+
+    python -m chip8.hotspots ROM/trip8.bin --frames 600 --png trip8.png
+"""
+
+import argparse
+import math
+import struct
+import sys
+import zlib
+from typing import List, NamedTuple, Optional, Tuple
+
+from chip8.cpu import STRAIGHT_LINE
+from chip8.scheduler import DEFAULT_IPS
+from chip8.translator import find_block
+from chip8.vm import VM
+
+# Characters of the ASCII heatmap, coldest first
+_SHADES = " .:-=+*#%@"
+
+# Opcodes a loop may contain and still only be waiting on the delay timer:
+# reading DT, comparing registers and jumping
+_WAIT_OPCODES = {0x0000, 0xF007, 0x3000, 0x4000, 0x5000, 0x9000, 0x1000}
+
+
+class BlockHeat(NamedTuple):
+    """Samples that fell in one basic block"""
+
+    # Address range [start, end) of the block
+    start: int
+    end: int
+    samples: int
+
+
+class Loop(NamedTuple):
+    """A backward jump and the code it repeats"""
+
+    # Address range [start, end) of the loop body, including the jump
+    start: int
+    end: int
+    samples: int
+    # "spin" for a jump to itself, "timer-wait" for a loop that only polls
+    # the delay timer, otherwise "loop"
+    kind: str
+
+
+class _SamplingEngine(object):
+    """Engine wrapper that samples IP between runs of `interval` instructions"""
+
+    def __init__(self, engine, cpu, samples: List[int], interval: int):
+        self.engine = engine
+        self.cpu = cpu
+        self.samples = samples
+        self.interval = interval
+        # Instructions left until the next sample
+        self._countdown = interval
+
+    def __getattr__(self, name):
+        return getattr(self.engine, name)
+
+    def step(self, n_cycles: int = 1) -> None:
+        while n_cycles > 0:
+            n = min(n_cycles, self._countdown)
+            self.engine.step(n_cycles=n)
+            n_cycles -= n
+            self._countdown -= n
+            if self._countdown == 0:
+                # Bnnn can jump up to 0xFF past the end of memory
+                if self.cpu.ip < len(self.samples):
+                    self.samples[self.cpu.ip] += 1
+                self._countdown = self.interval
+
+
+class HotspotSampler(object):
+    """Samples where a VM spends its time.
+
+    Sampling is stride-based rather than timer-based, so runs are
+    reproducible. The default interval is prime so it does not fall in step
+    with short loops."""
+
+    def __init__(self, vm: VM, interval: int = 7):
+        if interval < 1:
+            raise ValueError("interval must be at least 1")
+        self.vm = vm
+        self.interval = interval
+        # Samples per address
+        self.samples: List[int] = [0] * vm.cpu.mem.size
+        self._engine: Optional[_SamplingEngine] = None
+
+    def __enter__(self) -> "HotspotSampler":
+        self.attach()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.detach()
+
+    def attach(self) -> None:
+        """Starts sampling everything the VM executes"""
+        if self._engine is None:
+            vm = self.vm
+            self._engine = _SamplingEngine(
+                vm.engine, vm.cpu, self.samples, self.interval
+            )
+            vm.engine = self._engine
+
+    def detach(self) -> None:
+        """Stops sampling, restoring the VM's engine"""
+        if self._engine is not None:
+            self.vm.engine = self._engine.engine
+            self._engine = None
+
+    def total(self) -> int:
+        return sum(self.samples)
+
+    def hottest(self, n: int = 10) -> List[Tuple[int, int]]:
+        """Returns the n most sampled (address, samples) pairs"""
+        ret = [(addr, hits) for addr, hits in enumerate(self.samples) if hits]
+        ret.sort(key=lambda pair: pair[1], reverse=True)
+        return ret[:n]
+
+    def blocks(self) -> List[BlockHeat]:
+        """Groups samples into basic blocks, hottest first.
+
+        Block leaders are the entry point, the targets of sampled jumps and
+        calls and the addresses after sampled branches. Hot code is sampled,
+        so its branches are found too."""
+        mem = self.vm.cpu.mem
+        sampled = [addr for addr, hits in enumerate(self.samples) if hits]
+        leaders = {0x200}
+        for addr in sampled:
+            inst = mem.fetch(addr) if addr + 1 < mem.size else None
+            if inst is None or inst.opcode in STRAIGHT_LINE:
+                continue
+            if inst.opcode in {0x1000, 0x2000}:
+                leaders.add(inst.nnn)
+            # Fall through and skip targets
+            leaders.update((addr + 2, addr + 4))
+        ranges = []
+        for leader in sorted(leaders):
+            body = find_block(mem, leader)
+            if body:
+                ranges.append((leader, body[-1][0] + 2))
+        ret = {}
+        for addr in sampled:
+            # Innermost block starting at or before addr that covers it
+            for start, end in reversed(ranges):
+                if start <= addr < end:
+                    ret[(start, end)] = ret.get((start, end), 0) + self.samples[addr]
+                    break
+            else:
+                ret[(addr, addr + 2)] = (
+                    ret.get((addr, addr + 2), 0) + self.samples[addr]
+                )
+        heat = [BlockHeat(start, end, hits) for (start, end), hits in ret.items()]
+        heat.sort(key=lambda b: b.samples, reverse=True)
+        return heat
+
+    def loops(self, max_length: int = 64) -> List[Loop]:
+        """Finds sampled backward jumps of at most max_length bytes, hottest first"""
+        mem = self.vm.cpu.mem
+        ret = []
+        for addr, hits in enumerate(self.samples):
+            if not hits or addr + 1 >= mem.size:
+                continue
+            inst = mem.fetch(addr)
+            if inst.opcode != 0x1000 or not addr - max_length <= inst.nnn <= addr:
+                continue
+            start, end = inst.nnn, addr + 2
+            ops = {mem.fetch(a).opcode for a in range(start, end, 2)}
+            if start == addr:
+                kind = "spin"
+            elif 0xF007 in ops and ops <= _WAIT_OPCODES:
+                kind = "timer-wait"
+            else:
+                kind = "loop"
+            ret.append(Loop(start, end, sum(self.samples[start:end]), kind))
+        ret.sort(key=lambda loop: loop.samples, reverse=True)
+        return ret
+
+    def heatmap(
+        self, width: int = 64, start: int = 0, end: Optional[int] = None
+    ) -> str:
+        """Returns an ASCII heatmap of [start, end), width bytes per line.
+
+        Each character covers one 2-byte instruction slot. Shades are
+        logarithmic in the number of samples."""
+        end = len(self.samples) if end is None else end
+        peak = math.log1p(max(self.samples[start:end], default=0)) or 1
+        lines = []
+        for row in range(start, end, width):
+            line = []
+            for addr in range(row, min(row + width, end), 2):
+                hits = sum(self.samples[addr : addr + 2])
+                shade = 0 if not hits else max(1, round(math.log1p(hits) / peak * 9))
+                line.append(_SHADES[min(shade, 9)])
+            lines.append(f"{row:#05x} |{''.join(line)}|")
+        return "\n".join(lines)
+
+    def to_png(self, path: str, width: int = 64, scale: int = 8) -> None:
+        """Writes the heatmap as a PNG, one width-byte row of memory per
+        pixel row, each byte scale pixels wide and tall"""
+        peak = math.log1p(max(self.samples)) or 1
+        rows = []
+        for row in range(0, len(self.samples), width):
+            line = bytearray()
+            for hits in self.samples[row : row + width]:
+                line += _heat_color(math.log1p(hits) / peak if hits else -1) * scale
+            rows.extend([b"\x00" + bytes(line)] * scale)
+        _write_png(path, width * scale, len(rows), b"".join(rows))
+
+
+def _heat_color(t: float) -> bytes:
+    """RGB for a heat in [0, 1], dark grey for no samples, blue to red"""
+    if t < 0:
+        return b"\x20\x20\x20"
+    return bytes(
+        (round(255 * t), round(64 * (1 - abs(2 * t - 1))), round(255 * (1 - t)))
+    )
+
+
+def _write_png(path: str, width: int, height: int, scanlines: bytes) -> None:
+    """Writes 8-bit RGB scanlines, each prefixed with filter type 0, as a PNG"""
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data))
+            + kind
+            + data
+            + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+        )
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(scanlines, 9)))
+        f.write(chunk(b"IEND", b""))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Find where a CHIP-8 ROM spends its time"
+    )
+    parser.add_argument("rom", help="ROM file")
+    parser.add_argument("--frames", type=int, default=600, help="60 Hz frames to run")
+    parser.add_argument(
+        "--ips", type=int, default=DEFAULT_IPS, help="instructions per second"
+    )
+    parser.add_argument(
+        "--interval", type=int, default=7, help="instructions between samples"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="random number generator seed"
+    )
+    parser.add_argument("--png", metavar="PATH", help="also write the heatmap as a PNG")
+    args = parser.parse_args(argv)
+
+    vm = VM("block", ips=args.ips)
+    vm.load(args.rom)
+    vm.cpu.rng.seed(args.seed)
+    sampler = HotspotSampler(vm, args.interval)
+    error = None
+    with sampler:
+        try:
+            vm.run_frames(args.frames)
+        except Exception as e:
+            error = repr(e)
+
+    total = sampler.total() or 1
+    print(sampler.heatmap(start=0x200, end=min(0x200 + 0x400, vm.cpu.mem.size)))
+    print("\nhottest blocks")
+    for block in sampler.blocks()[:10]:
+        print(
+            f"  {block.start:#05x}-{block.end:#05x} {100 * block.samples / total:6.1f}%"
+        )
+    print("\nloops")
+    for loop in sampler.loops()[:10]:
+        share = 100 * loop.samples / total
+        print(f"  {loop.start:#05x}-{loop.end:#05x} {share:6.1f}% {loop.kind}")
+    if args.png:
+        sampler.to_png(args.png)
+    if error is not None:
+        print(f"error {error}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
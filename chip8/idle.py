@@ -0,0 +1,133 @@
+"""Idle-loop fast-forward.
+
+ROMs commonly wait for the delay timer with loops like
+
+    loop: Fx07      ; Vx = DT
+          3x00      ; skip the jump once DT reaches 0
+          1nnn      ; jump to loop
+
+The timers only tick between frames, so once such a loop has run one
+iteration without changing any state, every further iteration in the same
+frame is identical. IdleSkipper detects these fixed points and skips the
+remaining whole iterations of the frame, then executes the leftover partial
+iteration normally, so the machine ends the frame in exactly the state
+interpretation would have left it in.
+"""
+
+from typing import Dict
+
+from chip8.cpu import STRAIGHT_LINE
+
+# Instructions a skippable loop may contain: everything that only reads and
+# writes registers, I and the timers, plus skips and jumps. Loops containing
+# anything else (memory writes, drawing, calls, Cxkk) are never skipped.
+_IDLE_OPCODES = (STRAIGHT_LINE - {0xC000}) | {0x1000, 0x3000, 0x4000, 0x5000, 0x9000}
+
+# Longest loop considered, in instructions
+MAX_LOOP_LENGTH = 16
+
+
+class IdleSkipper(object):
+    """Runs a VM's engine, fast-forwarding loops that reach a fixed point"""
+
+    def __init__(self, vm, chunk: int = 64):
+        self.vm = vm
+        # Instructions run between checks for an idle loop
+        self.chunk = chunk
+        # Instructions skipped so far
+        self.skipped = 0
+        self._busy = set()
+        # Addresses executed by the current probe
+        self._visited = []
+        # Whether each address checked so far lies in a candidate loop
+        self._loops: Dict[int, bool] = {}
+        vm.cpu.mem.add_write_hook(self._invalidate)
+
+    def run(self, n_cycles: int) -> None:
+        """Executes n instructions, skipping idle iterations"""
+        cpu = self.vm.cpu
+        # Addresses of loops found not to be idle during this call. They are
+        # unlikely to become idle before the timers tick again.
+        busy = self._busy = set()
+        while n_cycles > 0:
+            in_loop = self._loops.get(cpu.ip)
+            if in_loop is None:
+                in_loop = self._loops[cpu.ip] = self._find_loop(cpu.ip)
+            if in_loop and cpu.ip not in busy:
+                n_cycles -= self._probe(n_cycles)
+            else:
+                n = min(n_cycles, self.chunk)
+                self.vm.engine.step(n_cycles=n)
+                n_cycles -= n
+
+    def _state(self) -> tuple:
+        """Everything an idle loop could change"""
+        cpu = self.vm.cpu
+        return cpu.ip, cpu.i, cpu.sp, cpu.dt, cpu.st, bytes(cpu.reg)
+
+    def _iterate(self, limit: int) -> int:
+        """Executes instructions until IP returns to where it started.
+
+        Returns the number executed. If the loop is left, an instruction
+        outside _IDLE_OPCODES comes up or limit is reached first, returns
+        minus the number executed instead."""
+        cpu, engine = self.vm.cpu, self.vm.engine
+        start = cpu.ip
+        for n in range(0, min(limit, MAX_LOOP_LENGTH)):
+            if cpu.mem.fetch(cpu.ip).opcode not in _IDLE_OPCODES:
+                return -n
+            self._visited.append(cpu.ip)
+            engine.step(n_cycles=1)
+            if cpu.ip == start:
+                return n + 1
+        return -min(limit, MAX_LOOP_LENGTH)
+
+    def _probe(self, n_cycles: int) -> int:
+        """Runs up to two iterations of the loop at IP and, if the second one
+        changed nothing, skips every remaining whole iteration.
+
+        Returns the number of instructions executed or skipped."""
+        self._visited = []
+        # The first iteration brings the loop to its steady state,
+        # e.g. loads the current value of DT
+        first = self._iterate(n_cycles)
+        if first <= 0:
+            return -first
+        before = self._state()
+        second = self._iterate(n_cycles - first)
+        if second <= 0:
+            return first - second
+        done = first + second
+        if self._state() != before:
+            self._busy.update(self._visited)
+            return done
+        # Fixed point, the rest of the frame repeats this iteration
+        remaining = n_cycles - done
+        skip = remaining - remaining % second
+        self.skipped += skip
+        return done + skip
+
+    def _find_loop(self, addr: int) -> bool:
+        """Returns whether addr is inside a short loop closed by a backward
+        jump, made only of instructions in _IDLE_OPCODES, that reads DT or
+        jumps to itself"""
+        mem = self.vm.cpu.mem
+        end = min(addr + 2 * MAX_LOOP_LENGTH, mem.size - 1)
+        for jump in range(addr, end, 2):
+            inst = mem.fetch(jump)
+            if inst.opcode not in _IDLE_OPCODES:
+                return False
+            if inst.opcode == 0x1000:
+                target = inst.nnn
+                if not jump - 2 * MAX_LOOP_LENGTH < target <= addr:
+                    return False
+                ops = {mem.fetch(a).opcode for a in range(target, jump, 2)}
+                # Only loops that poll the delay timer, or jump to themselves,
+                # can wait for long. Probing other loops costs more than it saves.
+                return ops <= _IDLE_OPCODES and (target == jump or 0xF007 in ops)
+        return False
+
+    def _invalidate(self, start: int, end: int) -> None:
+        """Forgets loop analysis after code may have changed"""
+        if self._loops:
+            self._loops.clear()
@@ -1,44 +1,185 @@
-from parser import ParsedInstruction
+import mmap
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple, Union
 
+from chip8.parser import ParsedInstruction
 
-class Memory(list):
-    def __init__(self, size) -> None:
-        super(Memory, self).__init__()
+# Memory is split into pages of PAGE_SIZE bytes which forks share until written
+PAGE_BITS = 8
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+
+
+class Memory(object):
+    """Byte addressable memory made of copy-on-write pages.
+
+    Instructions are decoded on first fetch and kept in a side cache indexed
+    by address. Writing either byte of a cached instruction invalidates it, so
+    self-modifying programs always execute what is currently in memory.
+
+    fork() returns a copy that shares every page with this memory. Whichever
+    side writes to a shared page first copies that page, so forks only pay
+    for the pages they touch. Pages loaded from read-only data are shared
+    with that data in the same way."""
+
+    def __init__(self, size: int = 0x1000) -> None:
+        if size % PAGE_SIZE != 0:
+            raise ValueError(f"Memory size must be a multiple of {PAGE_SIZE}")
         self.size = size
-        # Append 0s up to size
-        for i in range(0, size):
-            self.append(0)
-
-    def read_any_potentially_unaligned(self, k: int) -> int:
-        """Reads a byte from a potentially 2-byte unaligned address.
-
-        If the provided address k is unaligned and self[k] == 0,
-        this method will check self[k-1] for a ParsedInstruction.
-
-        If it finds one, it will return the lower byte corresponding
-        to self[k]."""
-        p = self[k]
-        if k % 2 == 0 and isinstance(p, ParsedInstruction):
-            # aligned ParsedInstruction
-            return p.bytes >> 8
-        if k - 1 >= 0 and isinstance(self[k - 1], ParsedInstruction):
-            # unaligned ParsedInstruction
-            return self[k - 1].bytes & 0x00FF
-        # aligned/unaligned byte
-        return p
-
-    def read_byte_range(self, start: int, end: int) -> list[int]:
-        """Reads bytes sequentially from a range of addresses"""
-        return [self.read_any_potentially_unaligned(i) for i in range(start, end)]
+        # Contents of memory, read-only views are always marked shared
+        self._pages: List[Union[bytearray, memoryview]] = [
+            bytearray(PAGE_SIZE) for _ in range(size // PAGE_SIZE)
+        ]
+        # Pages that may be referenced elsewhere, copied before writing
+        self._shared: List[bool] = [False] * len(self._pages)
+        # Decoded instruction cache, one slot per address
+        self._decoded: List[Optional[ParsedInstruction]] = [None] * size
+        # Callbacks run with (start, end) after a range of memory is written
+        self._write_hooks: List[Callable[[int, int], None]] = []
+        # (offset, data, opcodes) of the block last passed to load_decoded
+        self._predecoded: Tuple[int, bytes, Sequence[int]] = (0, b"", ())
 
-    def __setitem__(self, __i, __o) -> None:
-        if __i < 0 or __i > self.size - 1:
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.tobytes())
+
+    def __bytes__(self) -> bytes:
+        return self.tobytes()
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return self.tobytes()[k]
+        return self._pages[k >> PAGE_BITS][k & PAGE_MASK]
+
+    def __setitem__(self, k: int, v: int) -> None:
+        if k < 0 or k > self.size - 1:
             # Do not allow out of bound writes
-            # 0 <= __i <= self.size-1
+            # 0 <= k <= self.size-1
             raise IndexError
-        if isinstance(__o, int) is True:
-            # clip __o to range
-            # __o to 0 <= __o <= 255
-            __o = max(min(__o, 255), 0)
+        # clip v to 0 <= v <= 255
+        self._writable(k >> PAGE_BITS)[k & PAGE_MASK] = max(min(v, 255), 0)
+        self._invalidate(k, k + 1)
+
+    def fetch(self, k: int) -> ParsedInstruction:
+        """Returns the decoded instruction starting at address k. Both of its
+        bytes must be in memory, so the last address holds no instruction."""
+        try:
+            inst = self._decoded[k]
+        except IndexError:
+            inst = None
+        if inst is None:
+            if not 0 <= k < self.size - 1:
+                raise IndexError(f"No instruction fits in memory at {k:#x}")
+            word = (self[k] << 8) | self[k + 1]
+            offset, data, opcodes = self._predecoded
+            j = k - offset
+            if 0 <= j < len(opcodes) and word == (data[j] << 8) | data[j + 1]:
+                # Unchanged since load_decoded, the opcode is known
+                inst = ParsedInstruction.predecoded(word, opcodes[j])
+            else:
+                inst = ParsedInstruction(word)
+            self._decoded[k] = inst
+        return inst
+
+    def read_byte_range(self, start: int, end: int) -> bytes:
+        """Reads bytes sequentially from a range of addresses"""
+        end = min(end, self.size)
+        if start >= end:
+            return b""
+        first, last = start >> PAGE_BITS, (end - 1) >> PAGE_BITS
+        if first == last:
+            # Common case, the whole range is on one page
+            return bytes(
+                self._pages[first][start & PAGE_MASK : (end - 1 & PAGE_MASK) + 1]
+            )
+        return self.tobytes()[start:end]
+
+    def tobytes(self) -> bytes:
+        """Returns a copy of the whole of memory"""
+        return b"".join(self._pages)
+
+    def load(self, data: bytes, offset: int = 0) -> None:
+        """Copies a block of bytes into memory starting at offset.
+
+        Immutable data, bytes or an mmap opened with ACCESS_READ, or views of
+        either, is not copied into the pages it covers entirely. Those pages
+        are views of it instead, copied on first write like pages shared with
+        a fork, so memories loading the same data share them. They keep an
+        mmap exported, so closing it raises BufferError while any memory
+        still views it. Everything else, read-only views of a bytearray
+        included, is copied."""
+        end = offset + len(data)
+        if offset < 0 or end > self.size:
+            raise IndexError(f"{len(data)} bytes at {hex(offset)} do not fit in memory")
+        data = memoryview(data).cast("B")
+        share = _immutable(data)
+        addr = offset
+        while addr < end:
+            p, lo = addr >> PAGE_BITS, addr & PAGE_MASK
+            hi = min(PAGE_SIZE, lo + end - addr)
+            chunk = data[addr - offset : addr - offset + hi - lo]
+            if hi - lo == PAGE_SIZE:
+                # Whole page overwritten, no need to copy the old one first
+                self._pages[p] = chunk if share else bytearray(chunk)
+                self._shared[p] = share
+            else:
+                self._writable(p)[lo:hi] = chunk
+            addr += hi - lo
+        self._invalidate(offset, end)
+
+    def load_decoded(
+        self, data: bytes, opcodes: Sequence[int], offset: int = 0
+    ) -> None:
+        """Copies a block of bytes into memory like load(). Opcodes holds the
+        opcode key of the word starting at each offset of data, and
+        instructions fetched from the block are built from it rather than
+        decoded, for as long as their bytes are unchanged."""
+        self.load(data, offset)
+        if not _immutable(memoryview(data)):
+            # Kept to check fetched words against, so it must not change
+            data = bytes(data)
+        self._predecoded = (offset, data, opcodes)
+
+    def fork(self) -> "Memory":
+        """Returns a copy of this memory sharing all of its pages"""
+        child = Memory.__new__(Memory)
+        child.size = self.size
+        child._pages = list(self._pages)
+        # Both sides must copy before writing from now on
+        self._shared = [True] * len(self._pages)
+        child._shared = [True] * len(self._pages)
+        # Decoded instructions are immutable and can be shared too
+        child._decoded = list(self._decoded)
+        child._write_hooks = []
+        child._predecoded = self._predecoded
+        return child
+
+    def shared_pages(self) -> int:
+        """Returns the number of pages shared with a fork or loaded data and
+        not yet copied"""
+        return sum(self._shared)
+
+    def add_write_hook(self, hook: Callable[[int, int], None]) -> None:
+        """Registers a callback to run with (start, end) after memory is written"""
+        self._write_hooks.append(hook)
+
+    def _writable(self, p: int) -> bytearray:
+        """Returns page p, copying it first if it may be shared"""
+        if self._shared[p]:
+            self._pages[p] = bytearray(self._pages[p])
+            self._shared[p] = False
+        return self._pages[p]
+
+    def _invalidate(self, start: int, end: int) -> None:
+        """Drops cached instructions overlapping the written range [start, end)"""
+        # An instruction at start - 1 has its low byte at start
+        lo = max(start - 1, 0)
+        self._decoded[lo:end] = [None] * (end - lo)
+        for hook in self._write_hooks:
+            hook(start, end)
+
 
-        super(Memory, self).__setitem__(__i, __o)
+def _immutable(view: memoryview) -> bool:
+    """Returns whether the data behind a view can never change"""
+    return view.readonly and type(view.obj) in (bytes, mmap.mmap)
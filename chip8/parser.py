@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional, Tuple
 
 # A "syntax tree" (for lack of a better name) of the CHIP-8 opcode language.
 # Pure opcodes with arguments stripped are obtained by traversing the tree
@@ -88,18 +88,61 @@ def search_opcode(instruction: int) -> int:
     return p
 
 
+# A decoded instruction word: (opcode, nnn, n, x, y, kk)
+Decoded = Tuple[int, int, int, int, int, int]
+
+# Every 16-bit word decoded ahead of time, indexed by the word itself.
+# Built on first use by decode_table(), so importing the parser stays cheap.
+_decode_table: Optional[List[Decoded]] = None
+
+
+def _decode_uncached(uint16: int) -> Decoded:
+    """Decode a raw instruction word by walking the syntax tree"""
+    return (
+        search_opcode(uint16),
+        uint16 & 0b0000_1111_1111_1111,
+        uint16 & 0b0000_0000_0000_1111,
+        (uint16 & 0b0000_1111_0000_0000) >> 8,
+        (uint16 & 0b0000_0000_1111_0000) >> 4,
+        uint16 & 0b0000_0000_1111_1111,
+    )
+
+
+def decode_table() -> List[Decoded]:
+    """Returns the 65,536-entry decode table, building it on first call"""
+    global _decode_table
+    if _decode_table is None:
+        _decode_table = [_decode_uncached(word) for word in range(0x10000)]
+    return _decode_table
+
+
+def decode(uint16: int) -> Decoded:
+    """Decode a raw instruction word with a single table lookup"""
+    return (_decode_table or decode_table())[uint16]
+
+
 class ParsedInstruction(object):
     """Contains the raw bytes, extracted opcode, and argument bitmasks for
     a parsed instruction."""
 
     def __init__(self, uint16: int):
         self.bytes = uint16
-        self.opcode: int = search_opcode(uint16)
-        self.nnn = uint16 & 0b0000_1111_1111_1111
-        self.n = uint16 & 0b0000_0000_0000_1111
-        self.x = (uint16 & 0b0000_1111_0000_0000) >> 8
-        self.y = (uint16 & 0b0000_0000_1111_0000) >> 4
-        self.kk = uint16 & 0b0000_0000_1111_1111
+        # Opcode and argument bitmasks are precomputed in the decode table
+        self.opcode, self.nnn, self.n, self.x, self.y, self.kk = decode(uint16)
+
+    @classmethod
+    def predecoded(cls, uint16: int, opcode: int) -> "ParsedInstruction":
+        """Builds an instruction whose opcode is already known, e.g. from the
+        decoded-ROM cache, without building the decode table"""
+        inst = cls.__new__(cls)
+        inst.bytes = uint16
+        inst.opcode = opcode
+        inst.nnn = uint16 & 0b0000_1111_1111_1111
+        inst.n = uint16 & 0b0000_0000_0000_1111
+        inst.x = (uint16 & 0b0000_1111_0000_0000) >> 8
+        inst.y = (uint16 & 0b0000_0000_1111_0000) >> 4
+        inst.kk = uint16 & 0b0000_0000_1111_1111
+        return inst
 
     def __repr__(self) -> str:
         return (
@@ -0,0 +1,251 @@
+"""Per-opcode profiler.
+
+Counts how many times each opcode executes and how long its handler takes,
+and optionally how many times each address executes and how many times each
+pair of opcodes executes back to back, the candidates for fusion (see
+chip8/fusion.py). Attaching shadows the CPU's _method_lookup_table with an
+instrumented copy on the instance, so a CPU without a profiler attached runs
+exactly as before.
+
+The block engine runs through CPU.step while a profiler is attached, so
+timings always reflect the interpreter:
+
+    python -m chip8.profiler ROM/trip8.bin --frames 600 --pairs
+"""
+
+import argparse
+import json
+import sys
+from time import perf_counter_ns as timer
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from chip8.cpu import CPU
+from chip8.parser import ParsedInstruction
+from chip8.scheduler import DEFAULT_IPS
+from chip8.vm import VM
+
+
+class OpcodeStats(NamedTuple):
+    """Totals for one opcode key"""
+
+    # Key in CPU._method_lookup_table
+    opcode: int
+    # Mnemonic-style name of the handler, e.g. "8xy4"
+    name: str
+    # Times executed
+    count: int
+    # Wall-clock time spent in the handler, in nanoseconds
+    total_ns: int
+
+
+class OpcodeProfiler(object):
+    """Execution counters and handler timings for a CPU"""
+
+    def __init__(self, cpu: CPU, addresses: bool = False, pairs: bool = False):
+        self.cpu = cpu
+        # Whether per-address hit counts are recorded
+        self.addresses = addresses
+        # Whether opcode pair counts are recorded
+        self.pairs = pairs
+        self.counts: Dict[int, int] = {}
+        self.times: Dict[int, int] = {}
+        # Times an instruction at each address executed, if enabled
+        self.hits: List[int] = [0] * cpu.mem.size
+        # Times each (opcode, next opcode) pair executed from adjacent
+        # addresses, if enabled
+        self.pair_counts: Dict[Tuple[int, int], int] = {}
+        # Key and address of the last instruction dispatched
+        self._last = [None, -1]
+        # Instance dispatch table shadowed by attach(), if any
+        self._previous: Optional[dict] = None
+        self.attached = False
+
+    def __enter__(self) -> "OpcodeProfiler":
+        self.attach()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.detach()
+
+    def attach(self) -> None:
+        """Starts recording every instruction the CPU dispatches"""
+        if self.attached:
+            return
+        # Wrap whatever is dispatching now, another tool's table included
+        table = self.cpu._method_lookup_table
+        # Only a table shadowing the class's on this CPU needs restoring
+        self._previous = None if table is CPU._method_lookup_table else table
+        self.cpu._method_lookup_table = {
+            key: self._instrument(key, handler) for key, handler in table.items()
+        }
+        self.attached = True
+
+    def detach(self) -> None:
+        """Stops recording, restoring the dispatch table attach() wrapped.
+        Tools attached to one CPU must be detached in reverse order."""
+        if self.attached:
+            if self._previous is None:
+                del self.cpu._method_lookup_table
+            else:
+                self.cpu._method_lookup_table = self._previous
+            self._previous = None
+            self.attached = False
+
+    def reset(self) -> None:
+        """Clears all counters"""
+        self.counts.clear()
+        self.times.clear()
+        self.hits[:] = [0] * len(self.hits)
+        self.pair_counts.clear()
+        self._last[:] = [None, -1]
+
+    def _instrument(
+        self, key: int, handler: Callable[[CPU, ParsedInstruction], None]
+    ) -> Callable[[CPU, ParsedInstruction], None]:
+        """Wraps an opcode handler to record its count, time, address and
+        the pair it forms with the previous instruction"""
+        counts, times, hits = self.counts, self.times, self.hits
+        counts.setdefault(key, 0)
+        times.setdefault(key, 0)
+
+        if self.addresses:
+
+            def instrumented(cpu: CPU, inst: ParsedInstruction) -> None:
+                hits[cpu.ip] += 1
+                start = timer()
+                handler(cpu, inst)
+                times[key] += timer() - start
+                counts[key] += 1
+
+        else:
+
+            def instrumented(cpu: CPU, inst: ParsedInstruction) -> None:
+                start = timer()
+                handler(cpu, inst)
+                times[key] += timer() - start
+                counts[key] += 1
+
+        if self.pairs:
+            timed, pair_counts, last = instrumented, self.pair_counts, self._last
+
+            def instrumented(cpu: CPU, inst: ParsedInstruction) -> None:
+                ip = cpu.ip
+                if last[1] == ip - 2:
+                    pair = (last[0], key)
+                    pair_counts[pair] = pair_counts.get(pair, 0) + 1
+                last[0], last[1] = key, ip
+                timed(cpu, inst)
+
+        return instrumented
+
+    def stats(self) -> List[OpcodeStats]:
+        """Returns the totals of every opcode that executed, most time first"""
+        ret = [
+            OpcodeStats(key, _name(key), count, self.times[key])
+            for key, count in self.counts.items()
+            if count
+        ]
+        ret.sort(key=lambda s: s.total_ns, reverse=True)
+        return ret
+
+    def hot_addresses(self, n: int = 10) -> List[tuple]:
+        """Returns the n most executed (address, hits) pairs"""
+        ret = [(addr, hits) for addr, hits in enumerate(self.hits) if hits]
+        ret.sort(key=lambda pair: pair[1], reverse=True)
+        return ret[:n]
+
+    def hot_pairs(self, n: int = 10) -> List[Tuple[Tuple[int, int], int]]:
+        """Returns the n most executed ((opcode, next opcode), count) pairs"""
+        ret = list(self.pair_counts.items())
+        ret.sort(key=lambda pair: pair[1], reverse=True)
+        return ret[:n]
+
+    def table(self) -> str:
+        """Returns the totals formatted as a text table"""
+        stats = self.stats()
+        total_count = sum(s.count for s in stats) or 1
+        total_ns = sum(s.total_ns for s in stats) or 1
+        lines = [
+            f"{'opcode':<8}{'count':>12}{'%':>8}{'total ms':>12}{'%':>8}{'mean ns':>10}"
+        ]
+        for s in stats:
+            lines.append(
+                f"{s.name:<8}{s.count:>12}{100 * s.count / total_count:>8.1f}"
+                + f"{s.total_ns / 1e6:>12.2f}{100 * s.total_ns / total_ns:>8.1f}"
+                + f"{s.total_ns / s.count:>10.0f}"
+            )
+        return "\n".join(lines)
+
+    def to_json(self) -> str:
+        """Returns the totals, and address hits if recorded, as JSON"""
+        data = {"opcodes": [s._asdict() for s in self.stats()]}
+        if self.addresses:
+            data["addresses"] = {
+                hex(addr): hits for addr, hits in enumerate(self.hits) if hits
+            }
+        if self.pairs:
+            data["pairs"] = [
+                {"opcodes": [a, b], "names": [_name(a), _name(b)], "count": count}
+                for (a, b), count in self.hot_pairs(len(self.pair_counts))
+            ]
+        return json.dumps(data)
+
+
+def _name(key: int) -> str:
+    """Returns the mnemonic-style name of an opcode key, e.g. "8xy4\" """
+    return CPU._method_lookup_table[key].__name__.lstrip("_")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Profile the opcodes a CHIP-8 ROM executes"
+    )
+    parser.add_argument("rom", help="ROM file")
+    parser.add_argument("--frames", type=int, default=600, help="60 Hz frames to run")
+    parser.add_argument(
+        "--ips", type=int, default=DEFAULT_IPS, help="instructions per second"
+    )
+    parser.add_argument(
+        "--addresses", action="store_true", help="count hits per address"
+    )
+    parser.add_argument(
+        "--pairs", action="store_true", help="count adjacent opcode pairs"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="random number generator seed"
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="print JSON instead of a table"
+    )
+    args = parser.parse_args(argv)
+
+    vm = VM("interpreter", ips=args.ips)
+    vm.load(args.rom)
+    vm.cpu.rng.seed(args.seed)
+    profiler = OpcodeProfiler(vm.cpu, addresses=args.addresses, pairs=args.pairs)
+    error = None
+    with profiler:
+        try:
+            vm.run_frames(args.frames)
+        except Exception as e:
+            # Report what ran up to the failing instruction
+            error = repr(e)
+
+    if args.json:
+        print(profiler.to_json())
+    else:
+        print(profiler.table())
+        if args.addresses:
+            for addr, hits in profiler.hot_addresses():
+                print(f"{addr:#05x} {hits:>12}")
+        if args.pairs:
+            for (a, b), count in profiler.hot_pairs():
+                print(f"{_name(a)}+{_name(b):<8}{count:>12}")
+    if error is not None:
+        print(f"error {error}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
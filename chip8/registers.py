@@ -1,9 +1,15 @@
-class Registers(list):
+class Registers(bytearray):
+    """The sixteen 8-bit V registers, held in one contiguous buffer.
+
+    Values are stored modulo 256 by set(). Plain item assignment is
+    bytearray's own and rejects values outside 0-255."""
+
+    __slots__ = ()
+    _size = 16
+
     def __init__(self) -> None:
-        self._size = 16
-        # Append sixteen 0s
-        for i in range(0, self._size):
-            self.append(int(0))
+        # Sixteen 0s
+        super().__init__(self._size)
 
     def __repr__(self) -> str:
         s = ""
@@ -11,19 +17,12 @@ class Registers(list):
             s += f"{hex(idx)} = {self[idx]}, "
         return s[:-2]
 
-    def __setitem__(self, key: int, value: int) -> None:
-        super().__setitem__(key, value % 0x100)
-
-    def __getitem__(self, key: int) -> int:
-        return super().__getitem__(key)
+    # Bound to the C implementation, no Python frame per read
+    get = bytearray.__getitem__
 
     def set(self, k: int, v: int) -> None:
-        super().__setitem__(k, v % 0x100)
-
-    def get(self, k: int) -> int:
-        return super().__getitem__(k)
+        bytearray.__setitem__(self, k, v & 0xFF)
 
     def reset(self) -> None:
         """Sets all register values to 0."""
-        for i in range(0, self._size):
-            self[i] = int(0)
+        self[:] = bytes(self._size)
@@ -0,0 +1,99 @@
+"""Framebuffer presentation with pygame.
+
+The display is kept in an 8-bit palettized surface already scaled up to the
+window size. Presenting rewrites only the rows marked dirty on the Display,
+each with a single bulk write into the surface's pixel buffer, then blits the
+changed spans of rows onto the target surface.
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+import pygame
+
+from chip8.display import Display
+
+# Palette indices for pixels that are off and on
+_OFF, _ON = 0, 1
+
+
+def dirty_spans(mask: int) -> List[Tuple[int, int]]:
+    """Splits a dirty row mask into runs [start, end) of consecutive rows"""
+    ret = []
+    y = 0
+    while mask:
+        # Skip clean rows
+        skip = (mask & -mask).bit_length() - 1
+        y += skip
+        mask >>= skip
+        # Count dirty rows
+        run = (~mask & (mask + 1)).bit_length() - 1
+        ret.append((y, y + run))
+        y += run
+        mask >>= run
+    return ret
+
+
+class Renderer(object):
+    """Draws a Display onto a pygame surface at an integer scale"""
+
+    def __init__(
+        self,
+        target: pygame.Surface,
+        palette: Sequence[Tuple[int, int, int]] = ((0, 0, 0), (255, 255, 255)),
+        width: int = 64,
+        height: int = 32,
+    ):
+        self.target = target
+        # Largest integer scale that fits the target
+        self.scale = max(
+            min(target.get_width() // width, target.get_height() // height), 1
+        )
+        self.frame = pygame.Surface((width * self.scale, height * self.scale), depth=8)
+        self.frame.set_palette(list(palette))
+        self._pitch = self.frame.get_pitch()
+        # Scaled pixels of every byte of a row, MSB first
+        self._expand = [
+            bytes(
+                _ON if byte >> (7 - bit) & 1 else _OFF
+                for bit in range(0, 8)
+                for _ in range(0, self.scale)
+            )
+            for byte in range(0, 256)
+        ]
+
+    def present(
+        self, display: Display, dirty: Optional[int] = None
+    ) -> List[pygame.Rect]:
+        """Redraws the rows in the dirty mask onto the target, by default the
+        rows changed since the last present.
+
+        Returns the rectangles of the target that changed, for
+        pygame.display.update()."""
+        if dirty is None:
+            dirty = display.take_dirty()
+        if not dirty:
+            return []
+        rows, expand, scale, pitch = display.rows, self._expand, self.scale, self._pitch
+        width = display.SCR_W // 8
+        # Locks the surface until released
+        buf = self.frame.get_buffer()
+        try:
+            y = 0
+            mask = dirty
+            while mask:
+                if mask & 1:
+                    line = b"".join([expand[b] for b in rows[y].to_bytes(width, "big")])
+                    for k in range(y * scale, (y + 1) * scale):
+                        buf.write(line, k * pitch)
+                mask >>= 1
+                y += 1
+        finally:
+            del buf
+        rects = []
+        for start, end in dirty_spans(dirty):
+            rect = pygame.Rect(
+                0, start * scale, self.frame.get_width(), (end - start) * scale
+            )
+            self.target.blit(self.frame, rect, rect)
+            rects.append(rect)
+        return rects
@@ -0,0 +1,181 @@
+"""Rewind buffer.
+
+Keeps a fixed-size ring of recent machine states so a VM can be stepped
+backwards. Every keyframe_interval records a full snapshot is stored. The
+records in between only store what changed since the record before them:
+the registers and other scalar state, the memory bytes and display rows that
+changed, and the RNG state if Cxkk consumed from it.
+"""
+
+import struct
+from collections import deque
+from typing import Deque, NamedTuple, Optional
+
+import chip8.snapshot as snapshot
+
+# A changed memory byte: address, value
+_MEM_PATCH = struct.Struct("<HB")
+# A changed display row: row index, packed row
+_ROW_PATCH = struct.Struct("<B8s")
+_ROW_SIZE = 8
+
+
+class Record(NamedTuple):
+    """One entry in the rewind buffer"""
+
+    # VM.cycles when the record was made
+    cycles: int
+    # Full snapshot for keyframes, None for deltas
+    keyframe: Optional[bytes]
+    # Header, stack and register region of the snapshot
+    state: bytes
+    # Packed (address, value) pairs of changed memory bytes
+    mem: bytes
+    # Packed (row, bits) pairs of changed display rows
+    rows: bytes
+    # RNG region of the snapshot if it changed, else None
+    rng: Optional[bytes]
+
+
+class RewindBuffer(object):
+    """Ring of the last `capacity` states of a VM"""
+
+    def __init__(self, vm, capacity: int = 600, keyframe_interval: int = 60):
+        if capacity < 1 or keyframe_interval < 1:
+            raise ValueError("capacity and keyframe_interval must be at least 1")
+        self.vm = vm
+        self.capacity = capacity
+        self.keyframe_interval = keyframe_interval
+        self.layout = snapshot.layout(vm.cpu.mem.size)
+        self._records: Deque[Record] = deque()
+        # Snapshot matching the newest record
+        self._last: Optional[bytes] = None
+        # Records made since the last keyframe
+        self._since_keyframe = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def nbytes(self) -> int:
+        """Approximate number of bytes held by the buffer"""
+        return sum(
+            len(r.keyframe or b"")
+            + len(r.state)
+            + len(r.mem)
+            + len(r.rows)
+            + len(r.rng or b"")
+            for r in self._records
+        )
+
+    def record(self) -> None:
+        """Appends the current state of the VM"""
+        blob = self.vm.snapshot()
+        if self._last is None or self._since_keyframe + 1 >= self.keyframe_interval:
+            self._records.append(self._keyframe(self.vm.cycles, blob))
+            self._since_keyframe = 0
+        else:
+            self._records.append(self._delta(self.vm.cycles, self._last, blob))
+            self._since_keyframe += 1
+        self._last = blob
+        while len(self._records) > self.capacity:
+            self._evict()
+
+    def rewind(self, n: int = 1) -> None:
+        """Restores the state recorded n records before the newest one.
+
+        With one record per frame, this steps back n frames. Newer records
+        are discarded."""
+        if not self._records:
+            raise IndexError("Nothing to rewind to")
+        self._truncate(max(len(self._records) - 1 - n, 0))
+
+    def rewind_cycles(self, n: int) -> None:
+        """Restores the state of the VM as it was n cycles ago.
+
+        Restores the newest record at or before that point, then steps the
+        VM forward the remaining cycles. Newer records are discarded."""
+        target = self.vm.cycles - n
+        idx = None
+        for k in range(len(self._records) - 1, -1, -1):
+            if self._records[k].cycles <= target:
+                idx = k
+                break
+        if idx is None:
+            raise IndexError(f"No record {n} cycles back")
+        self._truncate(idx)
+        remaining = target - self.vm.cycles
+        if remaining:
+            # Execution is deterministic, so replaying lands exactly on target
+            self.vm.engine.step(n_cycles=remaining)
+            self.vm.cycles = target
+            self.record()
+
+    def _truncate(self, idx: int) -> None:
+        """Restores record idx and drops every record after it"""
+        blob = self._reconstruct(idx)
+        while len(self._records) > idx + 1:
+            self._records.pop()
+        self.vm.restore(blob)
+        self.vm.cycles = self._records[idx].cycles
+        self._last = blob
+        # Count records since the newest keyframe
+        self._since_keyframe = 0
+        for record in reversed(self._records):
+            if record.keyframe is not None:
+                break
+            self._since_keyframe += 1
+
+    def _keyframe(self, cycles: int, blob: bytes) -> Record:
+        return Record(cycles, blob, b"", b"", b"", None)
+
+    def _delta(self, cycles: int, old: bytes, new: bytes) -> Record:
+        """Returns a record of the changes between two snapshots"""
+        layout = self.layout
+        mem = bytearray()
+        base = layout.memory.start
+        # Compare a page at a time, most pages do not change between records
+        for start in range(base, layout.memory.stop, 0x100):
+            end = start + 0x100
+            if old[start:end] != new[start:end]:
+                for addr in range(start, end):
+                    if old[addr] != new[addr]:
+                        mem += _MEM_PATCH.pack(addr - base, new[addr])
+        rows = bytearray()
+        base = layout.display.start
+        for row, start in enumerate(range(base, layout.display.stop, _ROW_SIZE)):
+            end = start + _ROW_SIZE
+            if old[start:end] != new[start:end]:
+                rows += _ROW_PATCH.pack(row, new[start:end])
+        rng = new[layout.rng] if old[layout.rng] != new[layout.rng] else None
+        return Record(cycles, None, new[layout.state], bytes(mem), bytes(rows), rng)
+
+    def _apply(self, blob: bytearray, record: Record) -> None:
+        """Applies a delta record to a snapshot in place"""
+        layout = self.layout
+        blob[layout.state] = record.state
+        base = layout.memory.start
+        for addr, value in _MEM_PATCH.iter_unpack(record.mem):
+            blob[base + addr] = value
+        base = layout.display.start
+        for row, bits in _ROW_PATCH.iter_unpack(record.rows):
+            blob[base + row * _ROW_SIZE : base + (row + 1) * _ROW_SIZE] = bits
+        if record.rng is not None:
+            blob[layout.rng] = record.rng
+
+    def _reconstruct(self, idx: int) -> bytes:
+        """Returns the full snapshot of record idx"""
+        start = idx
+        while self._records[start].keyframe is None:
+            start -= 1
+        blob = bytearray(self._records[start].keyframe)
+        for k in range(start + 1, idx + 1):
+            self._apply(blob, self._records[k])
+        return bytes(blob)
+
+    def _evict(self) -> None:
+        """Drops the oldest record, promoting the next one to a keyframe"""
+        if len(self._records) > 1 and self._records[1].keyframe is None:
+            # The next record is a delta against the one being dropped
+            record = self._records[1]
+            self._records[1] = self._keyframe(record.cycles, self._reconstruct(1))
+        self._records.popleft()
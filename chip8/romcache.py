@@ -0,0 +1,202 @@
+"""Persistent cache of pre-decoded ROMs.
+
+Each ROM is stored once, under the SHA-256 of its contents, together with
+the opcode key of the instruction word starting at every offset. Entries are
+plain files laid out to be mapped with mmap and used in place:
+
+    header      magic, version, ROM length
+    data        the ROM bytes, padded to an even length
+    opcodes     one little-endian 16-bit opcode key per offset but the last
+
+An entry that is truncated, damaged or of another version is deleted and
+decoded again.
+
+VM.load(path, cache=cache) copies the ROM into memory with one bulk copy
+per page, and instructions fetched from it are built from the opcodes, so a
+process that only runs cached ROMs need not build the parser's decode table.
+Decoding a directory of ROMs can be spread over processes:
+
+    python -m chip8.romcache ROM/ --cache .romcache
+"""
+
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from multiprocessing import Pool
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from chip8.parser import decode
+
+_MAGIC = b"C8DR"
+_VERSION = 1
+# magic, version, ROM length
+_HEADER = struct.Struct("<4sB3xI")
+_SUFFIX = ".c8d"
+
+# Errors decoding an entry that was damaged or written by something else
+_DAMAGED = (ValueError, TypeError, struct.error)
+
+
+class DecodedRom(NamedTuple):
+    """A ROM and its decoded opcodes, usually views of a mapped cache entry"""
+
+    # SHA-256 of the ROM, as hex
+    digest: str
+    data: memoryview
+    # Opcode key of the word starting at each offset of data but the last
+    opcodes: Sequence[int]
+
+
+def rom_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def decode_rom(data: bytes) -> array:
+    """Returns the opcode key of the word starting at each offset of data
+    but the last"""
+    return array(
+        "H", (decode((data[k] << 8) | data[k + 1])[0] for k in range(len(data) - 1))
+    )
+
+
+def _encode_entry(data: bytes) -> bytes:
+    opcodes = decode_rom(data)
+    if sys.byteorder != "little":
+        opcodes.byteswap()
+    pad = b"\x00" * (len(data) % 2)
+    return _HEADER.pack(_MAGIC, _VERSION, len(data)) + data + pad + opcodes.tobytes()
+
+
+def _decode_entry(digest: str, view: memoryview) -> DecodedRom:
+    """Returns the ROM and opcodes in a mapped entry, raising ValueError if
+    it is not a complete entry of this version"""
+    magic, version, length = _HEADER.unpack_from(view, 0)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError(f"Not a version {_VERSION} entry")
+    start = _HEADER.size
+    end = start + length + length % 2 + 2 * max(length - 1, 0)
+    if len(view) != end:
+        raise ValueError(f"Entry is {len(view)} bytes, expected {end}")
+    data = view[start : start + length]
+    raw = view[start + length + length % 2 : end]
+    if sys.byteorder == "little":
+        opcodes = raw.cast("H")
+    else:
+        opcodes = array("H", raw)
+        opcodes.byteswap()
+    return DecodedRom(digest, data, opcodes)
+
+
+class RomCache(object):
+    """Decoded ROMs stored in a directory, one file per ROM"""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        # Entries read by this process, by digest
+        self._open: Dict[str, DecodedRom] = {}
+
+    def path(self, digest: str) -> str:
+        """Returns the path of the entry for a ROM digest"""
+        return os.path.join(self.directory, digest + _SUFFIX)
+
+    def get(self, digest: str) -> Optional[DecodedRom]:
+        """Returns the mapped entry for a ROM digest, or None if not cached.
+        A damaged entry is deleted, so the next put() rebuilds it."""
+        rom = self._open.get(digest)
+        if rom is not None:
+            return rom
+        try:
+            with open(self.path(digest), "rb") as f:
+                view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # Empty, and so not mappable, or unreadable
+            self.discard(digest)
+            return None
+        try:
+            rom = _decode_entry(digest, view)
+        except _DAMAGED:
+            self.discard(digest)
+            return None
+        self._open[digest] = rom
+        return rom
+
+    def discard(self, digest: str) -> None:
+        """Deletes the entry for a ROM digest if it exists"""
+        self._open.pop(digest, None)
+        try:
+            os.remove(self.path(digest))
+        except OSError:
+            pass
+
+    def put(self, data: bytes) -> DecodedRom:
+        """Decodes and stores a ROM, a bytes-like object or an mmap, unless
+        it is cached already, and returns the mapped entry"""
+        digest = rom_digest(data)
+        path = self.path(digest)
+        if not os.path.exists(path):
+            tmp = os.path.join(self.directory, f".{digest}.{os.getpid()}")
+            with open(tmp, "wb") as f:
+                f.write(_encode_entry(data))
+            # Atomic, so concurrent loaders never map a partial entry
+            os.replace(tmp, path)
+        return self.get(digest)
+
+    def load(self, path: str) -> DecodedRom:
+        """Returns the decoded ROM in a file, decoding and storing it if it is
+        not cached yet"""
+        with open(path, "rb") as f:
+            data = f.read()
+        rom = self.get(rom_digest(data))
+        return rom if rom is not None else self.put(data)
+
+    def warm(self, paths: Iterable[str], processes: Optional[int] = None) -> List[str]:
+        """Decodes and stores every ROM not cached yet, spread over a pool of
+        processes, one per core by default. Returns the ROM digests."""
+        paths = list(paths)
+        args = [(self.directory, path) for path in paths]
+        if processes == 1 or len(paths) < 2:
+            return [_warm(*a) for a in args]
+        with Pool(processes) as pool:
+            chunksize = max(1, len(args) // (4 * (processes or os.cpu_count() or 1)))
+            return pool.starmap(_warm, args, chunksize)
+
+
+def _warm(directory: str, path: str) -> str:
+    """Pool worker: caches the ROM in path unless it already is, returns its digest"""
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = rom_digest(data)
+    cache = RomCache(directory)
+    if not os.path.exists(cache.path(digest)):
+        cache.put(data)
+    return digest
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    # chip8.headless imports chip8.vm, which imports this module
+    from chip8.headless import expand_paths
+
+    parser = argparse.ArgumentParser(description="Pre-decode CHIP-8 ROMs into a cache")
+    parser.add_argument("roms", nargs="+", help="ROM files or directories of ROMs")
+    parser.add_argument("--cache", default=".romcache", help="cache directory")
+    parser.add_argument(
+        "--processes", type=int, help="worker processes, default one per core"
+    )
+    args = parser.parse_args(argv)
+
+    paths = expand_paths(args.roms)
+    digests = RomCache(args.cache).warm(paths, args.processes)
+    for path, digest in zip(paths, digests):
+        print(f"{digest[:16]} {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""Frame scheduler.
+
+CHIP-8 has no fixed clock speed, but its delay and sound timers count down
+at 60 Hz. The scheduler turns an instruction rate into a whole number of
+instructions per 60 Hz frame. Rates that do not divide evenly are spread
+across frames, e.g. 700 instructions per second runs frames of 11 and 12
+instructions that add up to exactly 700 every second.
+"""
+
+# Rate at which the delay and sound timers count down
+TIMER_HZ = 60
+# Default instruction rate, in instructions per second
+DEFAULT_IPS = 700
+
+
+class Scheduler(object):
+    """Hands out per-frame instruction budgets for a given instruction rate"""
+
+    def __init__(self, ips: int = DEFAULT_IPS, hz: int = TIMER_HZ):
+        if ips < 1 or hz < 1:
+            raise ValueError("ips and hz must be at least 1")
+        self.ips = ips
+        self.hz = hz
+        # Instructions owed from previous frames, in 1/hz of an instruction
+        self._remainder = 0
+
+    def reset(self) -> None:
+        self._remainder = 0
+
+    def copy(self) -> "Scheduler":
+        ret = Scheduler(self.ips, self.hz)
+        ret._remainder = self._remainder
+        return ret
+
+    @property
+    def remainder(self) -> int:
+        """Instructions owed from previous frames, in 1/hz of an instruction.
+        Saved in snapshots, so restored VMs get the same frame budgets."""
+        return self._remainder
+
+    @remainder.setter
+    def remainder(self, value: int) -> None:
+        if not 0 <= value < self.hz:
+            raise ValueError(f"Remainder must be in 0-{self.hz - 1}, got {value}")
+        self._remainder = value
+
+    def cycles_for_frame(self) -> int:
+        """Returns the number of instructions to run in the next frame"""
+        cycles, self._remainder = divmod(self._remainder + self.ips, self.hz)
+        return cycles
@@ -0,0 +1,130 @@
+"""Save-state snapshots.
+
+A snapshot is an immutable bytes object holding the complete machine state:
+memory, registers, stack, IP/SP/I, timers, draw flag, framebuffer, the
+state of the CPU's random number generator and the frame scheduler's
+remainder. Taking one costs a handful of buffer copies.
+"""
+
+import struct
+from typing import NamedTuple, Optional
+
+from chip8.cpu import CPU
+from chip8.scheduler import Scheduler
+
+_MAGIC = b"C8SS"
+_VERSION = 2
+
+# magic, version, ip, i, sp, dt, st, draw flag, stack depth, scheduler remainder
+_HEADER = struct.Struct("<4sBIIIBB?BI")
+# 16 return addresses, unused entries are 0
+_STACK = struct.Struct("<16H")
+# Mersenne Twister version, 625 words of state, whether a gauss value is
+# pending and its value
+_RNG = struct.Struct("<B625I?d")
+
+_REG_SIZE = 16
+_DISPLAY_SIZE = 256
+
+
+class Layout(NamedTuple):
+    """Regions of a snapshot"""
+
+    # Header, stack and registers
+    state: slice
+    memory: slice
+    display: slice
+    rng: slice
+
+
+def layout(mem_size: int = 0x1000) -> Layout:
+    """Returns the regions of a snapshot of a CPU with mem_size bytes of memory"""
+    mem = _HEADER.size + _STACK.size + _REG_SIZE
+    display = mem + mem_size
+    rng = display + _DISPLAY_SIZE
+    return Layout(
+        slice(0, mem),
+        slice(mem, display),
+        slice(display, rng),
+        slice(rng, rng + _RNG.size),
+    )
+
+
+def snapshot_size(mem_size: int = 0x1000) -> int:
+    """Size in bytes of a snapshot of a CPU with mem_size bytes of memory"""
+    return layout(mem_size).rng.stop
+
+
+def take(cpu: CPU, scheduler: Optional[Scheduler] = None) -> bytes:
+    """Returns a snapshot of the CPU's state and the scheduler's remainder,
+    0 without a scheduler"""
+    stack = list(cpu.stack)
+    version, words, gauss = cpu.rng.getstate()
+    remainder = 0 if scheduler is None else scheduler.remainder
+    return b"".join(
+        (
+            _HEADER.pack(
+                _MAGIC,
+                _VERSION,
+                cpu.ip,
+                cpu.i,
+                cpu.sp,
+                cpu.dt,
+                cpu.st,
+                cpu.df,
+                len(stack),
+                remainder,
+            ),
+            _STACK.pack(*stack, *[0] * (16 - len(stack))),
+            bytes(cpu.reg),
+            cpu.mem.tobytes(),
+            cpu.display.to_bytes(),
+            _RNG.pack(version, *words, gauss is not None, gauss or 0.0),
+        )
+    )
+
+
+def restore(cpu: CPU, blob: bytes, scheduler: Optional[Scheduler] = None) -> None:
+    """Restores the CPU's state, and the scheduler's remainder if a scheduler
+    is given, from a snapshot"""
+    if len(blob) != snapshot_size(cpu.mem.size):
+        raise ValueError(
+            f"Snapshot is {len(blob)} bytes, expected {snapshot_size(cpu.mem.size)}"
+        )
+    view = memoryview(blob)
+    magic, version, ip, i, sp, dt, st, df, depth, remainder = _HEADER.unpack_from(
+        view, 0
+    )
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError("Not a snapshot, or a snapshot from another version")
+    if scheduler is not None:
+        scheduler.remainder = remainder
+    offset = _HEADER.size
+
+    cpu.ip, cpu.i, cpu.sp, cpu.dt, cpu.st, cpu.df = ip, i, sp, dt, st, df
+
+    stack = _STACK.unpack_from(view, offset)
+    offset += _STACK.size
+    cpu.stack.reset()
+
+    cpu.stack.extend(stack[:depth])
+
+    cpu.reg[:] = view[offset : offset + _REG_SIZE]
+    offset += _REG_SIZE
+
+    mem = view[offset : offset + cpu.mem.size]
+    offset += cpu.mem.size
+    # Leave decoded instructions and compiled code alone if memory is unchanged
+    if cpu.mem.tobytes() != mem:
+        cpu.mem.load(mem, 0)
+
+    rows = view[offset : offset + _DISPLAY_SIZE]
+    offset += _DISPLAY_SIZE
+    cpu.display.rows[:] = [
+        int.from_bytes(rows[k : k + 8], "big") for k in range(0, _DISPLAY_SIZE, 8)
+    ]
+    cpu.display.dirty = (1 << cpu.display.SCR_H) - 1
+
+    fields = _RNG.unpack_from(view, offset)
+    gauss = fields[-1] if fields[-2] else None
+    cpu.rng.setstate((fields[0], tuple(fields[1:-2]), gauss))
@@ -1,8 +1,13 @@
-class Stack(list):
-    def __init__(self) -> None:
-        '''A 16 element stack implementing push/pop operations.'''
-        super(Stack, self).__init__()
-        self._size = 16
+from array import array
+
+
+class Stack(array):
+    __slots__ = ()
+    _size = 16
+
+    def __new__(cls) -> "Stack":
+        '''A 16 element stack of 16-bit addresses implementing push/pop operations.'''
+        return super().__new__(cls, "H")
 
     def reset(self) -> None:
         '''Destructively resets the stack.'''
@@ -0,0 +1,261 @@
+"""Execution traces.
+
+A trace holds one fixed-width record per executed instruction: the address
+it ran from, its raw 16-bit word, I after it ran and the XOR of the register
+file before and after it ran. Registers that did not change XOR to zero, so
+traces compress well. Records are written through a buffer, optionally
+compressed with zlib or, if the zstandard package is installed, zstd.
+
+The reader is a generator that decompresses a chunk at a time, so traces far
+larger than memory can be iterated or diffed:
+
+    python -m chip8.trace record ROM/trip8.bin trip8.trace --compression zlib
+    python -m chip8.trace diff old.trace new.trace
+"""
+
+import argparse
+import struct
+import sys
+import zlib
+from itertools import zip_longest
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Tuple
+
+from chip8.cpu import CPU
+from chip8.parser import ParsedInstruction
+from chip8.vm import VM
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_MAGIC = b"C8TR"
+_VERSION = 1
+# Compression of the record stream
+COMPRESSIONS = {None: 0, "zlib": 1, "zstd": 2}
+
+# magic, version, compression, registers before the first record
+_HEADER = struct.Struct("<4sBB16s")
+# ip, instruction word, I, register XOR delta
+_RECORD = struct.Struct("<HHH16s")
+# Records gathered before each write
+_BATCH = 4096
+# Bytes read from the file at a time
+_CHUNK = 1 << 16
+
+
+class TraceRecord(NamedTuple):
+    """One executed instruction"""
+
+    # Address the instruction ran from
+    ip: int
+    # Raw instruction, as ParsedInstruction.bytes
+    word: int
+    # I after the instruction ran
+    i: int
+    # XOR of the registers before and after the instruction ran
+    delta: bytes
+    # Registers after the instruction ran
+    reg: bytes
+
+
+def _compressor(compression: Optional[str]):
+    """Returns an object with compress() and flush(), or None"""
+    if compression is None:
+        return None
+    if compression == "zlib":
+        return zlib.compressobj(6)
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd compression needs the zstandard package")
+        return zstandard.ZstdCompressor().compressobj()
+    raise ValueError(
+        f"Unknown compression {compression!r}, expected one of {list(COMPRESSIONS)}"
+    )
+
+
+def _decompressor(code: int):
+    """Returns an object with decompress() for a header's compression code, or None"""
+    if code == 0:
+        return None
+    if code == 1:
+        return zlib.decompressobj()
+    if code == 2:
+        if zstandard is None:
+            raise RuntimeError("Reading zstd traces needs the zstandard package")
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError(f"Unknown compression code {code}")
+
+
+class TraceRecorder(object):
+    """Writes a record for every instruction a CPU dispatches.
+
+    Like OpcodeProfiler, attaching shadows the CPU's dispatch table with an
+    instrumented copy on the instance, so an untraced CPU runs as before."""
+
+    def __init__(self, cpu: CPU, path: str, compression: Optional[str] = None):
+        self.cpu = cpu
+        self._compressor = _compressor(compression)
+        self._file: BinaryIO = open(path, "wb")
+        self._file.write(
+            _HEADER.pack(_MAGIC, _VERSION, COMPRESSIONS[compression], bytes(cpu.reg))
+        )
+        self._batch = bytearray()
+        self._pending = 0
+        # Records written so far
+        self.count = 0
+        # Instance dispatch table shadowed by attach(), if any
+        self._previous: Optional[dict] = None
+        self.attached = False
+
+    def __enter__(self) -> "TraceRecorder":
+        self.attach()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def attach(self) -> None:
+        """Starts recording every instruction the CPU dispatches"""
+        if self.attached:
+            return
+        # Wrap whatever is dispatching now, another tool's table included
+        table = self.cpu._method_lookup_table
+        # Only a table shadowing the class's on this CPU needs restoring
+        self._previous = None if table is CPU._method_lookup_table else table
+        self.cpu._method_lookup_table = {
+            key: self._instrument(handler) for key, handler in table.items()
+        }
+        self.attached = True
+
+    def detach(self) -> None:
+        """Stops recording, restoring the dispatch table attach() wrapped.
+        Tools attached to one CPU must be detached in reverse order."""
+        if self.attached:
+            if self._previous is None:
+                del self.cpu._method_lookup_table
+            else:
+                self.cpu._method_lookup_table = self._previous
+            self._previous = None
+            self.attached = False
+
+    def close(self) -> None:
+        """Detaches, then writes out buffered records and closes the file"""
+        self.detach()
+        if self._file.closed:
+            return
+        self._flush()
+        if self._compressor is not None:
+            self._file.write(self._compressor.flush())
+        self._file.close()
+
+    def _instrument(self, handler):
+        """Wraps an opcode handler to record the instruction it executes"""
+        pack = _RECORD.pack
+
+        def traced(cpu: CPU, inst: ParsedInstruction) -> None:
+            ip = cpu.ip
+            before = int.from_bytes(bytes(cpu.reg), "little")
+            handler(cpu, inst)
+            delta = before ^ int.from_bytes(bytes(cpu.reg), "little")
+            self._batch += pack(
+                ip, inst.bytes, cpu.i & 0xFFFF, delta.to_bytes(16, "little")
+            )
+            self._pending += 1
+            if self._pending == _BATCH:
+                self._flush()
+
+        return traced
+
+    def _flush(self) -> None:
+        if not self._batch:
+            return
+        data = bytes(self._batch)
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        self._file.write(data)
+        self.count += self._pending
+        self._batch.clear()
+        self._pending = 0
+
+
+def read_trace(path: str) -> Iterator[TraceRecord]:
+    """Yields the records of a trace one at a time"""
+    with open(path, "rb") as f:
+        magic, version, code, reg = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("Not a trace, or a trace from another version")
+        decompressor = _decompressor(code)
+        state = int.from_bytes(reg, "little")
+        leftover = b""
+        while True:
+            chunk = f.read(_CHUNK)
+            if not chunk:
+                break
+            if decompressor is not None:
+                chunk = decompressor.decompress(chunk)
+            data = leftover + chunk
+            end = len(data) - len(data) % _RECORD.size
+            for ip, word, i, delta in _RECORD.iter_unpack(data[:end]):
+                state ^= int.from_bytes(delta, "little")
+                yield TraceRecord(ip, word, i, delta, state.to_bytes(16, "little"))
+            leftover = data[end:]
+        if leftover:
+            raise ValueError("Trace ends with a partial record")
+
+
+def first_divergence(
+    path_a: str, path_b: str
+) -> Optional[Tuple[int, Optional[TraceRecord], Optional[TraceRecord]]]:
+    """Returns the index of the first record that differs between two traces
+    and both records, None for a trace that ended early. Returns None if the
+    traces are identical."""
+    for k, (a, b) in enumerate(zip_longest(read_trace(path_a), read_trace(path_b))):
+        if a != b:
+            return k, a, b
+    return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Record and compare CHIP-8 execution traces"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="run a ROM and record its trace")
+    record.add_argument("rom", help="ROM file")
+    record.add_argument("trace", help="trace file to write")
+    record.add_argument("--frames", type=int, default=600, help="60 Hz frames to run")
+    record.add_argument(
+        "--seed", type=int, default=0, help="random number generator seed"
+    )
+    record.add_argument("--compression", choices=[c for c in COMPRESSIONS if c])
+    diff = commands.add_parser(
+        "diff", help="find the first record two traces disagree on"
+    )
+    diff.add_argument("a")
+    diff.add_argument("b")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        vm = VM("interpreter")
+        vm.load(args.rom)
+        vm.cpu.rng.seed(args.seed)
+        with TraceRecorder(vm.cpu, args.trace, args.compression) as recorder:
+            try:
+                vm.run_frames(args.frames)
+            except Exception as e:
+                print(f"error {e!r}", file=sys.stderr)
+        print(f"{recorder.count} records")
+        return 0
+
+    found = first_divergence(args.a, args.b)
+    if found is None:
+        print("traces are identical")
+        return 0
+    k, a, b = found
+    print(f"traces diverge at record {k}:\n  {a}\n  {b}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
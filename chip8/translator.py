@@ -0,0 +1,282 @@
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from chip8.cpu import CPU, NO_ADVANCE, STRAIGHT_LINE
+from chip8.memory import Memory
+from chip8.parser import ParsedInstruction
+
+# Longest run of instructions compiled into a single block
+MAX_BLOCK_LENGTH = 64
+
+# STRAIGHT_LINE opcodes are compiled inline and never end a block
+
+
+class Block(NamedTuple):
+    """A compiled basic block"""
+
+    # Compiled function taking the CPU as its only argument
+    run: Callable[[CPU], None]
+    # Number of instructions executed by one call
+    length: int
+    # Address range [start, end) the block was compiled from
+    start: int
+    end: int
+
+
+def find_block(
+    mem: Memory, start: int, limit: int = MAX_BLOCK_LENGTH
+) -> List[Tuple[int, ParsedInstruction]]:
+    """Returns the (address, instruction) pairs of the basic block at start.
+
+    A block runs until the first jump, skip, call, return, draw or other
+    instruction with effects beyond registers, I and the timers, inclusive,
+    or until it is limit instructions long."""
+    ret = []
+    addr = start
+    while len(ret) < limit:
+        try:
+            inst = mem.fetch(addr)
+        except IndexError:
+            # Ran off the end of memory
+            break
+        ret.append((addr, inst))
+        if inst.opcode not in STRAIGHT_LINE:
+            break
+        addr += 2
+    return ret
+
+
+def _inline(inst: ParsedInstruction) -> List[str]:
+    """Python source lines implementing a straight-line instruction"""
+    x, y, kk = inst.x, inst.y, inst.kk
+    match inst.opcode:
+        case 0x0000:
+            return []
+        case 0x6000:
+            return [f"V[{x}] = {kk}"]
+        case 0x7000:
+            return [f"V[{x}] = (V[{x}] + {kk}) & 0xFF"]
+        case 0x8000:
+            return [f"V[{x}] = V[{y}]"]
+        case 0x8001:
+            return [f"V[{x}] = V[{x}] | V[{y}]"]
+        case 0x8002:
+            return [f"V[{x}] = V[{x}] & V[{y}]"]
+        case 0x8003:
+            return [f"V[{x}] = V[{x}] ^ V[{y}]"]
+        case 0x8004:
+            return [
+                f"r = V[{x}] + V[{y}]",
+                f"V[{x}] = r & 0xFF",
+                "V[15] = 1 if r % 255 > 0 else 0",
+            ]
+        case 0x8005:
+            return [
+                f"a, b = V[{x}], V[{y}]",
+                f"V[{x}] = (a - b) & 0xFF",
+                "V[15] = 1 if a > b else 0",
+            ]
+        case 0x8006:
+            return [f"V[{x}] = V[{x}] >> 1", f"V[15] = V[{x}] & 1"]
+        case 0x8007:
+            return [
+                f"a, b = V[{x}], V[{y}]",
+                f"V[{x}] = (b - a) & 0xFF",
+                "V[15] = 1 if b > a else 0",
+            ]
+        case 0x800E:
+            return [
+                f"V[{x}] = (V[{x}] << 1) & 0xFF",
+                f"V[15] = 1 if V[{x}] & 0x80 else 0",
+            ]
+        case 0xA000:
+            return [f"I = {inst.nnn}"]
+        case 0xC000:
+            return [f"V[{x}] = rng.randint(0, 255) & {kk}"]
+        case 0xF007:
+            return [f"V[{x}] = cpu.dt"]
+        case 0xF015:
+            return [f"cpu.dt = V[{x}]"]
+        case 0xF018:
+            return [f"cpu.st = V[{x}]"]
+        case 0xF01E:
+            return [f"I = I + V[{x}]"]
+        case 0xF065:
+            return [f"m = M.read_byte_range(I, I + {x + 1})"] + [
+                f"V[{k}] = m[{k}]" for k in range(0, x + 1)
+            ]
+    raise ValueError(f"{hex(inst.opcode)} is not a straight-line opcode")
+
+
+def compile_block(mem: Memory, start: int, limit: int = MAX_BLOCK_LENGTH) -> Block:
+    """Compiles the basic block at start, or its first limit instructions,
+    into a Python function"""
+    body = find_block(mem, start, limit)
+    if not body:
+        # Nothing to execute, fail the same way the interpreter does
+        mem.fetch(start)
+
+    namespace = {}
+    lines: List[str] = []
+
+    last_addr, last = body[-1]
+    straight = body if last.opcode in STRAIGHT_LINE else body[:-1]
+    for addr, inst in straight:
+        lines.extend(_inline(inst))
+
+    next_ip = last_addr + 2
+    x, y, kk = last.x, last.y, last.kk
+    match last.opcode:
+        case op if op in STRAIGHT_LINE:
+            # Block was cut short, fall through to the next address
+            tail = [f"cpu.ip = {next_ip}"]
+        case 0x1000:
+            tail = [f"cpu.ip = {last.nnn}"]
+        case 0x3000:
+            tail = [f"cpu.ip = {last_addr + 4} if V[{x}] == {kk} else {next_ip}"]
+        case 0x4000:
+            tail = [f"cpu.ip = {last_addr + 4} if V[{x}] != {kk} else {next_ip}"]
+        case 0x5000:
+            tail = [f"cpu.ip = {last_addr + 4} if V[{x}] == V[{y}] else {next_ip}"]
+        case 0x2000:
+            tail = [f"cpu._push({next_ip})", f"cpu.ip = {last.nnn}"]
+        case 0x00EE:
+            tail = ["cpu.ip = cpu.stack.pop()"]
+        case 0xD000:
+            lines += [
+                "V[15] = 0",
+                "D = cpu.display",
+                f"if D.draw_sprite(V[{x}] & D.SCR_W - 1, V[{y}] & D.SCR_H - 1, "
+                f"M.read_byte_range(I, I + {last.n})):",
+                "    V[15] = 1",
+            ]
+            tail = ["cpu.df = True", f"cpu.ip = {next_ip}"]
+        case _:
+            # Defer to the interpreter's handler, exactly as CPU.step would
+            handler = CPU._method_lookup_table.get(last.opcode)
+            namespace["_inst"] = last
+            if handler is None:
+                # Data or an undefined word, which may never run. Look it up
+                # when it does, raising the interpreter's KeyError then
+                namespace["_handlers"] = CPU._method_lookup_table
+                tail = [
+                    f"cpu.ip = {last_addr}",
+                    f"_handlers[{last.opcode}](cpu, _inst)",
+                ]
+            else:
+                namespace["_handler"] = handler
+                tail = [
+                    f"cpu.ip = {last_addr}",
+                    "_handler(cpu, _inst)",
+                ]
+            if last.opcode not in NO_ADVANCE:
+                tail += [f"if cpu.ip == {last_addr}:", f"    cpu.ip = {next_ip}"]
+
+    # Only load and write back the state this block actually touches
+    ops = {inst.opcode for _, inst in straight}
+    if last.opcode == 0xD000:
+        # Drawing reads V, I and memory and writes VF, the same state
+        # touched by 6xkk and Fx65
+        ops |= {0x6000, 0xF065}
+    reads_v = bool(ops - {0x0000, 0xA000}) or last.opcode in {0x3000, 0x4000, 0x5000}
+    writes_v = bool(ops & {0x6000, 0x7000, 0xC000, 0xF007, 0xF065}) or any(
+        op & 0xF000 == 0x8000 for op in ops
+    )
+    uses_i = bool(ops & {0xA000, 0xF01E, 0xF065})
+
+    prologue = []
+    sync = []
+    if reads_v or writes_v:
+        # The register file is a bytearray and every inlined write is already
+        # masked to a byte, so blocks work on it in place
+        prologue.append("V = cpu.reg")
+    if uses_i:
+        prologue.append("I = cpu.i")
+    if ops & {0xA000, 0xF01E}:
+        sync.append("cpu.i = I")
+    if 0xF065 in ops:
+        prologue.append("M = cpu.mem")
+    if 0xC000 in ops:
+        prologue.append("rng = cpu.rng")
+    sync.append("cpu.df = False")
+
+    src = ["def block(cpu):"]
+    src.extend("    " + line for line in prologue + lines + sync + tail)
+    exec("\n".join(src), namespace)
+    return Block(namespace["block"], len(body), start, next_ip)
+
+
+class BlockTranslator(object):
+    """Execution engine that compiles straight-line runs of instructions
+    (basic blocks) into Python functions and caches them by address.
+
+    Results are identical to CPU.step. Writes into the code range of a
+    compiled block invalidate it."""
+
+    def __init__(self, cpu: CPU):
+        self.cpu = cpu
+        # Compiled blocks keyed by start address, and truncated blocks run
+        # when a cycle budget ends mid-block keyed by (start, length)
+        self._blocks: Dict[Union[int, Tuple[int, int]], Block] = {}
+        # Keys of the blocks covering each byte address
+        self._owners: Dict[int, Tuple[Union[int, Tuple[int, int]], ...]] = {}
+        cpu.mem.add_write_hook(self._invalidate)
+
+    def step(self, n_cycles: int = 1) -> None:
+        """Step the CPU n cycles, a whole block at a time where possible"""
+        cpu = self.cpu
+        if cpu._method_lookup_table is not CPU._method_lookup_table:
+            # An instrumented dispatch table is attached (profiler, tracer),
+            # every instruction has to go through it. Compared by identity,
+            # reading cpu.__dict__ would slow every attribute access on cpu.
+            cpu.step(n_cycles)
+            return
+        blocks = self._blocks
+        while n_cycles > 0:
+            block = blocks.get(cpu.ip)
+            if block is None:
+                block = self._compile(cpu.ip)
+            run, length, _, _ = block
+            if length > n_cycles:
+                # Not enough cycles left for the whole block, run its head
+                head = blocks.get((cpu.ip, n_cycles))
+                if head is None:
+                    head = self._compile(cpu.ip, n_cycles)
+                head.run(cpu)
+                return
+            run(cpu)
+            n_cycles -= length
+
+    def inherit(self, other: "BlockTranslator") -> None:
+        """Adopts the compiled blocks of a translator running identical code"""
+        self._blocks = dict(other._blocks)
+        self._owners = dict(other._owners)
+
+    def _compile(self, start: int, limit: Optional[int] = None) -> Block:
+        """Compiles and caches the block at start, keyed by start, or the
+        first limit instructions of it, keyed by (start, limit)"""
+        if limit is None:
+            key = start
+            block = compile_block(self.cpu.mem, start)
+        else:
+            key = (start, limit)
+            block = compile_block(self.cpu.mem, start, limit)
+        self._blocks[key] = block
+        for addr in range(block.start, block.end):
+            self._owners[addr] = self._owners.get(addr, ()) + (key,)
+        return block
+
+    def _invalidate(self, start: int, end: int) -> None:
+        """Drops compiled blocks overlapping the written range [start, end)"""
+        owners = self._owners
+        for addr in range(start, end):
+            for key in owners.pop(addr, ()):
+                block = self._blocks.pop(key, None)
+                if block is None:
+                    continue
+                # Forget the block at every other address it covered too
+                for covered in range(block.start, block.end):
+                    keys = tuple(k for k in owners.get(covered, ()) if k != key)
+                    if keys:
+                        owners[covered] = keys
+                    else:
+                        owners.pop(covered, None)
@@ -1,13 +1,66 @@
-from parser import parse_file, ParsedInstruction
-from cpu import CPU
+import mmap
+import os
+import chip8.snapshot as snapshot
+from typing import Callable, Optional, Union
+from chip8.display import Display
+from chip8.parser import ParsedInstruction
+from chip8.cpu import CPU
+from chip8.translator import BlockTranslator
+from chip8.fusion import FusedEngine
+from chip8.idle import IdleSkipper
+from chip8.rewind import RewindBuffer
+from chip8.romcache import RomCache
+from chip8.scheduler import DEFAULT_IPS, Scheduler
+
+# A program to load: a file path, or its contents
+Rom = Union[str, os.PathLike, bytes, bytearray, memoryview, mmap.mmap]
+
+# Names of the available execution engines
+ENGINES = ("interpreter", "block", "fused")
+# When run_frames() hands display changes to the presenter:
+# "frame": once at the end of every frame in which the display changed
+# "vsync": once at the end of every frame, with an empty mask if nothing changed
+# "immediate": after every instruction that changed the display
+PRESENT_POLICIES = ("frame", "vsync", "immediate")
 
 
 class VM(object):
-    def __init__(self):
-        self.cpu = CPU()
+    def __init__(
+        self,
+        engine: str = "interpreter",
+        cpu: Optional[CPU] = None,
+        ips: int = DEFAULT_IPS,
+        idle_skip: bool = False,
+    ):
+        self.cpu = cpu if cpu is not None else CPU()
+        # Instructions per 60 Hz frame for run_frames()
+        self.scheduler = Scheduler(ips)
+        self.engine_name = engine
+        # Execution engine, anything with a step(n_cycles) method
+        match engine:
+            case "interpreter":
+                self.engine = self.cpu
+            case "block":
+                self.engine = BlockTranslator(self.cpu)
+            case "fused":
+                self.engine = FusedEngine(self.cpu)
+            case _:
+                raise ValueError(
+                    f"Unknown engine {engine!r}, expected one of {ENGINES}"
+                )
+        # Fast-forwards idle loops in run_frames() if enabled
+        self.idle: Optional[IdleSkipper] = IdleSkipper(self) if idle_skip else None
+        # Instructions executed since the VM was created
+        self.cycles = 0
+        # Ring of past states, see enable_rewind()
+        self.rewind_buffer: Optional[RewindBuffer] = None
+        # Called with (display, dirty row mask), see set_presenter()
+        self.presenter: Optional[Callable[[Display, int], None]] = None
+        self.present_policy = "frame"
 
     def reset(self) -> None:
         self.cpu.reset()
+        self.scheduler.reset()
 
     def is_drawing(self) -> bool:
         """Returns the state of the draw flag on the CPU.
@@ -17,14 +70,139 @@ class VM(object):
         return self.cpu.df
 
     def get_current_instruction(self) -> ParsedInstruction:
-        return self.cpu.mem[self.cpu.ip]
+        return self.cpu.mem.fetch(self.cpu.ip)
 
     def step(self, n_cycles: int = 1) -> None:
-        self.cpu.step(n_cycles=n_cycles)
-
-    def load(self, filename: str, offset=0x200):
-        """Parses and loads a Chip8 program into memory at 0x200"""
-        for idx, parsed_instruction in enumerate(parse_file(filename)):
-            # Store ParsedInstruction objects at 2-byte alignments
-            assert isinstance(parsed_instruction, ParsedInstruction) is True
-            self.cpu.mem[2 * idx + offset] = parsed_instruction
+        """Executes n instructions without ticking the timers"""
+        self.engine.step(n_cycles=n_cycles)
+        self.cycles += n_cycles
+        if self.rewind_buffer is not None:
+            self.rewind_buffer.record()
+
+    def run_frames(self, n_frames: int = 1) -> int:
+        """Runs whole 60 Hz frames, each executing the scheduler's share of
+        instructions and then ticking the timers once.
+
+        Returns the number of instructions executed."""
+        cpu, engine, scheduler = self.cpu, self.engine, self.scheduler
+        immediate = self.presenter is not None and self.present_policy == "immediate"
+        total = 0
+        for _ in range(0, n_frames):
+            n = scheduler.cycles_for_frame()
+            if immediate:
+                self._run_presenting(n)
+            elif self.idle is not None:
+                self.idle.run(n)
+            else:
+                engine.step(n_cycles=n)
+            cpu.tick_timers()
+            self.cycles += n
+            total += n
+            if self.presenter is not None:
+                self._present(self.present_policy == "vsync")
+            if self.rewind_buffer is not None:
+                self.rewind_buffer.record()
+        return total
+
+    def set_presenter(
+        self, presenter: Optional[Callable[[Display, int], None]], policy: str = "frame"
+    ) -> None:
+        """Sets the callback run_frames() hands display changes to.
+
+        The presenter is called with the display and the mask of rows that
+        changed since it was last called, gathered according to policy, one
+        of PRESENT_POLICIES."""
+        if policy not in PRESENT_POLICIES:
+            raise ValueError(
+                f"Unknown present policy {policy!r}, expected one of {PRESENT_POLICIES}"
+            )
+        self.presenter = presenter
+        self.present_policy = policy
+
+    def _present(self, always: bool) -> None:
+        """Hands the rows changed since the last present to the presenter"""
+        display = self.cpu.display
+        if always or display.dirty:
+            self.presenter(display, display.take_dirty())
+
+    def _run_presenting(self, n_cycles: int) -> None:
+        """Executes n instructions on the engine one at a time, presenting
+        after each one that drew. Idle loops are not fast-forwarded, the
+        skipper needs the rest of the frame in one call."""
+        cpu, engine = self.cpu, self.engine
+        for _ in range(0, n_cycles):
+            engine.step(n_cycles=1)
+            if cpu.display.dirty:
+                self._present(False)
+
+    def enable_rewind(self, capacity: int = 600, keyframe_interval: int = 60) -> None:
+        """Starts recording the state of the VM after every frame or step().
+
+        Only the last `capacity` states are kept. Every keyframe_interval
+        states a full snapshot is stored, the rest only store changes."""
+        self.rewind_buffer = RewindBuffer(self, capacity, keyframe_interval)
+        self.rewind_buffer.record()
+
+    def rewind(self, n: int = 1) -> None:
+        """Goes back n frames, or n calls to step()"""
+        if self.rewind_buffer is None:
+            raise RuntimeError("Rewind is not enabled")
+        self.rewind_buffer.rewind(n)
+
+    def rewind_cycles(self, n: int) -> None:
+        """Goes back n executed instructions"""
+        if self.rewind_buffer is None:
+            raise RuntimeError("Rewind is not enabled")
+        self.rewind_buffer.rewind_cycles(n)
+
+    def snapshot(self) -> bytes:
+        """Returns an immutable save-state of the whole machine"""
+        return snapshot.take(self.cpu, self.scheduler)
+
+    def restore(self, blob: bytes) -> None:
+        """Restores the whole machine from a save-state taken by snapshot()"""
+        snapshot.restore(self.cpu, blob, self.scheduler)
+
+    def fork(self) -> "VM":
+        """Returns an independent copy of this VM.
+
+        The copy shares memory pages with this VM until either side writes
+        to them, and starts out with this VM's compiled code."""
+        cpu = CPU()
+        cpu.mem = self.cpu.mem.fork()
+        child = VM(self.engine_name, cpu, idle_skip=self.idle is not None)
+        child.scheduler = self.scheduler.copy()
+        if isinstance(self.engine, (BlockTranslator, FusedEngine)):
+            child.engine.inherit(self.engine)
+        # Copy the rest of the machine state
+        parent = self.cpu
+        cpu.ip, cpu.sp, cpu.i = parent.ip, parent.sp, parent.i
+        cpu.dt, cpu.st, cpu.df = parent.dt, parent.st, parent.df
+        cpu.reg[:] = parent.reg
+        cpu.stack.extend(parent.stack)
+        cpu.display = parent.display.copy()
+        cpu.rng.setstate(parent.rng.getstate())
+        child.cycles = self.cycles
+        return child
+
+    def load(self, rom: Rom, offset=0x200, cache: Optional[RomCache] = None):
+        """Loads a Chip8 program into memory at 0x200.
+
+        rom is the path of a program file, or the program itself as a
+        bytes-like object or an mmap. Immutable programs, bytes or an mmap
+        opened with ACCESS_READ, are mapped into memory rather than copied:
+        VMs loading the same object share its pages until they write to them.
+        A mapped mmap cannot be closed while any of those VMs is alive.
+
+        With a cache, the program's instructions come pre-decoded from it,
+        and it is decoded and added to the cache if it is not there yet."""
+        path = isinstance(rom, (str, os.PathLike))
+        if cache is not None:
+            decoded = cache.load(rom) if path else cache.put(rom)
+            self.cpu.mem.load_decoded(decoded.data, decoded.opcodes, offset)
+            return
+        if path:
+            # Read program file into memory
+            with open(rom, "rb") as f:
+                rom = f.read()
+        self.cpu.mem.load(rom, offset)
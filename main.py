@@ -1,8 +1,7 @@
 import sys
-from math import floor
-from time import time_ns
 
 from chip8 import vm
+from chip8.renderer import Renderer
 import pygame
 
 import psutil
@@ -30,17 +29,26 @@ if __name__ == "__main__":
     # Configure pygame window
     screen = pygame.display.set_mode((128, 64))
     pygame.display.set_caption("CHIP-8")
+    # Draws the framebuffer onto the window at an integer scale
+    renderer = Renderer(screen)
+
+    def present(display, dirty):
+        rects = renderer.present(display, dirty)
+        if rects:
+            pygame.display.update(rects)
+
+    # Present at most once per emulated frame, with every row changed during it
+    c8.set_presenter(present, "frame")
 
     # Timing
-    one_frame_ns = 166_666_666
-    last_frame_ns = 0
+    frames_per_second = 60
 
     # State
     game_running = True
     crash_exception = None
     interpreter_cycle = 0
 
-    # Main loop
+    # Main loop, one iteration per 60 Hz frame
     while game_running:
         try:
             # Close on any key press
@@ -48,9 +56,8 @@ if __name__ == "__main__":
                 if event.type == pygame.KEYDOWN:
                     game_running = False
 
-            # Simulate CPU cycle
-            c8.step(n_cycles=1)
-            interpreter_cycle += 1
+            # Simulate one frame worth of CPU cycles, tick the timers and present
+            interpreter_cycle += c8.run_frames(1)
 
             # Interpreter exit signal
             if c8.cpu.ip == 0x10:
@@ -58,41 +65,13 @@ if __name__ == "__main__":
                 print(f"Program exit")
                 break
 
-            # Interpreter draw call
-            if c8.is_drawing() is True:
-                # Blank
-                screen.fill("black")
-
-                # Redraw
-                for x in range(0, 64):
-                    for y in range(0, 32):
-                        if c8.cpu.display.get_pixel(x, y) > 0:
-                            # Pixel doubling
-                            c = (255,) * 3
-                            screen.set_at((2 * x, 2 * y), c)
-                            screen.set_at((2 * x, 2 * y + 1), c)
-                            screen.set_at((2 * x + 1, 2 * y), c)
-                            screen.set_at((2 * x + 1, 2 * y + 1), c)
-                        else:
-                            pass
-
-                # Flip
-                pygame.display.flip()
-
-                # Force tick
-                # time_now = time_ns()
-                # last_frame_ns = time_now
-                # clock.tick()
-
-            # Tick engine clock every 16.6 ms
-            time_now = time_ns()
-            if time_now - last_frame_ns > one_frame_ns:
-                last_frame_ns = time_now
-                clock.tick()
-                # Update window title
-                pygame.display.set_caption(
-                    f"CHIP-8: cycle: {interpreter_cycle}, ROM: {filepath}"
-                )
+            # Update window title
+            pygame.display.set_caption(
+                f"CHIP-8: cycle: {interpreter_cycle}, ROM: {filepath}"
+            )
+
+            # Wait out the rest of the frame
+            clock.tick(frames_per_second)
 
         except KeyboardInterrupt:
             game_running = False
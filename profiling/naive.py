@@ -1,5 +1,5 @@
 from chip8.vm import VM
-import cProfile, pstats, io, psutil
+import cProfile, pstats, io, psutil, sys
 
 
 if __name__ == "__main__":
@@ -10,8 +10,8 @@ if __name__ == "__main__":
         ]
     )
 
-    # Init CHIP-8
-    c8 = VM()
+    # Init CHIP-8 with the engine named on the command line
+    c8 = VM(*sys.argv[1:2])
 
     # CHIP-8 program filepath
     filepath = """../ROM/trip8.bin"""
@@ -21,7 +21,8 @@ if __name__ == "__main__":
 
     def hotLoop():
         # for _ in range(0, 1_000_000):
-        c8.step(5_000_000)
+        # 5M instructions in whole 60 Hz frames, so the timers count down
+        c8.run_frames(5_000_000 * 60 // c8.scheduler.ips)
 
     with cProfile.Profile() as profile:
         hotLoop()
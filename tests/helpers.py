@@ -0,0 +1,20 @@
+"""Helpers shared by the test modules"""
+
+from chip8.vm import VM
+
+
+def machine_state(vm: VM) -> tuple:
+    """Everything observable about a VM"""
+    cpu = vm.cpu
+    return (
+        cpu.ip,
+        cpu.i,
+        cpu.sp,
+        cpu.dt,
+        cpu.st,
+        cpu.df,
+        list(cpu.reg),
+        list(cpu.stack),
+        bytes(cpu.mem),
+        cpu.display.to_bytes(),
+    )
@@ -0,0 +1,96 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from assembler.assembler import _FORMS, AssemblyError, assemble, assemble_file, main
+from chip8.bench import MICRO_ROMS
+from chip8.parser import search_opcode
+from chip8.vm import VM
+
+
+class TestAssembler(TestCase):
+    def test_micro_rom(self):
+        """Assembling the ALU micro-ROM reproduces its bytes"""
+        source = """
+            ld r0, 1
+            ld r1, 3
+        loop:
+            add r0, 5
+            add r0, r1
+            sub r1, r1
+            and r1, r0
+            xor r0, r1
+            shr r0, r1
+            shl r1, r0
+            jp loop
+        """
+        self.assertEqual(assemble(source), MICRO_ROMS["micro:alu"])
+
+    def test_every_form(self):
+        """Every mnemonic encodes to a word the parser decodes to the intended opcode"""
+        operands = {"r": "r5", "i": "3"}
+        for name, forms in _FORMS.items():
+            for signature, (word, _) in forms.items():
+                line = " ".join([name] + [operands[kind] for kind in signature])
+                with self.subTest(line=line):
+                    decoded = search_opcode(int.from_bytes(assemble(line), "big"))
+                    self.assertEqual(decoded, search_opcode(word))
+
+    def test_labels_and_directives(self):
+        """Forward references, .org, .byte, .word and .equ"""
+        source = """
+            .equ height 5
+            ldi sprite
+            drw r0 r1 height
+            jp end
+            .org 0x210
+        sprite: .byte 0xF0 0x90 0b11110000
+            .word 0x1234
+        end: jp end
+        """
+        rom = assemble(source)
+        self.assertEqual(rom[:6].hex(), "a210d0151215")
+        self.assertEqual(rom[6:0x10], bytes(10))
+        self.assertEqual(rom[0x10:].hex(), "f090f012341215")
+
+    def test_include(self):
+        """Included files are assembled in place, relative to the includer"""
+        with tempfile.TemporaryDirectory() as tmp:
+            os.mkdir(os.path.join(tmp, "lib"))
+            with open(os.path.join(tmp, "lib", "sprites.s"), "w") as f:
+                f.write("sprite: .byte 0x80\n")
+            main_path = os.path.join(tmp, "main.s")
+            with open(main_path, "w") as f:
+                f.write("ldi sprite\n.include lib/sprites.s\n")
+            self.assertEqual(assemble_file(main_path).hex(), "a20280")
+            # The command line writes a ROM VM.load accepts
+            self.assertEqual(main([main_path]), 0)
+            vm = VM()
+            vm.load(os.path.join(tmp, "main.bin"))
+            vm.step(1)
+            self.assertEqual(vm.cpu.i, 0x202)
+
+    def test_binary_prefix(self):
+        """0b is only a binary prefix when binary digits follow"""
+        self.assertEqual(
+            assemble("ld r0 0b101\nld r1 0b\n.word 0b12").hex(), "6005610b0b12"
+        )
+
+    def test_errors(self):
+        """Errors name the line they were found on"""
+        cases = {
+            "cls\nfoo r0": "<source>:2: Unknown instruction",
+            "jp nowhere": "Undefined symbol",
+            "ld r0 256": "out of range",
+            "ld r16 1": "No register r16",
+            "drw r0 r1": "drw takes operands",
+            "a:\na:": "already defined",
+            ".org 0x100": "below the origin",
+            "jp 0x200\n.org 0x200\ncls": "overlaps",
+            ".byte 1 2\n.org 0x201\n.byte 3": "overlaps",
+        }
+        for source, message in cases.items():
+            with self.subTest(source=source):
+                with self.assertRaises(AssemblyError) as cm:
+                    assemble(source)
+                self.assertIn(message, str(cm.exception))
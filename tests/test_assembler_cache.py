@@ -0,0 +1,86 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from assembler.assembler import assemble_file
+from assembler.cache import AssemblyCache
+
+
+class TestAssemblyCache(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = AssemblyCache(os.path.join(self.tmp.name, "cache"))
+        self.main = self.write("main.s", "ldi sprite\n.include sprites.s\n")
+        self.sprites = self.write("sprites.s", "sprite: .byte 0x80\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name: str, text: str) -> str:
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def test_rom_reused(self):
+        """An unchanged program is not assembled again"""
+        first = assemble_file(self.main, cache=self.cache)
+        misses = self.cache.misses
+        second = assemble_file(self.main, cache=self.cache)
+        self.assertEqual(first, second)
+        self.assertEqual(self.cache.misses, misses)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_include_changed(self):
+        """Changing an include re-assembles the program, re-tokenizing only that file"""
+        assemble_file(self.main, cache=self.cache)
+        self.write("sprites.s", "sprite: .byte 0x40 0x40\n")
+        hits, misses = self.cache.hits, self.cache.misses
+        rom = assemble_file(self.main, cache=self.cache)
+        self.assertEqual(rom.hex(), "a2024040")
+        # ROM and sprites.s tokens missed, main.s tokens hit
+        self.assertEqual((self.cache.hits - hits, self.cache.misses - misses), (1, 2))
+        # A new cache over the same directory sees the new entries
+        cache = AssemblyCache(self.cache.directory)
+        self.assertEqual(assemble_file(self.main, cache=cache), rom)
+        self.assertEqual(cache.hits, 1)
+
+    def test_size_limit(self):
+        """The least recently used entries are evicted beyond max_bytes"""
+        cache = AssemblyCache(os.path.join(self.tmp.name, "small"), max_bytes=30)
+        cache.put("a", bytes(10))
+        cache.put("b", bytes(10))
+        # Make "a" the most recently used
+        os.utime(os.path.join(cache.directory, "b.entry"), (0, 0))
+        self.assertEqual(cache.get("a"), bytes(10))
+        cache.put("c", bytes(15))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), bytes(10))
+        self.assertLessEqual(cache.size(), 30)
+
+    def test_damaged_entries(self):
+        """Damaged entries count as misses and are rebuilt"""
+        rom = assemble_file(self.main, cache=self.cache)
+        for name in os.listdir(self.cache.directory):
+            with open(os.path.join(self.cache.directory, name), "wb") as f:
+                f.write(b"garbage")
+        cache = AssemblyCache(self.cache.directory)
+        self.assertEqual(assemble_file(self.main, cache=cache), rom)
+        self.assertEqual(cache.hits, 0)
+        self.assertEqual(assemble_file(self.main, cache=cache), rom)
+        self.assertEqual(cache.hits, 1)
+
+    def test_include_shadowed(self):
+        """A new file found ahead of an include on the search path forces a rebuild"""
+        os.mkdir(os.path.join(self.tmp.name, "lib"))
+        self.write("lib/font.s", "font: .byte 0x80\n")
+        main = self.write("game.s", "ldi font\n.include font.s\n")
+        lib = [os.path.join(self.tmp.name, "lib")]
+        self.assertEqual(
+            assemble_file(main, include_dirs=lib, cache=self.cache).hex(), "a20280"
+        )
+        # Next to the includer, so found before include_dirs
+        self.write("font.s", "font: .byte 0x40\n")
+        self.assertEqual(
+            assemble_file(main, include_dirs=lib, cache=self.cache).hex(), "a20240"
+        )
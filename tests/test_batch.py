@@ -0,0 +1,72 @@
+import os
+from unittest import TestCase, skipUnless
+
+from chip8.vm import VM
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+else:
+    from chip8.batch import BatchCPU
+
+rom_dir = os.path.join(os.path.dirname(__file__), "..", "ROM")
+
+
+@skipUnless(numpy, "numpy is not installed")
+class TestBatchCPU(TestCase):
+    def test_matches_cpu(self):
+        """Every lane matches the scalar CPU on a ROM"""
+        with open(os.path.join(rom_dir, "trip8.bin"), "rb") as f:
+            program = f.read()
+        # trip8.bin first executes Cxkk after 14532 cycles
+        n_cycles = 5000
+        vm = VM()
+        vm.cpu.mem.load(program, 0x200)
+        vm.step(n_cycles)
+        batch = BatchCPU(3)
+        batch.load(program)
+        batch.step(n_cycles)
+
+        cpu = vm.cpu
+        for lane in range(0, 3):
+            self.assertEqual(
+                (
+                    batch.ip[lane],
+                    batch.i[lane],
+                    batch.sp[lane],
+                    batch.dt[lane],
+                    batch.st[lane],
+                ),
+                (cpu.ip, cpu.i, cpu.sp, cpu.dt, cpu.st),
+            )
+            self.assertEqual(list(batch.reg[lane]), list(cpu.reg))
+            self.assertEqual(
+                list(batch.stack[lane, : batch.depth[lane]]), list(cpu.stack)
+            )
+            self.assertEqual(batch.mem[lane].tobytes(), bytes(cpu.mem))
+            self.assertEqual(batch.lane_display(lane), cpu.display.to_bytes())
+
+    def test_seeds(self):
+        """Lanes draw random numbers from their own seed"""
+        # RND V0, 0xFF; JP 0x200
+        batch = BatchCPU(3, seeds=[1, 2, 1])
+        batch.load(bytes.fromhex("c0ff1200"))
+        values = []
+        for _ in range(0, 8):
+            batch.step(2)
+            values.append(list(batch.reg[:, 0]))
+        self.assertEqual([v[0] for v in values], [v[2] for v in values])
+        self.assertNotEqual([v[0] for v in values], [v[1] for v in values])
+
+    def test_halt(self):
+        """Lanes that fault stop without affecting the others"""
+        # 0x200: SE V0, 0; 0x202: SKP V0 (not implemented); 0x204: JP 0x204
+        batch = BatchCPU(2)
+        batch.load(bytes.fromhex("3000e09e1204"))
+        batch.reg[1, 0] = 1
+        batch.step(4)
+        self.assertEqual(list(batch.halted), [False, True])
+        self.assertIn(1, batch.errors)
+        self.assertEqual(batch.ip[0], 0x204)
+        self.assertEqual(batch.ip[1], 0x202)
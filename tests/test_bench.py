@@ -0,0 +1,46 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from chip8 import bench
+from chip8.vm import ENGINES
+
+rom_dir = os.path.join(os.path.dirname(__file__), "..", "ROM")
+
+
+class TestBench(TestCase):
+    def test_micro_roms(self):
+        """Every micro-ROM runs cleanly on every engine"""
+        results = bench.run_suite(cycles=1200, repeat=1, trace_allocations=False)
+        self.assertEqual(len(results), len(bench.MICRO_ROMS) * len(ENGINES))
+        for result in results:
+            self.assertIsNone(result.error, result.name)
+            self.assertEqual(result.cycles, 1200)
+            self.assertEqual(result.frames, 100)
+            self.assertGreater(result.ips, 0)
+
+    def test_allocations(self):
+        """Allocation tracing reports a peak"""
+        result = bench.bench_program(
+            "alu", bench.MICRO_ROMS["micro:alu"], cycles=120, repeat=1
+        )
+        self.assertGreater(result.alloc_peak, 0)
+
+    def test_error_recorded(self):
+        """Exceptions raised by a program are recorded instead of propagated"""
+        result = bench.bench_program("skp", bytes.fromhex("e09e"), cycles=120, repeat=1)
+        self.assertIn("NotImplementedError", result.error)
+
+    def test_save_and_compare(self):
+        """Saved results load back and slower runs are reported"""
+        results = bench.run_suite([rom_dir], engines=["block"], cycles=120, repeat=1)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.json")
+            bench.save(path, results)
+            loaded = bench.load(path)
+        self.assertEqual(loaded, results)
+        self.assertEqual(bench.compare(loaded, results), [])
+        slower = [r._replace(ips=r.ips / 2) for r in results]
+        regressions = bench.compare(loaded, slower)
+        self.assertEqual(len(regressions), len(results))
+        self.assertAlmostEqual(regressions[0][2], 0.5)
@@ -0,0 +1,65 @@
+from unittest import TestCase
+
+from chip8.display import Display
+
+
+class TestDisplay(TestCase):
+    def setUp(self):
+        self.display = Display()
+
+    def tearDown(self):
+        del self.display
+
+    def test_pixels(self):
+        """Pixels read back what was written to them"""
+        self.display.set_pixel(0, 0, 1)
+        self.display.set_pixel(63, 31, 1)
+        self.assertEqual(self.display.get_pixel(0, 0), 1)
+        self.assertEqual(self.display.get_pixel(63, 31), 1)
+        self.assertEqual(self.display.get_pixel(1, 0), 0)
+        self.display.set_pixel(0, 0, 0)
+        self.assertEqual(self.display.get_pixel(0, 0), 0)
+
+    def test_reset(self):
+        """All pixels are off after reset"""
+        self.display.set_pixel(10, 10, 1)
+        self.display.reset()
+        self.assertEqual(self.display.to_bytes(), bytes(256))
+
+    def test_draw_sprite(self):
+        """Sprite bits land on the pixels to the right of x"""
+        collision = self.display.draw_sprite(3, 2, b"\x81")
+        self.assertFalse(collision)
+        lit = [x for x in range(0, 64) if self.display.get_pixel(x, 2)]
+        self.assertEqual(lit, [3, 10])
+
+    def test_draw_sprite_collision(self):
+        """Drawing over lit pixels turns them off and reports a collision"""
+        self.display.draw_sprite(0, 0, b"\xff")
+        self.assertTrue(self.display.draw_sprite(4, 0, b"\xf0"))
+        lit = [x for x in range(0, 64) if self.display.get_pixel(x, 0)]
+        self.assertEqual(lit, [0, 1, 2, 3])
+
+    def test_draw_sprite_clips(self):
+        """Sprites are clipped at the right and bottom edges"""
+        self.display.draw_sprite(60, 30, b"\xff\xff\xff")
+        self.assertEqual(self.display.rows[30], 0xF)
+        self.assertEqual(self.display.rows[31], 0xF)
+        self.assertEqual(self.display.rows[0], 0)
+
+    def test_copy(self):
+        """Copies do not share pixels with the original"""
+        other = self.display.copy()
+        other.set_pixel(0, 0, 1)
+        self.assertEqual(self.display.get_pixel(0, 0), 0)
+        self.assertNotEqual(other, self.display)
+
+    def test_dirty_rows(self):
+        """Only rows a sprite or pixel write touched are marked dirty"""
+        self.display.take_dirty()
+        self.display.draw_sprite(10, 4, b"\x80\x00\x80")
+        self.display.set_pixel(0, 31, 1)
+        self.assertEqual(self.display.take_dirty(), (1 << 4) | (1 << 6) | (1 << 31))
+        self.assertEqual(self.display.take_dirty(), 0)
+        self.display.reset()
+        self.assertEqual(self.display.take_dirty(), (1 << 32) - 1)
@@ -0,0 +1,41 @@
+import hashlib
+import os
+from unittest import TestCase
+
+from chip8 import fleet, headless
+
+rom_dir = os.path.join(os.path.dirname(__file__), "..", "ROM")
+
+
+class TestFleet(TestCase):
+    def test_run(self):
+        """Every VM publishes the same final state as a headless run"""
+        roms = [os.path.join(rom_dir, name) for name in ("trip8.bin", "Maze.bin")]
+        with fleet.Fleet(roms * 2, processes=2, publish_frames=10) as f:
+            states = f.run(cycles=3000)
+            self.assertEqual(f.wait(), [None] * 4)
+        for rom, state in zip(roms * 2, states):
+            expected = headless.run_rom(rom, cycles=3000)
+            self.assertEqual(state.status, fleet.STATUS_DONE)
+            self.assertEqual(state.cycles, 3000)
+            self.assertEqual(
+                hashlib.sha1(state.display).hexdigest(), expected.display_digest
+            )
+
+    def test_unstarted(self):
+        """Slots read as pending before their VM runs"""
+        with fleet.Fleet([os.path.join(rom_dir, "Maze.bin")], processes=1) as f:
+            self.assertFalse(f.done())
+            self.assertEqual(f.read(0).status, fleet.STATUS_PENDING)
+
+    def test_missing_rom(self):
+        """A ROM that cannot be loaded fails its own VM only"""
+        roms = [os.path.join(rom_dir, "missing.bin"), os.path.join(rom_dir, "Maze.bin")]
+        with fleet.Fleet(roms, processes=1) as f:
+            states = f.run(cycles=100)
+            errors = f.wait()
+        self.assertIn("FileNotFoundError", errors[0])
+        self.assertIsNone(errors[1])
+        self.assertEqual(states[0].status, fleet.STATUS_ERROR)
+        self.assertEqual((states[0].ip, states[0].cycles), (0, 0))
+        self.assertEqual(states[1].status, fleet.STATUS_DONE)
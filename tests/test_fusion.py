@@ -0,0 +1,111 @@
+import os
+from unittest import TestCase
+
+from chip8.cpu import CPU
+from chip8.fusion import _UNSELECTED
+from chip8.vm import VM
+from tests.helpers import machine_state
+
+rom_dir = os.path.join(os.path.dirname(__file__), "..", "ROM")
+
+
+class TestFusedEngine(TestCase):
+    def run_both(self, program: bytes, n_cycles: int) -> None:
+        """Run a program under the interpreter and fused engines and compare them"""
+        states = []
+        for engine in ("interpreter", "fused"):
+            vm = VM(engine)
+            vm.cpu.rng.seed(8)
+            vm.cpu.mem.load(program, 0x200)
+            vm.step(n_cycles)
+            states.append(machine_state(vm))
+        self.assertEqual(states[0], states[1])
+
+    def test_roms(self):
+        """The fused engine matches the interpreter on the bundled ROMs"""
+        for name in ("trip8.bin", "Maze.bin"):
+            with open(os.path.join(rom_dir, name), "rb") as f:
+                program = f.read()
+            for n_cycles in (1, 5, 1000, 20_000):
+                with self.subTest(rom=name, n_cycles=n_cycles):
+                    self.run_both(program, n_cycles)
+
+    def test_pairs(self):
+        """Every fused handler matches two interpreted steps, skips taken or not"""
+        # LD V0, 1; LD V1, 2; ADD V0, 1; SE V0, 2; LD I, 0x300; ADD I, V1; ADD I, V1;
+        # LD V2, [I]; LD I, 0x300; DRW V0, V1, 5; ADD V3, 1; LD V4, DT; SE V4, 0;
+        # ADD I, V0; LD V1, [I]; ADD I, V0; DRW V0, V1, 5; ADD V0, 1; ADD I, V1;
+        # JP 0x200
+        program = bytes.fromhex(
+            "60016102700130026300a300f11ef11ef265a300d0157301"
+            + "6307f407340043016001f11ef165f01ed0157001f11e1200"
+        )
+        for n_cycles in range(1, 60):
+            with self.subTest(n_cycles=n_cycles):
+                self.run_both(program, n_cycles)
+
+    def test_selected(self):
+        """Instructions and pairs are selected as they first execute"""
+        vm = VM("fused")
+        vm.cpu.mem.load(bytes.fromhex("a300d0151200"), 0x200)
+        self.assertIs(vm.engine._code[0x200], _UNSELECTED)
+        vm.step(3)
+        handler, a, b, _ = vm.engine._code[0x200]
+        self.assertIs(handler, CPU._fused_lookup_table[(0xA000, 0xD000)])
+        self.assertEqual((a.nnn, b.n), (0x300, 5))
+        handler, a, b, advances = vm.engine._code[0x204]
+        self.assertIs(handler, CPU._method_lookup_table[0x1000])
+        self.assertEqual((a.nnn, b, advances), (0x200, None, False))
+
+    def test_undefined_word(self):
+        """Running into an undefined word fails exactly as in the interpreter"""
+        # LD V0, 1; LD V1, 2 fused with it; DRW V0, V1, 1; then the word 0xE083
+        program = bytes.fromhex("60016102d011e083")
+        states = []
+        for engine in ("interpreter", "fused"):
+            vm = VM(engine)
+            vm.cpu.mem.load(program, 0x200)
+            with self.assertRaises(KeyError):
+                vm.step(4)
+            states.append(machine_state(vm))
+        self.assertEqual(states[0], states[1])
+        self.assertFalse(states[0][5])
+
+    def test_self_modifying(self):
+        """Writes into a fused pair re-select it"""
+        # 0x200: LD V0, 1
+        # 0x202: LD V1, 1    -> fused with the LD V0 above
+        # 0x204: ADD V0, 1
+        # 0x206: LD I, 0x203
+        # 0x208: LD [I], V0  -> rewrites the immediate of LD V1
+        # 0x20A: JP 0x200
+        program = bytes.fromhex("60016101 7001a203f0551200")
+        vm = VM("fused")
+        vm.cpu.mem.load(program, 0x200)
+        vm.step(6)
+        self.assertEqual(vm.cpu.mem[0x203], 2)
+        vm.step(2)
+        self.assertEqual(vm.cpu.reg.get(1), 2)
+        self.run_both(program, 1000)
+
+    def test_data_writes(self):
+        """Writes outside the selected code keep it selected"""
+        # LD I, 0x300; LD [I], V0; JP 0x202
+        vm = VM("fused")
+        vm.cpu.mem.load(bytes.fromhex("a300f0551202"), 0x200)
+        vm.step(3)
+        selected = list(vm.engine._code)
+        vm.step(100)
+        self.assertEqual(vm.engine._code, selected)
+        vm.cpu.mem[0x203] = 0x55
+        self.assertIs(vm.engine._code[0x202], _UNSELECTED)
+
+    def test_fork(self):
+        """Forks keep the selected pairs"""
+        vm = VM("fused")
+        vm.cpu.mem.load(bytes.fromhex("a300d0151200"), 0x200)
+        child = vm.fork()
+        self.assertEqual(child.engine._code, vm.engine._code)
+        child.step(3)
+        vm.step(3)
+        self.assertEqual(machine_state(child), machine_state(vm))
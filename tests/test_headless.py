@@ -0,0 +1,91 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from chip8 import headless
+
+rom_dir = os.path.join(os.path.dirname(__file__), "..", "ROM")
+
+
+class TestHeadless(TestCase):
+    def test_engines_agree(self):
+        """All engines produce the same digests for the same seed"""
+        results = [
+            headless.run_rom(
+                os.path.join(rom_dir, "Maze.bin"), cycles=5000, engine=engine
+            )
+            for engine in ("interpreter", "block", "fused")
+        ]
+        for result in results[1:]:
+            self.assertEqual(result.state_digest, results[0].state_digest)
+            self.assertEqual(result.display_digest, results[0].display_digest)
+
+    def test_frame_budget(self):
+        """A frame budget runs whole frames of instructions"""
+        result = headless.run_rom(
+            os.path.join(rom_dir, "trip8.bin"), frames=10, cycles_per_frame=7
+        )
+        self.assertEqual(result.frames, 10)
+        self.assertEqual(result.cycles, 70)
+        self.assertIsNone(result.error)
+
+    def test_budget_required(self):
+        """Running without any budget is an error"""
+        with self.assertRaises(ValueError):
+            headless.run_rom(os.path.join(rom_dir, "Maze.bin"))
+
+    def test_error_recorded(self):
+        """Exceptions raised by a ROM are recorded instead of propagated"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "skp.bin")
+            # SKP V0 is not implemented
+            with open(path, "wb") as f:
+                f.write(bytes.fromhex("e09e"))
+            result = headless.run_rom(path, cycles=10)
+        self.assertEqual(result.cycles, 0)
+        self.assertIn("NotImplementedError", result.error)
+
+    def test_error_mid_frame(self):
+        """Instructions completed in the frame that raised are counted"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "late.bin")
+            # V0 += 1 until it reaches 30, then SKP V0, which is not implemented
+            with open(path, "wb") as f:
+                f.write(bytes.fromhex("7001 301e 1200 e09e"))
+            for engine in ("interpreter", "block", "fused"):
+                with self.subTest(engine=engine):
+                    result = headless.run_rom(path, cycles=1000, engine=engine)
+                    # 29 iterations of three, then 7001 and the skip
+                    self.assertEqual((result.frames, result.cycles), (7, 89))
+                    self.assertIn("NotImplementedError", result.error)
+
+    def test_batch(self):
+        """Batches run every ROM in a directory"""
+        paths = headless.expand_paths([rom_dir])
+        results = headless.run_batch(paths, cycles=100)
+        self.assertEqual([r.rom for r in results], paths)
+
+    def test_main(self):
+        """The command line prints one line or JSON object per ROM"""
+        path = os.path.join(rom_dir, "Maze.bin")
+        expected = headless.run_rom(path, cycles=1000, seed=3)
+        for extra in ([], ["--json"]):
+            with self.subTest(extra=extra):
+                out = io.StringIO()
+                with contextlib.redirect_stdout(out):
+                    ret = headless.main(
+                        [path, "--cycles", "1000", "--seed", "3"] + extra
+                    )
+                self.assertEqual(ret, 0)
+                lines = out.getvalue().splitlines()
+                self.assertEqual(len(lines), 1)
+                if extra:
+                    result = json.loads(lines[0])
+                    self.assertEqual(result["rom"], path)
+                    self.assertEqual(result["state_digest"], expected.state_digest)
+                else:
+                    self.assertTrue(lines[0].startswith(f"{path}: 1000 cycles"))
+                    self.assertIn(f"state {expected.state_digest[:12]}", lines[0])
@@ -0,0 +1,80 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from chip8.hotspots import HotspotSampler
+from chip8.vm import VM
+
+# DT = 30, then poll DT until it reaches 0, then V1 += 1 forever
+program = bytes.fromhex("601e f015 f107 3100 1204 7101 120a")
+
+
+class TestHotspots(TestCase):
+    def setUp(self):
+        self.vm = VM("block")
+        self.vm.cpu.mem.load(program, 0x200)
+        self.sampler = HotspotSampler(self.vm)
+
+    def tearDown(self):
+        del self.sampler
+        del self.vm
+
+    def test_samples(self):
+        """Every interval instructions one sample lands on IP"""
+        with self.sampler:
+            self.vm.step(700)
+        self.assertEqual(self.sampler.total(), 100)
+        self.assertTrue(
+            set(addr for addr, _ in self.sampler.hottest()) <= {0x204, 0x206, 0x208}
+        )
+
+    def test_out_of_memory(self):
+        """A sample past the end of memory is dropped rather than failing"""
+        # V0 = 0xFF, then jump to 0xFFF + V0
+        self.vm.cpu.mem.load(bytes.fromhex("60ff bfff"), 0x200)
+        with HotspotSampler(self.vm, interval=2) as sampler:
+            self.vm.step(2)
+        self.assertEqual(self.vm.cpu.ip, 0x10FE)
+        self.assertEqual(sampler.total(), 0)
+
+    def test_detach(self):
+        """Detaching restores the VM's engine"""
+        engine = self.vm.engine
+        with self.sampler:
+            self.assertIsNot(self.vm.engine, engine)
+        self.assertIs(self.vm.engine, engine)
+        self.vm.step(70)
+        self.assertEqual(self.sampler.total(), 0)
+
+    def test_loops(self):
+        """Polling the delay timer and jumping to self are busy-waits"""
+        with self.sampler:
+            self.vm.run_frames(60)
+        loops = {(loop.start, loop.end): loop.kind for loop in self.sampler.loops()}
+        self.assertEqual(loops, {(0x204, 0x20A): "timer-wait", (0x20A, 0x20E): "loop"})
+        self.vm.cpu.mem.load(bytes.fromhex("1200"), 0x200)
+        self.vm.cpu.ip = 0x200
+        self.sampler.samples[:] = [0] * len(self.sampler.samples)
+        with self.sampler:
+            self.vm.step(70)
+        self.assertEqual([loop.kind for loop in self.sampler.loops()], ["spin"])
+
+    def test_blocks(self):
+        """Samples are grouped into the basic blocks that contain them"""
+        with self.sampler:
+            self.vm.step(700)
+        blocks = {(block.start, block.end) for block in self.sampler.blocks()}
+        self.assertTrue(blocks <= {(0x204, 0x208), (0x208, 0x20A)}, blocks)
+
+    def test_heatmaps(self):
+        """The ASCII heatmap has one line per row and the PNG is written"""
+        with self.sampler:
+            self.vm.step(700)
+        lines = self.sampler.heatmap(start=0x200, end=0x300).splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[0][7:12], "  @@@")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "heat.png")
+            self.sampler.to_png(path, scale=2)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(8), b"\x89PNG\r\n\x1a\n")
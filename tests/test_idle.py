@@ -0,0 +1,59 @@
+import os
+from unittest import TestCase
+
+from chip8 import headless
+from chip8.vm import VM
+
+rom_dir = os.path.join(os.path.dirname(__file__), "..", "ROM")
+
+# DT = 20, wait for DT to reach 0 polling it into V1, then V2 += 1 forever
+program = bytes.fromhex("6014 f015 f107 3100 1204 7201 120a")
+
+
+class TestIdleSkip(TestCase):
+    def run_program(self, idle_skip, frames=30, ips=6000):
+        vm = VM("block", ips=ips, idle_skip=idle_skip)
+        vm.cpu.mem.load(program, 0x200)
+        vm.cpu.rng.seed(0)
+        vm.run_frames(frames)
+        return vm
+
+    def test_same_state(self):
+        """Skipping idle iterations leaves the machine in the same state"""
+        for frames in (1, 5, 19, 20, 21, 30):
+            plain = self.run_program(False, frames)
+            skipping = self.run_program(True, frames)
+            self.assertEqual(skipping.snapshot(), plain.snapshot(), frames)
+            self.assertEqual(skipping.cycles, plain.cycles)
+
+    def test_skips(self):
+        """Most of the instructions spent waiting are skipped"""
+        vm = self.run_program(True, frames=19)
+        self.assertGreater(vm.idle.skipped, vm.cycles * 8 // 10)
+
+    def test_counting_loop_not_skipped(self):
+        """Loops that change state every iteration run normally"""
+        vm = self.run_program(True, frames=30)
+        skipped = vm.idle.skipped
+        vm.run_frames(10)
+        self.assertEqual(vm.idle.skipped, skipped)
+
+    def test_spin(self):
+        """A jump to itself is skipped too"""
+        vm = VM("interpreter", idle_skip=True)
+        vm.cpu.mem.load(bytes.fromhex("1200"), 0x200)
+        vm.run_frames(60)
+        self.assertEqual(vm.cpu.ip, 0x200)
+        self.assertGreater(vm.idle.skipped, 500)
+
+    def test_roms(self):
+        """ROMs end in the same state with and without idle skipping"""
+        for rom in headless.expand_paths([rom_dir]):
+            results = [
+                headless.run_rom(
+                    rom, frames=600, cycles_per_frame=50, idle_skip=idle_skip
+                )
+                for idle_skip in (False, True)
+            ]
+            self.assertEqual(results[0].state_digest, results[1].state_digest, rom)
+            self.assertEqual(results[0].display_digest, results[1].display_digest, rom)
@@ -0,0 +1,145 @@
+from unittest import TestCase
+
+from chip8.memory import Memory, PAGE_SIZE
+
+size = 0x1000
+
+
+class TestMemory(TestCase):
+    def setUp(self):
+        self.memory = Memory(size)
+
+    def tearDown(self):
+        del self.memory
+
+    def test_size(self):
+        """Memory is 4096 bytes long and the last address is writable"""
+        self.assertEqual(len(self.memory), size)
+        self.memory[size - 1] = 42
+        self.assertEqual(self.memory[size - 1], 42)
+
+    def test_out_of_bounds_write(self):
+        """Writing past the end of memory causes an IndexError"""
+        with self.assertRaises(IndexError):
+            self.memory[size] = 1
+
+    def test_write_clips(self):
+        """Values written to memory are clipped to one byte"""
+        self.memory[0] = 0x101
+        self.memory[1] = -1
+        self.assertEqual(self.memory[0], 0xFF)
+        self.assertEqual(self.memory[1], 0)
+
+    def test_load(self):
+        """Loading copies a block of bytes at an offset"""
+        self.memory.load(b"\x12\x34\x56", 0x200)
+        self.assertEqual(self.memory.read_byte_range(0x200, 0x203), b"\x12\x34\x56")
+
+    def test_fetch(self):
+        """Fetching decodes the two bytes at an address, aligned or not"""
+        self.memory.load(b"\x00\x61\x23\x00", 0x200)
+        self.assertEqual(self.memory.fetch(0x201).bytes, 0x6123)
+        self.assertEqual(self.memory.fetch(0x202).bytes, 0x2300)
+
+    def test_fetch_out_of_bounds(self):
+        """Fetching where no whole instruction fits is a clear error"""
+        for k in (size - 1, size, -1):
+            with self.subTest(k=k):
+                with self.assertRaisesRegex(IndexError, "No instruction fits"):
+                    self.memory.fetch(k)
+
+    def test_fetch_invalidated_by_write(self):
+        """Writing either byte of a fetched instruction invalidates it"""
+        self.memory.load(b"\x61\x23", 0x200)
+        self.assertEqual(self.memory.fetch(0x200).kk, 0x23)
+        # Low byte
+        self.memory[0x201] = 0x42
+        self.assertEqual(self.memory.fetch(0x200).kk, 0x42)
+        # High byte
+        self.memory[0x200] = 0x71
+        self.assertEqual(self.memory.fetch(0x200).opcode, 0x7000)
+
+    def test_write_hook(self):
+        """Write hooks receive the range of every write"""
+        writes = []
+        self.memory.add_write_hook(lambda start, end: writes.append((start, end)))
+        self.memory[0x300] = 1
+        self.memory.load(b"\x00\x00", 0x200)
+        self.assertEqual(writes, [(0x300, 0x301), (0x200, 0x202)])
+
+
+class TestFork(TestCase):
+    def setUp(self):
+        self.parent = Memory(size)
+        self.parent.load(bytes(range(0, 256)) * 2, 0x200)
+        self.child = self.parent.fork()
+
+    def tearDown(self):
+        del self.parent
+        del self.child
+
+    def test_shares_contents(self):
+        """A fork starts out with the same contents, sharing every page"""
+        self.assertEqual(bytes(self.child), bytes(self.parent))
+        self.assertEqual(self.child.shared_pages(), size // PAGE_SIZE)
+
+    def test_copy_on_write(self):
+        """Writes copy only the touched page and stay private to one side"""
+        self.child[0x210] = 0xAA
+        self.parent[0x310] = 0xBB
+        self.assertEqual(self.child[0x210], 0xAA)
+        self.assertEqual(self.parent[0x210], 0x10)
+        self.assertEqual(self.parent[0x310], 0xBB)
+        self.assertEqual(self.child[0x310], 0x10)
+        self.assertEqual(self.child.shared_pages(), size // PAGE_SIZE - 1)
+        self.assertEqual(self.parent.shared_pages(), size // PAGE_SIZE - 1)
+
+    def test_read_across_pages(self):
+        """Byte ranges can span page boundaries"""
+        self.assertEqual(self.child.read_byte_range(0x2FE, 0x302), b"\xfe\xff\x00\x01")
+
+
+class TestSharedLoad(TestCase):
+    def setUp(self):
+        self.image = bytes(range(0, 256)) * 2 + b"\x12\x34"
+        self.memories = [Memory(size) for _ in range(3)]
+        for memory in self.memories:
+            memory.load(self.image, 0x200)
+
+    def tearDown(self):
+        del self.memories
+
+    def test_pages_reference_image(self):
+        """Whole pages of read-only data are views of it, the rest is copied"""
+        for memory in self.memories:
+            self.assertEqual(memory.read_byte_range(0x200, 0x402), self.image)
+            self.assertEqual(memory.shared_pages(), 2)
+            self.assertIs(memory._pages[2].obj, self.image)
+
+    def test_copy_on_write(self):
+        """Writes copy the touched page and leave the image and other memories alone"""
+        first, second, _ = self.memories
+        first[0x210] = 0xAA
+        self.assertEqual(first[0x210], 0xAA)
+        self.assertEqual(second[0x210], 0x10)
+        self.assertEqual(self.image[0x10], 0x10)
+        self.assertEqual(first.shared_pages(), 1)
+
+    def test_mutable_data_is_copied(self):
+        """Data that may change later is never shared"""
+        data = bytearray(self.image)
+        memory = Memory(size)
+        memory.load(data, 0x200)
+        data[0x10] = 0xAA
+        self.assertEqual(memory[0x210], 0x10)
+        self.assertEqual(memory.shared_pages(), 0)
+
+    def test_readonly_view_is_copied(self):
+        """A read-only view of a bytearray is copied, since the bytearray can change"""
+        data = bytearray(self.image)
+        memory = Memory(size)
+        memory.load(memoryview(data).toreadonly(), 0x200)
+        data[0] = 0xAA
+        self.assertEqual(memory[0x200], 0x00)
+        self.assertEqual(memory.fetch(0x200).bytes, 0x0001)
+        self.assertEqual(memory.shared_pages(), 0)
@@ -0,0 +1,46 @@
+from unittest import TestCase
+
+from chip8 import parser
+from chip8.parser import ParsedInstruction
+
+table_size = 0x10000
+
+
+class TestDecodeTable(TestCase):
+    def setUp(self):
+        self.table = parser.decode_table()
+
+    def test_size(self):
+        """The decode table has one entry for every 16-bit word"""
+        self.assertEqual(len(self.table), table_size)
+
+    def test_matches_search_opcode(self):
+        """Every table entry agrees with a walk of the syntax tree"""
+        for word in range(0, table_size):
+            self.assertEqual(self.table[word][0], parser.search_opcode(word))
+
+    def test_operands(self):
+        """Operands are pre-extracted from the instruction word"""
+        # DRW V1, V2, 3
+        opcode, nnn, n, x, y, kk = parser.decode(0xD123)
+        self.assertEqual(opcode, 0xD000)
+        self.assertEqual(nnn, 0x123)
+        self.assertEqual(n, 0x3)
+        self.assertEqual(x, 0x1)
+        self.assertEqual(y, 0x2)
+        self.assertEqual(kk, 0x23)
+
+
+class TestParsedInstruction(TestCase):
+    def test_fields(self):
+        """ParsedInstruction fields match the decode table"""
+        inst = ParsedInstruction(0x8AB4)
+        self.assertEqual(inst.bytes, 0x8AB4)
+        self.assertEqual(
+            (inst.opcode, inst.nnn, inst.n, inst.x, inst.y, inst.kk),
+            parser.decode(0x8AB4),
+        )
+
+    def test_data_word(self):
+        """Words that are not instructions decode to themselves"""
+        self.assertEqual(ParsedInstruction(0xE0FF).opcode, 0xE0FF)
@@ -0,0 +1,61 @@
+import json
+from unittest import TestCase
+
+from chip8.cpu import CPU
+from chip8.profiler import OpcodeProfiler
+from chip8.vm import VM
+
+
+class TestProfiler(TestCase):
+    def setUp(self):
+        self.vm = VM("interpreter")
+        # V0 += 1, V1 += 2, V0 += V1, loop
+        self.vm.cpu.mem.load(bytes.fromhex("700171028014 1200"), 0x200)
+
+    def tearDown(self):
+        del self.vm
+
+    def test_counts(self):
+        """Every dispatched instruction is counted once under its opcode"""
+        with OpcodeProfiler(self.vm.cpu) as profiler:
+            self.vm.step(40)
+        counts = {s.name: s.count for s in profiler.stats()}
+        self.assertEqual(counts, {"7xkk": 20, "8xy4": 10, "1nnn": 10})
+        self.assertTrue(all(s.total_ns > 0 for s in profiler.stats()))
+
+    def test_detach(self):
+        """Detaching restores the class dispatch table and stops counting"""
+        profiler = OpcodeProfiler(self.vm.cpu)
+        profiler.attach()
+        self.assertIsNot(self.vm.cpu._method_lookup_table, CPU._method_lookup_table)
+        profiler.detach()
+        self.assertIs(self.vm.cpu._method_lookup_table, CPU._method_lookup_table)
+        self.vm.step(40)
+        self.assertEqual(profiler.stats(), [])
+
+    def test_addresses(self):
+        """Address hits count executions per instruction address"""
+        with OpcodeProfiler(self.vm.cpu, addresses=True) as profiler:
+            self.vm.step(9)
+        self.assertEqual(profiler.hot_addresses(2), [(0x200, 3), (0x202, 2)])
+        data = json.loads(profiler.to_json())
+        self.assertEqual(data["addresses"]["0x206"], 2)
+        self.assertEqual(sum(op["count"] for op in data["opcodes"]), 9)
+
+    def test_table(self):
+        """The table has a header and one line per opcode"""
+        with OpcodeProfiler(self.vm.cpu) as profiler:
+            self.vm.step(8)
+        self.assertEqual(len(profiler.table().splitlines()), 4)
+
+    def test_pairs(self):
+        """Pair counts record opcodes executed from adjacent addresses"""
+        with OpcodeProfiler(self.vm.cpu, pairs=True) as profiler:
+            self.vm.step(8)
+        # The jump back to 0x200 does not pair with the 7xkk it lands on
+        self.assertEqual(
+            profiler.hot_pairs(),
+            [((0x7000, 0x7000), 2), ((0x7000, 0x8004), 2), ((0x8004, 0x1000), 2)],
+        )
+        data = json.loads(profiler.to_json())
+        self.assertEqual(data["pairs"][0]["names"], ["7xkk", "7xkk"])
@@ -67,3 +67,10 @@ class TestRegisters(TestCase):
         # Each register should contain 0 after reset
         for value in self.registers:
             self.assertEqual(value, pass_value)
+
+    def test_contiguous(self):
+        """The registers are one buffer with no per-instance dictionary"""
+        for idx in range(0, sixteen):
+            self.registers.set(idx, idx + 0xF0)
+        self.assertEqual(bytes(self.registers), bytes(range(0xF0, 0x100)))
+        self.assertFalse(hasattr(self.registers, "__dict__"))
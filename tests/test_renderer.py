@@ -0,0 +1,51 @@
+from unittest import TestCase, skipUnless
+
+from chip8.display import Display
+
+try:
+    import pygame
+except ImportError:
+    pygame = None
+else:
+    from chip8.renderer import Renderer, dirty_spans
+
+
+@skipUnless(pygame, "pygame is not installed")
+class TestRenderer(TestCase):
+    def setUp(self):
+        self.target = pygame.Surface((128, 64))
+        self.renderer = Renderer(self.target)
+        self.display = Display()
+
+    def tearDown(self):
+        del self.renderer
+        del self.target
+
+    def assertDrawn(self):
+        """Every target pixel matches its display pixel"""
+        for y in range(0, 64):
+            for x in range(0, 128):
+                on = self.target.get_at((x, y))[:3] == (255, 255, 255)
+                self.assertEqual(
+                    on, bool(self.display.get_pixel(x // 2, y // 2)), (x, y)
+                )
+
+    def test_dirty_spans(self):
+        """Row masks split into runs of consecutive rows"""
+        self.assertEqual(dirty_spans(0b1110011), [(0, 2), (4, 7)])
+        self.assertEqual(dirty_spans((1 << 32) - 1), [(0, 32)])
+        self.assertEqual(dirty_spans(0), [])
+
+    def test_present(self):
+        """Presenting draws the display scaled, then only dirty rows"""
+        self.display.draw_sprite(0, 0, b"\xf0\x90\xf0")
+        self.assertEqual(
+            self.renderer.present(self.display), [pygame.Rect(0, 0, 128, 64)]
+        )
+        self.assertDrawn()
+        self.display.draw_sprite(60, 5, b"\xff\xff")
+        self.assertEqual(
+            self.renderer.present(self.display), [pygame.Rect(0, 10, 128, 4)]
+        )
+        self.assertDrawn()
+        self.assertEqual(self.renderer.present(self.display), [])
@@ -0,0 +1,76 @@
+import os
+from unittest import TestCase
+
+from chip8.vm import VM
+
+rom_dir = os.path.join(os.path.dirname(__file__), "..", "ROM")
+
+
+class TestRewind(TestCase):
+    def setUp(self):
+        self.vm = VM("block")
+        self.vm.load(os.path.join(rom_dir, "trip8.bin"))
+        self.vm.cpu.rng.seed(1)
+        self.vm.enable_rewind(capacity=50, keyframe_interval=8)
+        # One snapshot per 1000 cycles, standing in for frames
+        self.states = [self.vm.snapshot()]
+        for _ in range(30):
+            self.vm.step(1000)
+            self.states.append(self.vm.snapshot())
+
+    def tearDown(self):
+        del self.vm
+
+    def test_rewind(self):
+        """Rewinding by steps restores the exact earlier states"""
+        self.vm.rewind(1)
+        self.assertEqual(self.vm.snapshot(), self.states[-2])
+        self.vm.rewind(11)
+        self.assertEqual(self.vm.snapshot(), self.states[-13])
+        self.assertEqual(self.vm.cycles, 18_000)
+
+    def test_rewind_and_resume(self):
+        """Execution after a rewind replays the same future"""
+        self.vm.rewind(5)
+        self.vm.step(1000)
+        self.assertEqual(self.vm.snapshot(), self.states[-5])
+        self.vm.rewind(1)
+        self.assertEqual(self.vm.snapshot(), self.states[-6])
+
+    def test_rewind_cycles(self):
+        """Rewinding by cycles lands between records"""
+        expected = VM("interpreter")
+        expected.restore(self.states[20])
+        expected.step(500)
+        self.vm.rewind_cycles(9500)
+        self.assertEqual(self.vm.cycles, 20_500)
+        self.assertEqual(self.vm.snapshot(), expected.snapshot())
+
+    def test_capacity(self):
+        """The ring holds at most capacity states, and the oldest still restores"""
+        for _ in range(30):
+            self.vm.step(1000)
+            self.states.append(self.vm.snapshot())
+        self.assertEqual(len(self.vm.rewind_buffer), 50)
+        self.vm.rewind(49)
+        self.assertEqual(self.vm.snapshot(), self.states[-50])
+        with self.assertRaises(IndexError):
+            self.vm.rewind_cycles(1)
+
+    def test_deltas_are_small(self):
+        """Records between keyframes are far smaller than full snapshots"""
+        buffer = self.vm.rewind_buffer
+        self.assertLess(buffer.nbytes(), len(self.states[0]) * 8)
+
+    def test_frame_budgets(self):
+        """Rewinding frames restores the scheduler, so the same frame budgets follow"""
+        vm = VM("block", ips=700)
+        vm.load(os.path.join(rom_dir, "trip8.bin"))
+        vm.enable_rewind()
+        vm.run_frames(5)
+        before = vm.snapshot()
+        # 700 IPS runs frames of 12, 12 and 11 instructions in turn
+        budgets = vm.run_frames(2)
+        vm.rewind(2)
+        self.assertEqual(vm.snapshot(), before)
+        self.assertEqual(vm.run_frames(2), budgets)
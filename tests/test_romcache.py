@@ -0,0 +1,96 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from chip8.headless import run_rom
+from chip8.parser import ParsedInstruction, decode
+from chip8.romcache import RomCache, decode_rom, rom_digest
+from chip8.vm import ENGINES, VM
+from tests.helpers import machine_state
+
+rom_dir = os.path.join(os.path.dirname(__file__), "..", "ROM")
+ROMS = [os.path.join(rom_dir, name) for name in ("Maze.bin", "trip8.bin")]
+
+
+class TestRomCache(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = RomCache(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_decode_rom(self):
+        """The opcode of the word at every offset, odd ones included"""
+        data = bytes(range(0x40, 0x80))
+        opcodes = decode_rom(data)
+        self.assertEqual(len(opcodes), len(data) - 1)
+        for k, opcode in enumerate(opcodes):
+            self.assertEqual(opcode, decode((data[k] << 8) | data[k + 1])[0])
+
+    def test_round_trip(self):
+        """An odd-length ROM comes back unchanged from a mapped entry"""
+        data = bytes([0xA2, 0x10, 0xD0, 0x15, 0x12])
+        self.cache.put(data)
+        rom = RomCache(self.tmp.name).get(rom_digest(data))
+        self.assertEqual(bytes(rom.data), data)
+        self.assertEqual(list(rom.opcodes), list(decode_rom(data)))
+        self.assertIsNone(self.cache.get(rom_digest(b"missing")))
+
+    def test_damaged(self):
+        """Truncated or foreign entries are misses, deleted and rebuilt"""
+        data = bytes([0xA2, 0x10, 0xD0, 0x15, 0x12, 0x00])
+        path = self.cache.path(self.cache.put(data).digest)
+        with open(path, "rb") as f:
+            entry = f.read()
+        for damaged in (entry[:-3], entry[:10], b"", b"junk" + entry[4:]):
+            with self.subTest(size=len(damaged)):
+                with open(path, "wb") as f:
+                    f.write(damaged)
+                cache = RomCache(self.tmp.name)
+                self.assertIsNone(cache.get(rom_digest(data)))
+                self.assertFalse(os.path.exists(path))
+                rom = cache.put(data)
+                self.assertEqual(bytes(rom.data), data)
+                self.assertEqual(list(rom.opcodes), list(decode_rom(data)))
+                with open(path, "rb") as f:
+                    self.assertEqual(f.read(), entry)
+
+    def test_warm(self):
+        """Warming over processes stores every ROM under its digest"""
+        digests = self.cache.warm(ROMS, processes=2)
+        for path, digest in zip(ROMS, digests):
+            with open(path, "rb") as f:
+                self.assertEqual(digest, rom_digest(f.read()))
+            self.assertTrue(os.path.exists(self.cache.path(digest)))
+
+    def test_primed_instructions(self):
+        """Pre-decoded instructions equal ones decoded from scratch"""
+        vm = VM()
+        vm.load(ROMS[1], cache=self.cache)
+        rom = self.cache.load(ROMS[1])
+        for addr in range(0x200, 0x200 + len(rom.opcodes)):
+            word = (vm.cpu.mem[addr] << 8) | vm.cpu.mem[addr + 1]
+            expected = ParsedInstruction(word)
+            got = vm.cpu.mem.fetch(addr)
+            for field in ("bytes", "opcode", "nnn", "n", "x", "y", "kk"):
+                self.assertEqual(getattr(got, field), getattr(expected, field))
+
+    def test_load_matches(self):
+        """Cached loads run exactly like plain ones, whatever the engine"""
+        for path in ROMS:
+            for engine in ENGINES:
+                with self.subTest(rom=path, engine=engine):
+                    plain = VM(engine)
+                    plain.load(path)
+                    cached = VM(engine)
+                    cached.load(path, cache=self.cache)
+                    plain.cpu.rng.seed(0)
+                    cached.cpu.rng.seed(0)
+                    plain.step(5000)
+                    cached.step(5000)
+                    self.assertEqual(machine_state(cached), machine_state(plain))
+        self.assertEqual(
+            run_rom(ROMS[1], cycles=2000, rom_cache=self.cache).state_digest,
+            run_rom(ROMS[1], cycles=2000).state_digest,
+        )
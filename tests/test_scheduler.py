@@ -0,0 +1,41 @@
+from unittest import TestCase
+
+from chip8.scheduler import Scheduler
+from chip8.vm import VM
+
+
+class TestScheduler(TestCase):
+    def test_exact_rate(self):
+        """Frame budgets add up to exactly ips every 60 frames"""
+        scheduler = Scheduler(700)
+        budgets = [scheduler.cycles_for_frame() for _ in range(0, 120)]
+        self.assertEqual(set(budgets), {11, 12})
+        self.assertEqual(sum(budgets[:60]), 700)
+        self.assertEqual(sum(budgets[60:]), 700)
+
+    def test_even_rate(self):
+        """Rates that divide evenly run the same budget every frame"""
+        scheduler = Scheduler(720)
+        self.assertEqual({scheduler.cycles_for_frame() for _ in range(0, 60)}, {12})
+
+
+class TestRunFrames(TestCase):
+    def test_timers_tick_per_frame(self):
+        """Timers count down once per frame, not once per instruction"""
+        vm = VM("block", ips=600)
+        # V0 = 30, DT = V0, ST = V0, loop forever
+        vm.cpu.mem.load(bytes.fromhex("601ef015f0181206"), 0x200)
+        self.assertEqual(vm.run_frames(1), 10)
+        self.assertEqual((vm.cpu.dt, vm.cpu.st), (29, 29))
+        self.assertEqual(vm.run_frames(10), 100)
+        self.assertEqual((vm.cpu.dt, vm.cpu.st), (19, 19))
+        vm.run_frames(60)
+        self.assertEqual((vm.cpu.dt, vm.cpu.st), (0, 0))
+        self.assertEqual(vm.cycles, 710)
+
+    def test_step_leaves_timers(self):
+        """Stepping instructions directly never ticks the timers"""
+        vm = VM("interpreter")
+        vm.cpu.mem.load(bytes.fromhex("601ef0151204"), 0x200)
+        vm.step(1000)
+        self.assertEqual(vm.cpu.dt, 30)
@@ -0,0 +1,76 @@
+import os
+from unittest import TestCase
+
+from chip8 import snapshot
+from chip8.vm import VM
+
+rom_dir = os.path.join(os.path.dirname(__file__), "..", "ROM")
+
+
+class TestSnapshot(TestCase):
+    def setUp(self):
+        self.vm = VM("block")
+        self.vm.load(os.path.join(rom_dir, "trip8.bin"))
+        self.vm.cpu.rng.seed(1)
+        self.vm.step(20_000)
+
+    def tearDown(self):
+        del self.vm
+
+    def test_size(self):
+        """Snapshots are immutable and of a fixed size"""
+        blob = self.vm.snapshot()
+        self.assertIsInstance(blob, bytes)
+        self.assertEqual(len(blob), snapshot.snapshot_size())
+
+    def test_round_trip(self):
+        """Restoring a snapshot replays the same future"""
+        blob = self.vm.snapshot()
+        self.vm.step(20_000)
+        expected = self.vm.snapshot()
+        self.vm.restore(blob)
+        self.assertEqual(self.vm.snapshot(), blob)
+        self.vm.step(20_000)
+        self.assertEqual(self.vm.snapshot(), expected)
+
+    def test_fork(self):
+        """A snapshot restored into a fresh VM continues identically"""
+        blob = self.vm.snapshot()
+        other = VM("interpreter")
+        other.restore(blob)
+        self.vm.step(5000)
+        other.step(5000)
+        self.assertEqual(other.snapshot(), self.vm.snapshot())
+
+    def test_scheduler(self):
+        """Restoring brings back the scheduler's remainder, so frame budgets replay"""
+        self.vm.run_frames(1)
+        blob = self.vm.snapshot()
+        budgets = [self.vm.scheduler.cycles_for_frame() for _ in range(6)]
+        self.vm.restore(blob)
+        self.assertEqual(
+            [self.vm.scheduler.cycles_for_frame() for _ in range(6)], budgets
+        )
+        other = VM("interpreter")
+        other.restore(blob)
+        self.assertEqual(
+            [other.scheduler.cycles_for_frame() for _ in range(6)], budgets
+        )
+        self.assertNotEqual(len(set(budgets)), 1)
+
+    def test_invalid(self):
+        """Restoring something that is not a snapshot is an error"""
+        with self.assertRaises(ValueError):
+            self.vm.restore(b"\x00" * 10)
+        with self.assertRaises(ValueError):
+            self.vm.restore(bytes(snapshot.snapshot_size()))
+
+    def test_vm_fork(self):
+        """Forks run independently of the VM they were forked from"""
+        child = self.vm.fork()
+        self.assertEqual(child.snapshot(), self.vm.snapshot())
+        child.step(5000)
+        self.vm.step(5000)
+        self.assertEqual(child.snapshot(), self.vm.snapshot())
+        child.cpu.mem[0x300] = 0x42
+        self.assertNotEqual(self.vm.cpu.mem[0x300], 0x42)
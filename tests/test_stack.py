@@ -56,3 +56,11 @@ class TestStack(TestCase):
         # Pushing a 17th element causes an IndexError
         with self.assertRaises(IndexError):
             self.stack.push(42)
+
+    def test_contiguous(self):
+        """The stack is one buffer of 16-bit addresses with no instance dictionary"""
+        self.stack.push(0xFFE)
+        self.stack.push(0x202)
+        self.assertEqual(self.stack.itemsize, 2)
+        self.assertEqual(list(self.stack), [0xFFE, 0x202])
+        self.assertFalse(hasattr(self.stack, "__dict__"))
@@ -0,0 +1,70 @@
+import itertools
+import os
+import tempfile
+from unittest import TestCase
+
+from assembler.tokenizer import (
+    ImmToken,
+    NameToken,
+    RegToken,
+    TokenizeError,
+    Tokenizer,
+)
+
+
+class TestTokenizer(TestCase):
+    def setUp(self):
+        self.tokenizer = Tokenizer()
+
+    def tearDown(self):
+        del self.tokenizer
+
+    def test_dump(self):
+        """Dumping hands over the buffer and leaves the tokenizer usable"""
+        self.tokenizer.push_line("cls", ["cls"])
+        first = self.tokenizer.dump()
+        self.tokenizer.push_line("ret", ["ret"])
+        second = self.tokenizer.dump()
+        self.assertEqual([t.raw for t in first], ["cls"])
+        self.assertEqual([t.raw for t in second], ["ret"])
+        self.assertEqual(len(self.tokenizer.buf), 0)
+
+    def test_stream(self):
+        """Streaming splits lines, labels and comments and records positions"""
+        lines = ["# header", "loop: add r1, 0x10  # comment", "", "  jp loop"]
+        tokens = list(self.tokenizer.stream(lines))
+        self.assertEqual([t.line for t in tokens], [2, 2, 4])
+        label, add, jp = tokens
+        self.assertEqual(label.children[0].value, "loop:")
+        name, reg, imm = add.children
+        self.assertIsInstance(name, NameToken)
+        self.assertIsInstance(reg, RegToken)
+        self.assertIsInstance(imm, ImmToken)
+        self.assertEqual((reg.value, imm.value), (1, 0x10))
+        self.assertEqual([c.column for c in add.children], [7, 11, 15])
+        self.assertIsInstance(jp.children[1], NameToken)
+        self.assertEqual(jp.children[1].column, 6)
+        # Nothing is left behind in the buffer
+        self.assertEqual(len(self.tokenizer.buf), 0)
+
+    def test_stream_is_lazy(self):
+        """Tokens are yielded as lines are read, so endless sources work"""
+        endless = itertools.cycle(["ld r0 1", "jp 0x200"])
+        tokens = list(itertools.islice(self.tokenizer.stream(endless), 1001))
+        self.assertEqual(tokens[-1].line, 1001)
+
+    def test_stream_file(self):
+        """A path is opened and read a line at a time"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "prog.s")
+            with open(path, "w") as f:
+                f.write("cls\nret\n")
+            self.assertEqual(
+                [t.raw.strip() for t in self.tokenizer.stream(path)], ["cls", "ret"]
+            )
+
+    def test_stream_error(self):
+        """Errors carry the line and column they were found at"""
+        with self.assertRaises(TokenizeError) as cm:
+            list(self.tokenizer.stream(["cls", "drw r0 r1 5 6"]))
+        self.assertEqual((cm.exception.line, cm.exception.column), (2, 13))
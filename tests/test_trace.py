@@ -0,0 +1,75 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from chip8.cpu import CPU
+from chip8.profiler import OpcodeProfiler
+from chip8.trace import TraceRecorder, first_divergence, read_trace
+from chip8.vm import VM
+
+# V0 = 5, then V1 += V0 and I += V1 forever
+program = bytes.fromhex("6005 8104 f11e 1202")
+
+
+class TestTrace(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def record(self, name, engine="interpreter", compression=None, cycles=3000):
+        path = os.path.join(self.tmp.name, name)
+        vm = VM(engine)
+        vm.cpu.mem.load(program, 0x200)
+        with TraceRecorder(vm.cpu, path, compression):
+            vm.step(cycles)
+        return path, vm
+
+    def test_round_trip(self):
+        """Records describe every instruction and rebuild the registers"""
+        path, vm = self.record("plain")
+        records = list(read_trace(path))
+        self.assertEqual(len(records), 3000)
+        self.assertEqual([r.ip for r in records[:4]], [0x200, 0x202, 0x204, 0x206])
+        self.assertEqual(records[0].word, 0x6005)
+        self.assertEqual(records[0].delta, b"\x05" + bytes(15))
+        self.assertEqual(records[-1].reg, bytes(vm.cpu.reg))
+        self.assertEqual(records[-1].i, vm.cpu.i & 0xFFFF)
+
+    def test_compression(self):
+        """zlib traces are smaller and read back the same records"""
+        plain, _ = self.record("plain")
+        packed, _ = self.record("zlib", compression="zlib")
+        self.assertLess(os.path.getsize(packed), os.path.getsize(plain) // 4)
+        self.assertIsNone(first_divergence(plain, packed))
+
+    def test_block_engine(self):
+        """The block engine is traced instruction by instruction too"""
+        interpreted, _ = self.record("interpreter")
+        translated, _ = self.record("block", engine="block")
+        self.assertIsNone(first_divergence(interpreted, translated))
+
+    def test_divergence(self):
+        """The first differing record is found, including a trace ending early"""
+        long, _ = self.record("long")
+        short, _ = self.record("short", cycles=2000)
+        k, a, b = first_divergence(long, short)
+        self.assertEqual(k, 2000)
+        self.assertIsNotNone(a)
+        self.assertIsNone(b)
+
+    def test_with_profiler(self):
+        """A tracer and a profiler attached together both record, and detach cleanly"""
+        path = os.path.join(self.tmp.name, "both")
+        vm = VM()
+        vm.cpu.mem.load(program, 0x200)
+        with OpcodeProfiler(vm.cpu) as profiler:
+            with TraceRecorder(vm.cpu, path):
+                vm.step(400)
+            self.assertIn("_method_lookup_table", vm.cpu.__dict__)
+            vm.step(100)
+        self.assertNotIn("_method_lookup_table", vm.cpu.__dict__)
+        self.assertEqual(len(list(read_trace(path))), 400)
+        self.assertEqual(sum(s.count for s in profiler.stats()), 500)
+        self.assertIs(vm.cpu._method_lookup_table, CPU._method_lookup_table)
@@ -0,0 +1,84 @@
+import os
+from unittest import TestCase
+
+from chip8.vm import VM
+from tests.helpers import machine_state
+
+rom_dir = os.path.join(os.path.dirname(__file__), "..", "ROM")
+
+
+class TestBlockTranslator(TestCase):
+    def run_both(self, program: bytes, n_cycles: int) -> None:
+        """Run a program under both engines and compare the results"""
+        states = []
+        for engine in ("interpreter", "block"):
+            vm = VM(engine)
+            vm.cpu.rng.seed(8)
+            vm.cpu.mem.load(program, 0x200)
+            vm.step(n_cycles)
+            states.append(machine_state(vm))
+        self.assertEqual(states[0], states[1])
+
+    def test_roms(self):
+        """The block engine matches the interpreter on the bundled ROMs"""
+        for name in ("trip8.bin", "Maze.bin"):
+            with open(os.path.join(rom_dir, name), "rb") as f:
+                program = f.read()
+            for n_cycles in (1, 5, 1000, 20_000):
+                with self.subTest(rom=name, n_cycles=n_cycles):
+                    self.run_both(program, n_cycles)
+
+    def test_timers(self):
+        """Timer reads inside a block see per-instruction decrements"""
+        # LD V0, 10; LD DT, V0; ADD V1, 1; LD V2, DT; LD V3, 5; LD ST, V3; JP 0x200
+        program = bytes.fromhex("600af0157101f207" + "6305f318" + "1200")
+        for n_cycles in range(1, 30):
+            with self.subTest(n_cycles=n_cycles):
+                self.run_both(program, n_cycles)
+
+    def test_undefined_word(self):
+        """A data word ending a block only fails if it runs"""
+        # Frames end just before blocks that run into the undefined word 0xE083
+        program = bytes.fromhex("00e08317642c558046ec8eb2121053e08367220d8132")
+        states = []
+        for engine in ("interpreter", "block"):
+            vm = VM(engine, ips=600)
+            vm.cpu.mem.load(program, 0x200)
+            vm.run_frames(20)
+            states.append(machine_state(vm))
+        self.assertEqual(states[0], states[1])
+        self.assertEqual(states[0][0], 0x1D1)
+        # LD V0, 1 followed by the undefined word itself
+        for engine in ("interpreter", "block"):
+            with self.subTest(engine=engine):
+                vm = VM(engine)
+                vm.cpu.mem.load(bytes.fromhex("6001e083"), 0x200)
+                with self.assertRaises(KeyError):
+                    vm.step(2)
+                self.assertEqual((vm.cpu.ip, vm.cpu.reg[0]), (0x202, 1))
+
+    def test_self_modifying(self):
+        """Writes into a compiled block's code invalidate it"""
+        # 0x200: LD V0, 1
+        # 0x202: ADD V0, 1
+        # 0x204: LD I, 0x201
+        # 0x206: LD [I], V0  -> rewrites the immediate of LD V0
+        # 0x208: JP 0x200
+        program = bytes.fromhex("60017001a201f0551200")
+        vm = VM("block")
+        vm.cpu.mem.load(program, 0x200)
+        # Three trips around the loop
+        vm.step(15)
+        self.assertEqual(vm.cpu.reg.get(0), 4)
+        self.assertEqual(vm.cpu.mem[0x201], 4)
+        self.run_both(program, 1000)
+
+    def test_invalidation_forgets_block(self):
+        """Invalidating a block forgets it at every address it covered"""
+        vm = VM("block")
+        vm.cpu.mem.load(bytes.fromhex("6001 7001 7002 1200"), 0x200)
+        vm.step(4)
+        self.assertEqual(set(vm.engine._owners), set(range(0x200, 0x208)))
+        vm.cpu.mem[0x203] = 5
+        self.assertEqual(vm.engine._owners, {})
+        self.assertEqual(vm.engine._blocks, {})
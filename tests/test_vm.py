@@ -0,0 +1,100 @@
+import mmap
+import os
+from unittest import TestCase
+
+from chip8.vm import ENGINES, VM
+from tests.helpers import machine_state
+
+rom_path = os.path.join(os.path.dirname(__file__), "..", "ROM", "trip8.bin")
+
+
+class TestPresent(TestCase):
+    def setUp(self):
+        self.vm = VM("block", ips=600)
+        # Clear, then draw a 5 row block at (0, 0) and (8, 0) forever
+        self.vm.cpu.mem.load(bytes.fromhex("00e0a3006000d0156008d0151204"), 0x200)
+        self.vm.cpu.mem.load(b"\xff" * 5, 0x300)
+        self.presents = []
+        self.vm.cpu.display.take_dirty()
+
+    def tearDown(self):
+        del self.vm
+
+    def present(self, display, dirty):
+        self.presents.append(dirty)
+
+    def test_frame(self):
+        """Frame policy presents once per frame with every changed row"""
+        self.vm.set_presenter(self.present, "frame")
+        self.vm.run_frames(3)
+        self.assertEqual(self.presents, [(1 << 32) - 1, 0b11111, 0b11111])
+
+    def test_vsync(self):
+        """Vsync policy presents every frame, even when nothing changed"""
+        self.vm.cpu.mem.load(bytes.fromhex("1200"), 0x200)
+        self.vm.set_presenter(self.present, "vsync")
+        self.vm.run_frames(3)
+        self.assertEqual(self.presents, [0, 0, 0])
+
+    def test_immediate(self):
+        """Immediate policy presents after every instruction that drew"""
+        self.vm.set_presenter(self.present, "immediate")
+        self.vm.run_frames(1)
+        # 00E0, then three draws in ten instructions
+        self.assertEqual(self.presents, [(1 << 32) - 1] + [0b11111] * 3)
+
+    def test_immediate_engine(self):
+        """Immediate policy steps the selected engine, idle skipping or not"""
+        steps = []
+        step = self.vm.engine.step
+        self.vm.engine.step = lambda n_cycles: steps.append(n_cycles) or step(n_cycles)
+        self.vm.set_presenter(self.present, "immediate")
+        self.vm.run_frames(2)
+        self.assertEqual(steps, [1] * 20)
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                vm = VM(engine, ips=600, idle_skip=True)
+                vm.cpu.mem.load(self.vm.cpu.mem.tobytes())
+                presents = []
+                vm.set_presenter(
+                    lambda display, dirty: presents.append(dirty), "immediate"
+                )
+                vm.run_frames(2)
+                self.assertEqual(presents, self.presents)
+                self.assertEqual(machine_state(vm), machine_state(self.vm))
+
+    def test_unknown_policy(self):
+        """Unknown policies are rejected"""
+        with self.assertRaises(ValueError):
+            self.vm.set_presenter(self.present, "sometimes")
+
+
+class TestLoad(TestCase):
+    def run_vm(self, rom) -> VM:
+        vm = VM("block")
+        vm.load(rom)
+        vm.cpu.rng.seed(0)
+        vm.step(3000)
+        return vm
+
+    def test_sources(self):
+        """Paths, bytes-like objects and mmaps all load the same program"""
+        expected = machine_state(self.run_vm(rom_path))
+        with open(rom_path, "rb") as f:
+            data = f.read()
+            image = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        for rom in (data, bytearray(data), memoryview(data), image):
+            with self.subTest(rom=type(rom).__name__):
+                self.assertEqual(machine_state(self.run_vm(rom)), expected)
+
+    def test_shared_image(self):
+        """VMs loading one read-only image share its pages until they write"""
+        with open(rom_path, "rb") as f:
+            image = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        vms = [VM() for _ in range(100)]
+        for vm in vms:
+            vm.load(image)
+        pages = len(image) // 0x100
+        self.assertTrue(all(vm.cpu.mem.shared_pages() == pages for vm in vms))
+        vms[0].cpu.mem[0x200] = 0
+        self.assertEqual(vms[1].cpu.mem[0x200], image[0])